@@ -1,4 +1,5 @@
 import os
+import time
 import datetime
 import numpy as np
 import pandas as pd
@@ -7,7 +8,7 @@ import earthaccess as ea
 import cartopy.crs as ccrs
 from yaml import safe_load
 from memray import Tracker
-from driver import handler
+from jobs import JobManager
 from utils.constants import MIN_DATE, MAX_DATE, VIEWS
 
 
@@ -16,6 +17,10 @@ st.set_page_config(
     page_icon="🌎"
 )
 
+@st.cache_resource
+def job_manager() -> JobManager:
+    return JobManager()
+
 st.title("Nimbus")
 st.markdown("Visualizing Earth systems")
 
@@ -31,7 +36,8 @@ with form:
     )
 
     st.info(
-        "The maximum time delta between start and end dates is 5 days."
+        "The maximum time delta between start and end dates is 5 days, " \
+        "unless the frames are streamed."
     )
 
     # minimum one day time delta between start and end dates
@@ -55,6 +61,7 @@ with form:
     )
 
     zipimg  = st.checkbox("Zip frames")
+    stream  = st.checkbox("Stream frames")
     video   = st.checkbox("Render video")
     metrics = st.checkbox("Show metrics")
     interp  = st.checkbox("Interpolate frames")
@@ -81,7 +88,9 @@ if submitted:
         "dataset": datasets[dataset]["short name"],
         "start": start,
         "end": end,
+        "view": view,
         "zipimg": zipimg,
+        "stream": stream,
         "video": video,
         "metrics": metrics,
         "interp": interp,
@@ -89,4 +98,21 @@ if submitted:
         "auth_user": auth_user,
         "auth_pass": auth_pass
     }
-    handler(event)
\ No newline at end of file
+    st.session_state["job"] = job_manager().submit(event)
+
+if "job" in st.session_state:
+    job = st.session_state["job"]
+
+    for stage, fraction in job.progress().items():
+        st.progress(fraction, text=stage.capitalize())
+
+    if not job.done():
+        time.sleep(1)
+        st.rerun()
+
+    del st.session_state["job"]
+
+    if job.future.exception() is not None:
+        st.error(str(job.future.exception()))
+    else:
+        st.success("Your job is complete.")
\ No newline at end of file
@@ -1,91 +1,279 @@
 import os
+import datetime
 import ray
 import zipfile
 import numpy as np
 from PIL import Image
-import earthaccess as ea
-from netCDF4 import Dataset
-import earthaccess.exceptions as eax
+from typing import Callable, Iterator
 from processing import preprocessing
 from utils import schemas, constants
+from granules.reading import GranuleReader, split_step
+from granules.caching import granule_id, granule_time
+from granules.catalog import Catalog, GRANULE_SUFFIXES
+from granules.sources import DataSource, EarthdataSource, LocalSource
+from processing.streaming import stream
+from processing.planning import plan_products, schedule_products, preprocess_products
+from plotting.caching import FrameCache
+from processing.storing import FieldStore, load_or_preprocess, assemble
+from processing.accumulating import AccumulatorStore, ACCUMULATED_VARIABLES
+from processing.casting import compute_dtype
+from processing.windowing import view_extent
+from processing.pooling import preprocess_parallel
 from plotting import plots, colormaps
 from processing.batching import batch_regrid, batch_resample, batch_plot 
 
-def handler(event: dict):
-    if (event["end"] - event["start"]).days > 5:
+def plotter_context(view: str, resolution: int = constants.PREFERRED_DPI) -> schemas.PlotterContext:
+    """
+    Builds the plotter context of a view from its spec in views.json,
+    rendered at the preferred dpi unless a preview asks for less.
+    """
+    spec = constants.VIEWS_SPEC[view]
+    return schemas.PlotterContext(
+        projection=constants.VIEWS[view],
+        tag=view,
+        center=tuple(spec["center"]),
+        limit=tuple(spec["extent"]) if "extent" in spec else None,
+        resolution=resolution
+    )
+
+def dataset_key(event: dict) -> str:
+    """
+    Names the stored fields of an event's category after its collections.
+    """
+    short_names = event["dataset"] if isinstance(event["dataset"], list) else [event["dataset"]]
+    return "-".join(short_names)
+
+def data_source(event: dict) -> DataSource:
+    """
+    Picks where an event's granules come from: a local directory when the
+    event names one, and Earthdata otherwise, logged in with the event's own
+    credentials rather than the process environment, which concurrent jobs share.
+    """
+    if event.get("source_dir"):
+        return LocalSource(event["source_dir"])
+    return EarthdataSource(event.get("auth_user"), event.get("auth_pass"))
+
+def source_catalog(source: DataSource) -> Catalog:
+    """
+    Picks the catalog a job aligns its granules in. Local sources keep their own,
+    so their files never shadow or mix with Earthdata granules of the same hours.
+    """
+    if isinstance(source, LocalSource):
+        return source.catalog
+    return Catalog(constants.CATALOG_PATH)
+
+def catalog_steps(catalog: Catalog, short_name: str, paths: list[str], start: datetime.date, end: datetime.date) -> list[tuple[datetime.datetime, str]]:
+    """
+    Indexes fetched granules and lists their time steps within a time range,
+    so a daily file of hourly steps yields one unit per hour.
+    """
+    files = {os.path.abspath(split_step(path)[0]) for path in paths if split_step(path)[0].endswith(GRANULE_SUFFIXES)}
+    for path in files:
+        catalog.register(short_name, path)
+    return [(time, path) for time, path in catalog.lookup(short_name, start, end) if split_step(path)[0] in files]
+
+def search_units(event: dict, source: DataSource) -> list[dict[str, tuple]]:
+    """
+    Searches every collection of a category and pairs their granules by valid time,
+    as Catalog.aligned does. Times missing from any collection are left out, so
+    one missing granule never shifts the frames after it.
+    """
+    short_names = event["dataset"] if isinstance(event["dataset"], list) else [event["dataset"]]
+
+    if len(short_names) == 1:
+        granules = source.search(short_names[0], event["start"], event["end"])
+        ordered  = sorted(granules, key=lambda granule: (granule_time(granule) or datetime.datetime.min, granule_id(granule)))
+        return [{"data": (short_names[0], granule)} for granule in ordered]
+
+    found = {}
+    for short_name in short_names:
+        granules = source.search(short_name, event["start"], event["end"])
+        found[short_name[-3:].lower()] = (short_name, {granule_time(granule): granule for granule in granules})
+
+    times = set.intersection(*(set(granules) for _, granules in found.values())) - {None}
+    return [
+        {key: (short_name, granules[time]) for key, (short_name, granules) in found.items()}
+        for time in sorted(times)
+    ]
+
+def time_chunks(start: datetime.date, end: datetime.date, days: int) -> Iterator[tuple[datetime.date, datetime.date]]:
+    """
+    Splits a time range into consecutive windows of at most a number of days.
+    """
+    while start < end:
+        stop = min(start + datetime.timedelta(days=days), end)
+        yield start, stop
+        start = stop
+
+def search_chunks(event: dict, source: DataSource, report: Callable[[str, float], None]) -> Iterator[dict[str, tuple]]:
+    """
+    Searches a long time range one window at a time, so that only one window
+    of search results is held in memory. Granules on the boundary of two
+    windows are returned by both searches and only kept once.
+    """
+    chunks = list(time_chunks(event["start"], event["end"], event.get("chunk_days", constants.CHUNK_DAYS)))
+    seen   = set()
+
+    for i, (start, end) in enumerate(chunks):
+        fresh = set()
+        for unit in search_units({**event, "start": start, "end": end}, source):
+            key = tuple(granule_id(granule) for _, granule in unit.values())
+            if key in seen:
+                continue
+            fresh.add(key)
+            yield unit
+        # boundary granules can only reappear in the next window
+        seen = fresh
+        report("search", (i + 1) / len(chunks))
+
+def handler(event: dict, progress: Callable[[str, float], None] | None = None):
+    report = progress or (lambda stage, fraction: None)
+
+    # streamed jobs hold a fixed number of granules in memory, so only batch jobs are limited
+    if not event.get("stream") and (event["end"] - event["start"]).days > constants.MAX_BATCH_DAYS:
         raise ValueError(
-            "Your time delta is too large. Reduce it to 5 days or less."
+            f"Your time delta is too large. Reduce it to {constants.MAX_BATCH_DAYS} days or less, or stream the frames."
         )
     
-    # print("EARTHDATA_USERNAME" not in os.environ)
+    source = data_source(event)
+    source.login()
 
-    # if "EARTHDATA_USERNAME" not in os.environ:
-    #     os.environ["EARTHDATA_USERNAME"] = event["auth_user"]
-    
-    # if "EARTHDATA_PASSWORD" not in os.environ:
-    #     os.environ["EARTHDATA_PASSWORD"] = event["auth_pass"]
-
-    if event["auth_user"]:
-        os.environ["EARTHDATA_USERNAME"] = event["auth_user"]
-
-    if event["auth_pass"]:
-        os.environ["EARTHDATA_PASSWORD"] = event["auth_pass"]
-
-    # print(os.environ["EARTHDATA_USERNAME"])
-    # print(os.environ["EARTHDATA_PASSWORD"])
-    # print("EARTHDATA_USERNAME" in os.environ)
-    # if not os.environ["EARTHDATA_USERNAME"] or not os.environ["EARTHDATA_PASSWORD"]:
-    #     raise ValueError(
-    #         "Your EarthData credentials are missing. " \
-    #         "Please add them to your environment variables or provide them in the form."
-    #     )
-    
-    try:
-        ea.login()
-    except eax.LoginAttemptFailure:
-        raise ValueError(
-            "Your EarthData credentials are incorrect. " \
-            "Please check them and try again."
+    report("login", 1.0)
+
+    precision = schemas.PrecisionContext(**event["precision"]) if event.get("precision") else None
+
+    download_context = schemas.DownloadContext(
+        cache_dir=event.get("cache_dir", constants.GRANULES_DIR),
+        workers=event.get("workers", constants.DOWNLOAD_WORKERS),
+        chunk_size=constants.DOWNLOAD_CHUNK_SIZE
+    )
+
+    if event.get("stream"):
+        stream_context = schemas.StreamContext(
+            queue_size=event.get("queue_size", constants.STREAM_QUEUE_SIZE),
+            download=download_context,
+            plotter=plotter_context(event["view"], event.get("dpi", constants.PREFERRED_DPI)),
+            cache_dir=constants.CACHE_DIR,
+            store=FieldStore(constants.STORE_DIR, precision) if event.get("store") else None,
+            precision=precision,
+            dataset=dataset_key(event),
+            source=source,
+            extent=view_extent(event["view"]),
+            pyramid=event.get("pyramid", True),
+            frames=FrameCache(constants.FRAMES_DIR, event.get("frame_quota", constants.FRAME_CACHE_QUOTA))
         )
+        found = 0
+
+        def units():
+            nonlocal found
+            for unit in search_chunks(event, source, report):
+                found += 1
+                yield unit
+
+        frames = []
+        for frame in stream(units(), event["category"], stream_context):
+            frames.append(frame)
+            report("render", len(frames) / found)
+        return frames
+
+    variables = constants.PRODUCT_VARIABLES.get(event.get("category"))
+    extent    = view_extent(event.get("view"))
+
+    def read(path: str) -> GranuleReader:
+        return GranuleReader(path, variables=variables, extent=extent, margin=constants.VIEW_MARGIN)
+
+    if "products" in event:
+        products = event["products"]
+        catalog  = source_catalog(source)
+        for short_name in plan_products(products):
+            results = source.search(short_name, event["start"], event["end"])
+            for path in source.fetch_all(results, short_name, download_context):
+                if split_step(path)[0].endswith(GRANULE_SUFFIXES):
+                    catalog.register(short_name, path)
+
+        report("download", 1.0)
+
+        schedule = schedule_products(products, lambda collections: catalog.hours(collections, event["start"], event["end"]))
+        return preprocess_products(products, schedule, extent, report)
 
     if event["category"] == "weather types":
-        datasets = []
-        for short_name in event["dataset"]:
-            results = ea.search_data(
-                short_name=short_name,
-                temporal=(event["start"], event["end"])
-            )
-            path = short_name[-3:].lower()
-            ea.download(results, local_path=path)
-
-        asm_paths = sorted(os.listdir("asm"))
-        flx_paths = sorted(os.listdir("flx"))
-        slv_paths = sorted(os.listdir("slv"))
-
-        for i in range(len((asm_paths))):
-            datasets.append({
-                "asm": Dataset(asm_paths[i]),
-                "flx": Dataset(flx_paths[i]),
-                "slv": Dataset(slv_paths[i])
-            })
+        catalog     = source_catalog(source)
+        collections = {short_name[-3:].lower(): short_name for short_name in event["dataset"]}
+        for short_name in collections.values():
+            results = source.search(short_name, event["start"], event["end"])
+            for path in source.fetch_all(results, short_name, download_context):
+                if split_step(path)[0].endswith(GRANULE_SUFFIXES):
+                    catalog.register(short_name, path)
+
+        units = catalog.aligned(collections, event["start"], event["end"])
     else:
-        results = ea.search_data(
-            short_name=event["dataset"],
-            temporal=(event["start"], event["end"])
+        results   = source.search(event["dataset"], event["start"], event["end"])
+        datapaths = source.fetch_all(results, event["dataset"], download_context)
+        catalog   = source_catalog(source)
+        units     = [{"data": path} for _, path in catalog_steps(catalog, event["dataset"], datapaths, event["start"], event["end"])]
+
+    report("download", 1.0)
+
+    if event.get("store") and event["category"] in ACCUMULATED_VARIABLES:
+        accumulators = AccumulatorStore(constants.STORE_DIR, precision)
+        key          = dataset_key(event)
+        start, end   = (
+            day if isinstance(day, datetime.datetime) else datetime.datetime.combine(day, time)
+            for day, time in ((event["start"], datetime.time.min), (event["end"], datetime.time.max))
         )
-        ea.download(results, local_path="data")
-
-        datapaths = os.listdir("data")
-        datasets  = [Dataset(datapath) for datapath in datapaths]
-
-    match event["category"]:
-        case "10m winds":
-            preprocessed = preprocessing.preprocess_wind_data(datasets)
-        case "weather types":
-            preprocessed = preprocessing.preprocess_weather_types(datasets)
-        case "accumulated rainfall":
-            preprocessed = preprocessing.preprocess_accumulated_rain(datasets)
-        case "accumulated snowfall":
-            preprocessed = preprocessing.preprocess_accumulated_snow(datasets)
-        case _:
-            preprocessed = None
+
+        # the catalog times the granules, so only hours not accumulated yet are opened
+        granules = catalog_steps(catalog, event["dataset"], [unit["data"] for unit in units], start, end)
+        accumulators.extend(key, start, granules)
+
+        variable = ACCUMULATED_VARIABLES[event["category"]]
+        times    = [valid_time for valid_time in accumulators.times(key, start) if valid_time <= end]
+        frames   = [
+            accumulators.total(key, start, valid_time, variable, event.get("window_hours"), extent, constants.VIEW_MARGIN)
+            for valid_time in times
+        ]
+        preprocessed = [np.ma.stack(frames)] if frames else []
+    elif event.get("store"):
+        store  = FieldStore(constants.STORE_DIR, precision)
+        key    = dataset_key(event)
+        fields = []
+        for unit in units:
+            fields.append(load_or_preprocess(store, event["category"], key, unit, extent, constants.VIEW_MARGIN)["fields"])
+            report("preprocess", len(fields) / len(units))
+        preprocessed = assemble(event["category"], fields)
+    elif event.get("processes"):
+        batch_context = schemas.BatchContext(
+            concurrency=event["processes"],
+            batch_size=event.get("process_chunk"),
+            num_cpus=event.get("process_threads")
+        )
+        preprocessed = preprocess_parallel(
+            event["category"], units, batch_context, extent, constants.VIEW_MARGIN,
+            stacked=event.get("stacked", False), dtype=compute_dtype(precision), progress=report
+        )
+    else:
+        datasets = [
+            {key: read(path) for key, path in unit.items()} if len(unit) > 1 else read(unit["data"])
+            for unit in units
+        ]
+
+        stacked = event.get("stacked", False)
+        dtype   = compute_dtype(precision)
+
+        match event["category"]:
+            case "10m winds":
+                preprocessed = preprocessing.preprocess_wind_data(datasets, stacked=stacked, dtype=dtype)
+            case "weather types":
+                preprocessed = preprocessing.preprocess_weather_types(datasets, stacked=stacked, dtype=dtype)
+            case "accumulated rainfall":
+                preprocessed = preprocessing.preprocess_accumulated_rain(datasets, stacked=stacked, dtype=dtype)
+            case "accumulated snowfall":
+                preprocessed = preprocessing.preprocess_accumulated_snow(datasets, stacked=stacked, dtype=dtype)
+            case "vorticity":
+                preprocessed = preprocessing.preprocess_vorticity_data(datasets)
+            case _:
+                preprocessed = None
+
+    report("preprocess", 1.0)
+
+    return preprocessed
@@ -0,0 +1,146 @@
+import os
+import json
+import hashlib
+import datetime
+from typing import Any
+
+def granule_id(granule: dict[str, Any]) -> str:
+    """
+    Extracts the granule ID of a CMR search result.
+
+    Args:
+        granule (dict[str, Any]): The granule returned by the search
+
+    Returns:
+        str: The granule ID
+    """
+    umm = granule.get("umm", {})
+    if "GranuleUR" in umm:
+        return umm["GranuleUR"]
+    return granule["meta"]["native-id"]
+
+def granule_time(granule: dict[str, Any]) -> datetime.datetime | None:
+    """
+    Extracts the start of the temporal extent of a CMR search result,
+    floored to the hour like Catalog.hours, so the granules of collections
+    stamped at :30 line up with those stamped on the hour.
+
+    Args:
+        granule (dict[str, Any]): The granule returned by the search
+
+    Returns:
+        datetime.datetime | None: The time, or None when the record has no temporal extent
+    """
+    temporal = granule.get("umm", {}).get("TemporalExtent", {})
+    stamp    = temporal.get("RangeDateTime", {}).get("BeginningDateTime") or temporal.get("SingleDateTime")
+    if stamp is None:
+        return None
+    time = datetime.datetime.fromisoformat(stamp.replace("Z", "+00:00")).replace(tzinfo=None)
+    return time.replace(minute=0, second=0, microsecond=0)
+
+def granule_key(short_name: str, gid: str) -> str:
+    """
+    Computes the content address of a granule from its short name and ID.
+
+    Args:
+        short_name (str): The collection short name
+        gid (str): The granule ID
+
+    Returns:
+        str: The content address
+    """
+    return hashlib.sha256(f"{short_name}/{gid}".encode()).hexdigest()
+
+def granule_dir(cache_dir: str, short_name: str, gid: str) -> str:
+    """
+    Resolves the cache directory of a granule.
+    Granules are fanned out by the first byte of their address.
+
+    Args:
+        cache_dir (str): The root of the granule cache
+        short_name (str): The collection short name
+        gid (str): The granule ID
+
+    Returns:
+        str: The granule directory
+    """
+    key = granule_key(short_name, gid)
+    return os.path.join(cache_dir, short_name, key[:2], key)
+
+def granule_files(granule: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """
+    Collects the expected size and checksum of each file in a granule.
+
+    Args:
+        granule (dict[str, Any]): The granule returned by the search
+
+    Returns:
+        dict[str, dict[str, Any]]: The file specs keyed by file name
+    """
+    specs = {}
+    infos = granule.get("umm", {}).get("DataGranule", {}).get("ArchiveAndDistributionInformation", [])
+
+    for info in infos:
+        checksum = info.get("Checksum", {})
+        specs[info["Name"]] = {
+            "size": info.get("SizeInBytes"),
+            "checksum": checksum.get("Value"),
+            "algorithm": checksum.get("Algorithm")
+        }
+
+    return specs
+
+def checksum(path: str, algorithm: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Computes the checksum of a file.
+
+    Args:
+        path (str): The file to hash
+        algorithm (str): The CMR checksum algorithm, e.g. MD5 or SHA-256
+        chunk_size (int, optional): The read size. Defaults to 1 MiB.
+
+    Returns:
+        str: The hex digest
+    """
+    digest = hashlib.new(algorithm.replace("-", "").lower())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def is_verified(path: str, spec: dict[str, Any] | None = None) -> bool:
+    """
+    Checks whether a cached file is present and matches its spec.
+    A successful check is recorded in a sidecar marker so the file is hashed once.
+
+    Args:
+        path (str): The cached file
+        spec (dict[str, Any], optional): The expected size and checksum. Defaults to None.
+
+    Returns:
+        bool: Whether the file can be reused
+    """
+    if not os.path.exists(path):
+        return False
+
+    spec   = spec or {}
+    stat   = os.stat(path)
+    marker = f"{path}.ok"
+
+    if os.path.exists(marker):
+        with open(marker, "r") as f:
+            record = json.load(f)
+        if record["size"] == stat.st_size and record["mtime"] == stat.st_mtime_ns:
+            return True
+
+    if spec.get("size") is not None and stat.st_size != spec["size"]:
+        return False
+
+    if spec.get("checksum") and spec.get("algorithm"):
+        if checksum(path, spec["algorithm"]) != spec["checksum"].lower():
+            return False
+
+    with open(marker, "w") as f:
+        json.dump({"size": stat.st_size, "mtime": stat.st_mtime_ns}, f)
+
+    return True
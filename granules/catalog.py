@@ -0,0 +1,189 @@
+import os
+import json
+import sqlite3
+import datetime
+from contextlib import closing
+from granules.reading import GranuleReader, STEP_SEPARATOR, split_step, step_path
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS granules (
+    path       TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    valid_time TEXT NOT NULL,
+    variables  TEXT NOT NULL,
+    west       REAL NOT NULL,
+    east       REAL NOT NULL,
+    south      REAL NOT NULL,
+    north      REAL NOT NULL,
+    size       INTEGER NOT NULL,
+    mtime_ns   INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS granules_time ON granules (collection, valid_time);
+"""
+
+GRANULE_SUFFIXES: tuple[str, ...] = (".nc", ".nc4", ".h5", ".hdf5")
+
+# the entries of a granule file, which is either one entry or one per time step
+FILE_ENTRIES: str = "path = ? OR substr(path, 1, ?) = ?"
+
+def _file_entries(path: str) -> tuple[str, int, str]:
+    return path, len(path) + len(STEP_SEPARATOR), path + STEP_SEPARATOR
+
+def _timestamp(time: datetime.date, end: bool = False) -> str:
+    # a bare date covers the whole day
+    if not isinstance(time, datetime.datetime):
+        time = datetime.datetime.combine(time, datetime.time.max if end else datetime.time.min)
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+class Catalog:
+    """
+    SQLite index of the granules in the local cache.
+
+    Each granule is recorded with its collection, valid time, variables and
+    bounding box, so jobs resolve the files they need with indexed queries
+    instead of walking the cache. Granules are only re-read when their size
+    or modification time changes.
+
+    Every time step of a granule is its own entry, so a daily file of hourly
+    steps serves 24 hours. The steps of a file with several are recorded
+    under the paths granules.reading.step_path gives them.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def register(self, collection: str, path: str) -> bool:
+        """
+        Records every time step of a granule, skipping granules that are already up to date.
+
+        Args:
+            collection (str): The collection short name
+            path (str): The granule file, or the path of one of its time steps
+
+        Returns:
+            bool: Whether the granule was (re)indexed
+        """
+        path = os.path.abspath(split_step(path)[0])
+        stat = os.stat(path)
+
+        with closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT size, mtime_ns FROM granules WHERE {FILE_ENTRIES}", _file_entries(path)).fetchone()
+        if row == (stat.st_size, stat.st_mtime_ns):
+            return False
+
+        with GranuleReader(path) as reader:
+            times = reader.valid_times
+            if not times:
+                return False
+            variables = sorted(
+                name for name, variable in reader.variables.items()
+                if len(variable.dimensions) >= 2 and name not in ("lat", "lon", "latitude", "longitude")
+            )
+            west, east, south, north = reader.extent
+
+        steps = [(path, times[0])] if len(times) == 1 else [(step_path(path, step), time) for step, time in enumerate(times)]
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"DELETE FROM granules WHERE {FILE_ENTRIES}", _file_entries(path))
+            conn.executemany(
+                "INSERT INTO granules VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (step, collection, _timestamp(time), json.dumps(variables), west, east, south, north, stat.st_size, stat.st_mtime_ns)
+                    for step, time in steps
+                ]
+            )
+        return True
+
+    def scan(self, cache_dir: str) -> int:
+        """
+        Indexes every granule in a cache laid out as <cache_dir>/<short name>/...,
+        and drops entries whose files are gone.
+
+        Args:
+            cache_dir (str): The root of the granule cache
+
+        Returns:
+            int: The number of granules (re)indexed
+        """
+        count = 0
+        if os.path.isdir(cache_dir):
+            for collection in os.scandir(cache_dir):
+                if not collection.is_dir():
+                    continue
+                for root, _, names in os.walk(collection.path):
+                    for name in names:
+                        if name.endswith(GRANULE_SUFFIXES):
+                            count += self.register(collection.name, os.path.join(root, name))
+
+        with closing(self._connect()) as conn, conn:
+            stale = [(path,) for path, in conn.execute("SELECT path FROM granules") if not os.path.exists(split_step(path)[0])]
+            conn.executemany("DELETE FROM granules WHERE path = ?", stale)
+
+        return count
+
+    def lookup(self, collection: str, start: datetime.date, end: datetime.date, variables: tuple[str, ...] | None = None) -> list[tuple[datetime.datetime, str]]:
+        """
+        Finds the granules of a collection valid within a time range.
+
+        Args:
+            collection (str): The collection short name
+            start (datetime.date): The start of the range, inclusive
+            end (datetime.date): The end of the range, inclusive
+            variables (tuple[str, ...], optional): Variables every granule must hold. Defaults to None.
+
+        Returns:
+            list[tuple[datetime.datetime, str]]: The valid times and paths, in time order
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT valid_time, path, variables FROM granules "
+                "WHERE collection = ? AND valid_time BETWEEN ? AND ? ORDER BY valid_time, path",
+                (collection, _timestamp(start), _timestamp(end, end=True))
+            ).fetchall()
+
+        return [
+            (datetime.datetime.fromisoformat(time), path)
+            for time, path, names in rows
+            if variables is None or set(variables) <= set(json.loads(names))
+        ]
+
+    def hours(self, collections: dict[str, str], start: datetime.date, end: datetime.date) -> dict[datetime.datetime, dict[str, str]]:
+        """
+        Pairs the granules of several collections by valid time.
+        Time-averaged collections are stamped at the middle of their averaging
+        window (00:30 for hourly means), so valid times are matched on the hour.
+        Hours missing from any of the collections are left out.
+
+        Args:
+            collections (dict[str, str]): The collection short names, keyed by the name of their paths in each unit
+            start (datetime.date): The start of the range, inclusive
+            end (datetime.date): The end of the range, inclusive
+
+        Returns:
+            dict[datetime.datetime, dict[str, str]]: The granule paths of each hour, in time order
+        """
+        found = {
+            key: {time.replace(minute=0, second=0, microsecond=0): path for time, path in self.lookup(short_name, start, end)}
+            for key, short_name in collections.items()
+        }
+        times = sorted(set.intersection(*(set(paths) for paths in found.values()))) if found else []
+        return {time: {key: found[key][time] for key in collections} for time in times}
+
+    def aligned(self, collections: dict[str, str], start: datetime.date, end: datetime.date) -> list[dict[str, str]]:
+        """
+        Pairs the granules of several collections by valid time, as in hours().
+
+        Args:
+            collections (dict[str, str]): The collection short names, keyed by the name of their paths in each unit
+            start (datetime.date): The start of the range, inclusive
+            end (datetime.date): The end of the range, inclusive
+
+        Returns:
+            list[dict[str, str]]: The granule paths of each hour, in time order
+        """
+        return list(self.hours(collections, start, end).values())
@@ -0,0 +1,155 @@
+import os
+import threading
+import contextlib
+import requests
+import earthaccess as ea
+from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from utils import constants
+from utils.schemas import DownloadContext
+from granules.caching import (
+    granule_id, granule_dir, granule_files, is_verified
+)
+
+_local = threading.local()
+
+# the lock of each destination being downloaded, and the number of callers holding or waiting for it
+_path_locks: dict[str, list] = {}
+_path_locks_lock = threading.Lock()
+
+@contextlib.contextmanager
+def _path_lock(path: str):
+    """
+    Serializes the downloads of one destination across the job threads.
+    """
+    with _path_locks_lock:
+        entry = _path_locks.setdefault(path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _path_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _path_locks[path]
+
+def session() -> requests.Session:
+    """
+    Returns an authenticated Earthdata session for the calling thread.
+    Sessions are not shared across threads.
+    """
+    if not hasattr(_local, "session"):
+        _local.session = ea.get_requests_https_session()
+    return _local.session
+
+def download_file(url: str, path: str, context: DownloadContext, spec: dict[str, Any] | None = None) -> str:
+    """
+    Downloads a file, resuming from a partial download if one exists.
+    Files already in place, and verified when the context verifies, are kept.
+    Downloads of the same destination run one at a time.
+
+    Args:
+        url (str): The file URL
+        path (str): The destination path
+        context (DownloadContext): The download context
+        spec (dict[str, Any], optional): The expected size and checksum. Defaults to None.
+
+    Returns:
+        str: The destination path
+    """
+    if context.retries < 1:
+        raise ValueError(f"retries must be at least 1, got {context.retries}")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # the lock is taken before the size of the partial file is read, so a
+    # download overlapping another one resumes from where that one stopped
+    with _path_lock(os.path.abspath(path)):
+        return _download_file(url, path, context, spec)
+
+def _download_file(url: str, path: str, context: DownloadContext, spec: dict[str, Any] | None) -> str:
+    """
+    Downloads a file while holding the lock of its destination.
+    """
+    cached = is_verified(path, spec) if context.verify else os.path.exists(path)
+    if cached:
+        return path
+
+    part = f"{path}.part"
+    for attempt in range(context.retries):
+        offset  = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        try:
+            with (context.session or session)().get(url, headers=headers, stream=True, timeout=60) as resp:
+                if resp.status_code == 416:
+                    # the partial file is already complete
+                    break
+
+                resp.raise_for_status()
+
+                # the server ignored the range request, so start over
+                mode = "ab" if resp.status_code == 206 else "wb"
+                with open(part, mode) as f:
+                    for chunk in resp.iter_content(chunk_size=context.chunk_size):
+                        f.write(chunk)
+            break
+        except requests.RequestException:
+            if attempt == context.retries - 1:
+                raise
+
+    os.replace(part, path)
+
+    if context.verify and not is_verified(path, spec):
+        os.remove(path)
+        raise ValueError(f"Downloaded file failed verification: {path}")
+
+    return path
+
+def fetch_granule(granule: dict[str, Any], short_name: str, context: DownloadContext) -> list[str]:
+    """
+    Fetches every data file of a granule into the granule cache.
+
+    Args:
+        granule (dict[str, Any]): The granule returned by the search
+        short_name (str): The collection short name
+        context (DownloadContext): The download context
+
+    Returns:
+        list[str]: The cached file paths
+    """
+    gid   = granule_id(granule)
+    root  = granule_dir(context.cache_dir, short_name, gid)
+    specs = granule_files(granule)
+
+    paths = []
+    for url in granule.data_links(access="external"):
+        name = os.path.basename(url)
+        path = os.path.join(root, name)
+        paths.append(download_file(url, path, context, specs.get(name)))
+
+    return paths
+
+def fetch_granules(granules: list[dict[str, Any]], short_name: str, context: DownloadContext | None = None) -> list[str]:
+    """
+    Fetches granules concurrently into the granule cache.
+    Granules that are already cached and verified are not downloaded again.
+
+    Args:
+        granules (list[dict[str, Any]]): The granules returned by the search
+        short_name (str): The collection short name
+        context (DownloadContext, optional): The download context. Defaults to None.
+
+    Returns:
+        list[str]: The cached file paths in search order
+    """
+    if context is None:
+        context = DownloadContext()
+
+    if context.cache_dir is None:
+        context.cache_dir = constants.GRANULES_DIR
+
+    with ThreadPoolExecutor(max_workers=context.workers) as executor:
+        futures = [executor.submit(fetch_granule, granule, short_name, context) for granule in granules]
+        return [path for future in futures for path in future.result()]
@@ -0,0 +1,300 @@
+import datetime
+import numpy as np
+from netCDF4 import Dataset, Variable, num2date
+
+LAT_NAMES: tuple[str, ...] = ("lat", "latitude")
+LON_NAMES: tuple[str, ...] = ("lon", "longitude")
+
+# a time step of a multi-step granule is referred to as <path>#<step>
+STEP_SEPARATOR: str = "#"
+
+def step_path(path: str, step: int) -> str:
+    """
+    Refers to one time step of a granule file.
+
+    Args:
+        path (str): The granule file
+        step (int): The index of the time step
+
+    Returns:
+        str: The path of the time step
+    """
+    return f"{path}{STEP_SEPARATOR}{step}"
+
+def split_step(path: str) -> tuple[str, int | None]:
+    """
+    Splits the path of a time step into its granule file and step index.
+
+    Args:
+        path (str): A granule file, or the path of one of its time steps
+
+    Returns:
+        tuple[str, int | None]: The granule file, and the step or None for the whole file
+    """
+    file, separator, step = path.rpartition(STEP_SEPARATOR)
+    if separator and step.isdigit():
+        return file, int(step)
+    return path, None
+
+def lat_window(lats: np.ndarray, south: float, north: float) -> slice:
+    """
+    Computes the latitude index window covering a latitude band.
+
+    Args:
+        lats (np.ndarray): The latitude coordinates, ascending or descending
+        south (float): The southern edge of the band
+        north (float): The northern edge of the band
+
+    Returns:
+        slice: The latitude window
+    """
+    idx = np.flatnonzero((lats >= south) & (lats <= north))
+    if idx.size == 0:
+        # the band falls between two rows, so keep the nearest one
+        idx = np.array([np.argmin(np.abs(lats - (south + north) / 2))])
+    return slice(int(idx[0]), int(idx[-1]) + 1)
+
+def lon_window(lons: np.ndarray, west: float, east: float) -> list[slice]:
+    """
+    Computes the longitude index windows covering a longitude band.
+    A band that crosses the seam of the grid is split into two windows,
+    ordered west to east.
+
+    Args:
+        lons (np.ndarray): The ascending longitude coordinates, in [-180, 180) or [0, 360)
+        west (float): The western edge of the band
+        east (float): The eastern edge of the band
+
+    Returns:
+        list[slice]: The longitude windows
+    """
+    if east - west >= 360:
+        return [slice(0, lons.size)]
+
+    idx = np.flatnonzero((lons - west) % 360 <= east - west)
+    if idx.size == 0:
+        idx = np.array([np.argmin(np.abs((lons - (west + east) / 2 + 180) % 360 - 180))])
+
+    seam = np.flatnonzero(np.diff(idx) > 1)
+    if seam.size == 0:
+        return [slice(int(idx[0]), int(idx[-1]) + 1)]
+
+    split = seam[0]
+    return [slice(int(idx[split + 1]), lons.size), slice(0, int(idx[split]) + 1)]
+
+class WindowedVariable:
+    """
+    A netCDF variable restricted to a lat/lon window, and to one time step
+    when a step is given, so index 0 of its time axis is that step.
+    Nothing is read until the variable is indexed, and only the
+    hyperslab inside the window is read from disk.
+    """
+    def __init__(self, variable: Variable, lat_dim: str, lon_dim: str, lat_slice: slice, lon_slices: list[slice], step: int | None = None):
+        self.variable   = variable
+        self.dimensions = variable.dimensions
+        self.lat_axis   = variable.dimensions.index(lat_dim)
+        self.lon_axis   = variable.dimensions.index(lon_dim)
+        self.lat_slice  = lat_slice
+        self.lon_slices = lon_slices
+        self.time_axis  = variable.dimensions.index("time") if step is not None and "time" in variable.dimensions else None
+        self.step       = step
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        shape = list(self.variable.shape)
+        shape[self.lat_axis] = len(range(*self.lat_slice.indices(shape[self.lat_axis])))
+        shape[self.lon_axis] = sum(len(range(*s.indices(self.variable.shape[self.lon_axis]))) for s in self.lon_slices)
+        if self.time_axis is not None:
+            shape[self.time_axis] = 1
+        return tuple(shape)
+
+    @property
+    def ndim(self) -> int:
+        return self.variable.ndim
+
+    def __getattr__(self, name: str):
+        return getattr(self.variable, name)
+
+    def __getitem__(self, key) -> np.ma.MaskedArray:
+        key = key if isinstance(key, tuple) else (key,)
+        key = key + (slice(None),) * (self.variable.ndim - len(key))
+
+        outer = list(key)
+        if self.time_axis is not None:
+            # the one step is index 0 of the time axis
+            steps = range(self.step, self.step + 1)
+            index = key[self.time_axis]
+            if isinstance(index, (int, np.integer)):
+                outer[self.time_axis] = steps[index]
+            else:
+                steps = steps[index if isinstance(index, slice) else slice(None)]
+                outer[self.time_axis] = slice(steps.start, steps.stop, steps.step)
+
+        inner = []
+        for axis in range(self.variable.ndim):
+            if axis in (self.lat_axis, self.lon_axis):
+                inner.append(key[axis])
+            elif not isinstance(key[axis], (int, np.integer)):
+                inner.append(slice(None))
+
+        # axis of longitude once integer indices have dropped their dimensions
+        lon_axis = sum(1 for axis in range(self.lon_axis) if not isinstance(key[axis], (int, np.integer)))
+
+        parts = []
+        outer[self.lat_axis] = self.lat_slice
+        for lon_slice in self.lon_slices:
+            outer[self.lon_axis] = lon_slice
+            parts.append(self.variable[tuple(outer)])
+
+        data = parts[0] if len(parts) == 1 else np.ma.concatenate(parts, axis=lon_axis)
+        return np.ma.asarray(data)[tuple(inner)]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        data = self[(slice(None),) * self.variable.ndim] if self.variable.ndim else self.variable[...]
+        return np.asarray(data, dtype=dtype)
+
+class GranuleReader:
+    """
+    Reads a granule lazily, exposing only the requested variables and
+    only the lat/lon hyperslab that covers the requested extent.
+
+    The reader mirrors the parts of the netCDF4 Dataset interface that
+    the preprocessing functions use, so it can be passed in its place.
+    Those functions read the first time step of a granule, so a reader
+    opened on the path of a time step, as step_path makes it, shows that
+    step as the first one.
+    """
+    def __init__(self, path: str, variables: tuple[str, ...] | None = None, extent: tuple[float, float, float, float] | None = None, margin: float = 0.0):
+        self.path            = path
+        self.file, self.step = split_step(path)
+        self.dataset         = Dataset(self.file)
+
+        lat_dim = next(name for name in LAT_NAMES if name in self.dataset.variables)
+        lon_dim = next(name for name in LON_NAMES if name in self.dataset.variables)
+        lats    = self.dataset.variables[lat_dim][:].data
+        lons    = self.dataset.variables[lon_dim][:].data
+
+        if extent is None:
+            lat_slice  = slice(0, lats.size)
+            lon_slices = [slice(0, lons.size)]
+        else:
+            west, east, south, north = extent
+            lat_slice  = lat_window(lats, south - margin, north + margin)
+            lon_slices = lon_window(lons, west - margin, east + margin)
+
+        self.lats = lats[lat_slice]
+        self.lons = lons[lon_slices[0]]
+
+        # keep longitudes monotonic across the seam
+        if len(lon_slices) > 1:
+            self.lons = np.concatenate([self.lons, lons[lon_slices[1]] + 360])
+
+        self.lat_slice  = lat_slice
+        self.lon_slices = lon_slices
+        self.extent     = (
+            float(self.lons[0]), float(self.lons[-1]),
+            float(self.lats.min()), float(self.lats.max())
+        )
+
+        names = variables if variables is not None else tuple(self.dataset.variables.keys())
+
+        self.variables = {}
+        for name in names:
+            if name not in self.dataset.variables:
+                continue
+            variable = self.dataset.variables[name]
+            if lat_dim in variable.dimensions and lon_dim in variable.dimensions:
+                self.variables[name] = WindowedVariable(variable, lat_dim, lon_dim, lat_slice, lon_slices, self.step)
+            else:
+                self.variables[name] = variable
+
+    @property
+    def valid_times(self) -> list[datetime.datetime]:
+        """
+        The valid times of every time step in the granule file.
+        """
+        if "time" not in self.dataset.variables:
+            return []
+
+        time = self.dataset.variables["time"]
+        return list(num2date(
+            time[:],
+            time.units,
+            calendar=getattr(time, "calendar", "standard"),
+            only_use_cftime_datetimes=False,
+            only_use_python_datetimes=True
+        ))
+
+    @property
+    def valid_time(self) -> datetime.datetime | None:
+        """
+        The valid time of the step the reader was opened on, or of the first time step.
+        """
+        times = self.valid_times
+        return times[self.step or 0] if times else None
+
+    def close(self):
+        self.dataset.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def granule_steps(path: str) -> list[tuple[datetime.datetime, str]]:
+    """
+    Lists the time steps of a granule file. A file with one step is its own
+    step, and each step of a file with several is referred to by step_path.
+
+    Args:
+        path (str): The granule file
+
+    Returns:
+        list[tuple[datetime.datetime, str]]: The valid time and path of each step
+    """
+    with GranuleReader(path, variables=()) as reader:
+        times = reader.valid_times
+    if len(times) == 1:
+        return [(times[0], path)]
+    return [(time, step_path(path, step)) for step, time in enumerate(times)]
+
+class DecodedVariable:
+    """
+    A variable held in memory after a single read.
+    Every index returns a copy, so one product scaling its fields in place
+    never changes what the other products see.
+    """
+    def __init__(self, data: np.ma.MaskedArray, dimensions: tuple[str, ...]):
+        self.data       = data
+        self.dimensions = dimensions
+        self.shape      = data.shape
+        self.ndim       = data.ndim
+
+    def __getitem__(self, key) -> np.ma.MaskedArray:
+        return np.ma.array(self.data[key], copy=True)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.asarray(self.data, dtype=dtype)
+
+class DecodedGranule:
+    """
+    The first time step of a granule's variables, or of the step its reader
+    was opened on, decoded once and shared
+    by every product that reads the granule.
+
+    The granule mirrors the parts of the GranuleReader interface that the
+    preprocessing functions use, so it can be passed in its place.
+    """
+    def __init__(self, reader: GranuleReader, variables: tuple[str, ...] | None = None):
+        names = variables if variables is not None else tuple(reader.variables)
+
+        self.path       = reader.path
+        self.lats       = reader.lats
+        self.lons       = reader.lons
+        self.extent     = reader.extent
+        self.valid_time = reader.valid_time
+        self.variables  = {
+            name: DecodedVariable(np.ma.asarray(reader.variables[name][0:1]), reader.variables[name].dimensions)
+            for name in names if name in reader.variables
+        }
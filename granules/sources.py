@@ -0,0 +1,127 @@
+import os
+import datetime
+import threading
+import requests
+import earthaccess as ea
+import earthaccess.exceptions as eax
+from abc import ABC, abstractmethod
+from typing import Any
+from earthaccess import DataGranules
+from concurrent.futures import ThreadPoolExecutor
+from granules.catalog import Catalog, GRANULE_SUFFIXES
+from granules.reading import split_step
+from granules import downloading
+from granules.downloading import fetch_granule, fetch_granules
+from utils import constants
+from utils.schemas import DownloadContext
+
+class DataSource(ABC):
+    """
+    Where granules come from.
+
+    A source searches a collection over a time range and fetches the
+    granules it found to local files. Granules are CMR-style records, so
+    everything downstream identifies them with granule_id.
+    """
+    def login(self):
+        pass
+
+    @abstractmethod
+    def search(self, short_name: str, start: datetime.date, end: datetime.date) -> list[dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def fetch(self, granule: dict[str, Any], short_name: str, context: DownloadContext) -> list[str]:
+        pass
+
+    def fetch_all(self, granules: list[dict[str, Any]], short_name: str, context: DownloadContext) -> list[str]:
+        with ThreadPoolExecutor(max_workers=context.workers) as executor:
+            futures = [executor.submit(self.fetch, granule, short_name, context) for granule in granules]
+            return [path for future in futures for path in future.result()]
+
+class EarthdataSource(DataSource):
+    """
+    Searches CMR and downloads granules from Earthdata into the granule cache.
+
+    A source given credentials holds its own Earthdata token, so jobs of
+    different users running side by side never share a login. Without
+    credentials, the process-wide login from the environment or .netrc is used.
+    """
+    def __init__(self, username: str | None = None, password: str | None = None):
+        self.username = username
+        self.password = password
+        self.token    = None
+        self._local   = threading.local()
+
+    def login(self):
+        try:
+            if self.username and self.password:
+                # earthaccess only logs in with explicit credentials through the environment,
+                # which every job thread shares, so the token comes from Earthdata Login itself
+                resp = requests.post(constants.EARTHDATA_TOKEN, auth=(self.username, self.password), timeout=60)
+                if resp.status_code == 401:
+                    raise eax.LoginAttemptFailure(resp.text)
+                resp.raise_for_status()
+                self.token = resp.json()["access_token"]
+            else:
+                ea.login()
+        except eax.LoginAttemptFailure:
+            raise ValueError(
+                "Your EarthData credentials are incorrect. " \
+                "Please check them and try again."
+            )
+
+    def session(self) -> requests.Session:
+        """
+        Returns an authenticated session of this source for the calling thread.
+        """
+        if self.token is None:
+            return downloading.session()
+        if not hasattr(self._local, "session"):
+            session = requests.Session()
+            session.headers["Authorization"] = f"Bearer {self.token}"
+            self._local.session = session
+        return self._local.session
+
+    def _context(self, context: DownloadContext) -> DownloadContext:
+        return context.model_copy(update={"session": self.session})
+
+    def search(self, short_name: str, start: datetime.date, end: datetime.date) -> list[dict[str, Any]]:
+        if self.token is None:
+            return ea.search_data(short_name=short_name, temporal=(start, end))
+        # the collections are public, so the search needs no login of any other job
+        return DataGranules().parameters(short_name=short_name, temporal=(start, end)).get_all()
+
+    def fetch(self, granule: dict[str, Any], short_name: str, context: DownloadContext) -> list[str]:
+        return fetch_granule(granule, short_name, self._context(context))
+
+    def fetch_all(self, granules: list[dict[str, Any]], short_name: str, context: DownloadContext) -> list[str]:
+        return fetch_granules(granules, short_name, self._context(context))
+
+class LocalSource(DataSource):
+    """
+    Serves granules from a local directory laid out as <root>/<short name>/...,
+    such as a mirror of the granule cache or the output of granules.synthetic.
+    Nothing is downloaded and no credentials are needed. Each time step of a
+    multi-step file is a granule of its own.
+    """
+    def __init__(self, root: str, catalog: Catalog | None = None):
+        self.root    = root
+        self.catalog = catalog or Catalog(os.path.join(root, "catalog.sqlite"))
+        self.catalog.scan(root)
+
+    def search(self, short_name: str, start: datetime.date, end: datetime.date) -> list[dict[str, Any]]:
+        return [
+            {
+                "umm": {
+                    "GranuleUR": os.path.basename(path),
+                    "TemporalExtent": {"RangeDateTime": {"BeginningDateTime": time.isoformat()}}
+                },
+                "path": path
+            }
+            for time, path in self.catalog.lookup(short_name, start, end)
+            if split_step(path)[0].endswith(GRANULE_SUFFIXES)
+        ]
+
+    def fetch(self, granule: dict[str, Any], short_name: str, context: DownloadContext) -> list[str]:
+        return [granule["path"]]
@@ -0,0 +1,251 @@
+import os
+import argparse
+import datetime
+import numpy as np
+from netCDF4 import Dataset
+from utils.constants import DATASET_GRIDS
+
+MERRA2_LATS: np.ndarray = DATASET_GRIDS["MERRA-2"][0]
+MERRA2_LONS: np.ndarray = DATASET_GRIDS["MERRA-2"][1]
+CCMP_LATS: np.ndarray   = DATASET_GRIDS["CCMP"][0]
+CCMP_LONS: np.ndarray   = DATASET_GRIDS["CCMP"][1]
+
+# MERRA-2 pressure levels in hPa, as in the 3D assimilated collections
+MERRA2_LEVELS: np.ndarray = np.array([
+    1000, 975, 950, 925, 900, 875, 850, 825, 800, 775, 750, 725, 700,
+    650, 600, 550, 500, 450, 400, 350, 300, 250, 200, 150, 100,
+    70, 50, 40, 30, 20, 10, 7, 5, 4, 3, 2, 1, 0.7, 0.5, 0.4, 0.3, 0.1
+], dtype=np.float64)
+
+# grid, time steps of each daily file and the time between them, offset of the
+# first step from midnight, file name pattern, pressure levels and variables of each collection
+COLLECTIONS: dict[str, dict] = {
+    "CCMP_WINDS_10M6HR_L4_V3.1": {
+        "grid": (CCMP_LATS, CCMP_LONS),
+        "steps": 4,
+        "interval": datetime.timedelta(hours=6),
+        "offset": datetime.timedelta(0),
+        "name": "CCMP_Wind_Analysis_%Y%m%d_V03.1_L4.nc",
+        "levels": None,
+        "variables": ("uwnd", "vwnd")
+    },
+    "M2I3NPASM": {
+        "grid": (MERRA2_LATS, MERRA2_LONS),
+        "steps": 8,
+        "interval": datetime.timedelta(hours=3),
+        "offset": datetime.timedelta(0),
+        "name": "MERRA2_{stream}.inst3_3d_asm_Np.%Y%m%d.nc4",
+        "levels": MERRA2_LEVELS,
+        "variables": ("PHIS",)
+    },
+    "M2T1NXSLV": {
+        "grid": (MERRA2_LATS, MERRA2_LONS),
+        "steps": 24,
+        "interval": datetime.timedelta(hours=1),
+        "offset": datetime.timedelta(minutes=30),
+        "name": "MERRA2_{stream}.tavg1_2d_slv_Nx.%Y%m%d.nc4",
+        "levels": None,
+        "variables": ("T2M", "SLP", "H1000", "H500", "U500", "V500")
+    },
+    "M2T1NXFLX": {
+        "grid": (MERRA2_LATS, MERRA2_LONS),
+        "steps": 24,
+        "interval": datetime.timedelta(hours=1),
+        "offset": datetime.timedelta(minutes=30),
+        "name": "MERRA2_{stream}.tavg1_2d_flx_Nx.%Y%m%d.nc4",
+        "levels": None,
+        "variables": ("PRECTOT", "PRECSNO")
+    }
+}
+
+UNITS: dict[str, str] = {
+    "uwnd": "m s-1",
+    "vwnd": "m s-1",
+    "PHIS": "m+2 s-2",
+    "T2M": "K",
+    "SLP": "Pa",
+    "H1000": "m",
+    "H500": "m",
+    "U500": "m s-1",
+    "V500": "m s-1",
+    "PRECTOT": "kg m-2 s-1",
+    "PRECSNO": "kg m-2 s-1"
+}
+
+FILL_VALUE: float = 1e15
+
+def synthetic_fields(lats: np.ndarray, lons: np.ndarray, time: datetime.datetime, seed: int = 0) -> dict[str, np.ndarray]:
+    """
+    Builds plausible fields on a grid: zonal temperature and height gradients,
+    travelling waves, westerly jets and patchy precipitation that is snow where
+    it is cold. The fields are deterministic in the seed and the valid time.
+
+    Args:
+        lats (np.ndarray): The latitude coordinates
+        lons (np.ndarray): The longitude coordinates
+        time (datetime.datetime): The valid time
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        dict[str, np.ndarray]: The float32 fields keyed by variable name
+    """
+    rng   = np.random.default_rng([seed, int((time - datetime.datetime(2000, 1, 1)).total_seconds())])
+    phase = (time - datetime.datetime(2000, 1, 1)).total_seconds() / 86400 * 2 * np.pi / 5
+
+    lat  = np.deg2rad(lats)[:, None]
+    lon  = np.deg2rad(lons)[None, :]
+    wave = np.cos(lat) ** 2 * np.sin(4 * lon - phase) * np.sin(2 * lat + phase / 3)
+    jet  = np.exp(-((np.abs(np.rad2deg(lat)) - 45) / 12) ** 2)
+
+    t2m   = 300 - 50 * np.sin(lat) ** 2 + 8 * wave
+    h500  = 5900 - 700 * np.sin(lat) ** 2 + 150 * wave
+    slp   = 101325 + 1500 * wave + 300 * np.cos(3 * lon + phase) * np.cos(lat)
+    h1000 = (slp - 100000) / 12
+    phis  = 9.81 * np.clip(3000 * np.sin(3 * lon) * np.cos(2 * lat) * np.sin(5 * lat), 0, None)
+
+    dy = np.gradient(wave, axis=0)
+    dx = np.gradient(wave, axis=1)
+
+    # precipitation falls in bands along the waves, and as snow where it is cold
+    prectot = np.clip(wave + 0.2 * rng.standard_normal(wave.shape), 0, None) ** 2 * 5e-4
+    precsno = np.where(t2m < 273.15, prectot, 0)
+
+    fields = {
+        "uwnd": 15 * jet - 40 * dy + 2 * rng.standard_normal(wave.shape),
+        "vwnd": 40 * dx + 2 * rng.standard_normal(wave.shape),
+        "PHIS": phis,
+        "T2M": t2m,
+        "SLP": slp,
+        "H1000": h1000,
+        "H500": h500,
+        "U500": 30 * jet - 80 * dy,
+        "V500": 80 * dx,
+        "PRECTOT": prectot,
+        "PRECSNO": precsno
+    }
+    return {name: np.broadcast_to(field, wave.shape).astype(np.float32) for name, field in fields.items()}
+
+def merra2_stream(day: datetime.date) -> int:
+    """
+    Gets the MERRA-2 production stream that covers a day, as it appears in file names.
+
+    Args:
+        day (datetime.date): The day
+
+    Returns:
+        int: The stream number
+    """
+    if day.year < 1992:
+        return 100
+    if day.year < 2001:
+        return 200
+    if day.year < 2011:
+        return 300
+    return 400
+
+def granule_name(short_name: str, day: datetime.date) -> str:
+    """
+    Names the daily granule file of a collection the way the archive does.
+
+    Args:
+        short_name (str): The collection short name
+        day (datetime.date): The day of the granule
+
+    Returns:
+        str: The file name
+    """
+    return day.strftime(COLLECTIONS[short_name]["name"].format(stream=merra2_stream(day)))
+
+def write_granule(path: str, short_name: str, time: datetime.date, seed: int = 0) -> str:
+    """
+    Writes a synthetic daily granule of a collection, with every time step
+    of the day and the pressure levels of 3D collections, compressed like
+    the archive's netCDF4 files.
+
+    Args:
+        path (str): The destination path
+        short_name (str): The collection short name
+        time (datetime.date): The day of the granule, whose time of day is ignored
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        str: The destination path
+    """
+    spec       = COLLECTIONS[short_name]
+    lats, lons = spec["grid"]
+    first      = datetime.datetime(time.year, time.month, time.day) + spec["offset"]
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with Dataset(path, "w") as ds:
+        ds.createDimension("time", None)
+        if spec["levels"] is not None:
+            ds.createDimension("lev", spec["levels"].size)
+        ds.createDimension("lat", lats.size)
+        ds.createDimension("lon", lons.size)
+
+        var = ds.createVariable("time", "i4", ("time",))
+        var.units = f"minutes since {first:%Y-%m-%d %H:%M:%S}"
+        var[:] = np.arange(spec["steps"]) * int(spec["interval"].total_seconds() // 60)
+
+        if spec["levels"] is not None:
+            var = ds.createVariable("lev", "f8", ("lev",))
+            var.units = "hPa"
+            var[:] = spec["levels"]
+
+        ds.createVariable("lat", "f8", ("lat",))[:] = lats
+        ds.createVariable("lon", "f8", ("lon",))[:] = lons
+
+        variables = {}
+        for name in spec["variables"]:
+            variables[name] = ds.createVariable(
+                name, "f4", ("time", "lat", "lon"),
+                fill_value=np.float32(FILL_VALUE), zlib=True, complevel=1, chunksizes=(1, lats.size, lons.size)
+            )
+            variables[name].units = UNITS[name]
+
+        for step in range(spec["steps"]):
+            fields = synthetic_fields(lats, lons, first + step * spec["interval"], seed)
+            for name, var in variables.items():
+                var[step] = fields[name]
+
+    return path
+
+def generate(root: str, short_names: list[str], start: datetime.datetime, end: datetime.datetime, seed: int = 0) -> list[str]:
+    """
+    Writes the synthetic daily granules of several collections covering a time range,
+    laid out as <root>/<short name>/<file> so granules.sources.LocalSource can serve them.
+    Granules that already exist are kept.
+
+    Args:
+        root (str): The root directory
+        short_names (list[str]): The collection short names
+        start (datetime.datetime): The start of the range, inclusive
+        end (datetime.datetime): The end of the range, exclusive
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        list[str]: The granule paths
+    """
+    paths = []
+    for short_name in short_names:
+        day = datetime.datetime(start.year, start.month, start.day)
+        while day < end:
+            path = os.path.join(root, short_name, granule_name(short_name, day))
+            if not os.path.exists(path):
+                write_granule(path, short_name, day, seed)
+            paths.append(path)
+            day += datetime.timedelta(days=1)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Writes synthetic CCMP and MERRA-2 granules at their real grid sizes.")
+    parser.add_argument("root", help="The directory to write the granules to")
+    parser.add_argument("--start", default="2020-01-01", help="The first day, as YYYY-MM-DD")
+    parser.add_argument("--days", type=int, default=1, help="The number of days")
+    parser.add_argument("--collections", nargs="+", default=list(COLLECTIONS), choices=list(COLLECTIONS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = datetime.datetime.strptime(args.start, "%Y-%m-%d")
+    paths = generate(args.root, args.collections, start, start + datetime.timedelta(days=args.days), args.seed)
+    print(f"Wrote {len(paths)} granules to {args.root}")
@@ -0,0 +1,106 @@
+import json
+import hashlib
+import threading
+from typing import Any, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from driver import handler
+from utils import constants
+
+PRIVATE_FIELDS: tuple[str, ...] = ("auth_user", "auth_pass")
+
+def job_key(event: dict[str, Any]) -> str:
+    """
+    Computes the identity of a job from its event.
+    Credentials only enter as a digest, so identical requests coalesce only
+    within the same login and a session never joins a job it could not run itself.
+
+    Args:
+        event (dict[str, Any]): The job event
+
+    Returns:
+        str: The job key
+    """
+    public = {k: v for k, v in event.items() if k not in PRIVATE_FIELDS}
+    login  = "\0".join(str(event.get(field) or "") for field in PRIVATE_FIELDS)
+    public["credentials"] = hashlib.sha256(login.encode()).hexdigest()
+    return hashlib.sha256(json.dumps(public, sort_keys=True, default=str).encode()).hexdigest()
+
+class Job:
+    """
+    A handler job shared by every session that asked for it.
+    """
+    def __init__(self, key: str):
+        self.key      = key
+        self.stages   = {}
+        self.sessions = 1
+        self.future   = Future()
+        self._lock    = threading.Lock()
+
+    def report(self, stage: str, fraction: float):
+        with self._lock:
+            self.stages[stage] = fraction
+
+    def progress(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self.stages)
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: float | None = None) -> Any:
+        return self.future.result(timeout)
+
+class JobManager:
+    """
+    Runs handler jobs on a worker pool, off the Streamlit script thread.
+    Requests identical to a job still in flight join that job instead of
+    starting a new one, and share its result.
+    """
+    def __init__(self, workers: int = constants.JOB_WORKERS, run: Callable = handler):
+        self.run      = run
+        self.jobs     = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nimbus-job")
+        self._lock    = threading.Lock()
+
+    def submit(self, event: dict[str, Any]) -> Job:
+        """
+        Submits a job, or joins the identical job already in flight.
+
+        Args:
+            event (dict[str, Any]): The job event
+
+        Returns:
+            Job: The job
+        """
+        key = job_key(event)
+
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is not None:
+                job.sessions += 1
+                return job
+
+            job = self.jobs[key] = Job(key)
+
+        future = self.executor.submit(self.run, event, job.report)
+        future.add_done_callback(lambda done: self._finish(job, done))
+        return job
+
+    def _finish(self, job: Job, done: Future):
+        with self._lock:
+            self.jobs.pop(job.key, None)
+
+        # jobs dropped by shutdown never ran, so their sessions stop waiting
+        if done.cancelled():
+            job.future.cancel()
+        elif done.exception() is not None:
+            job.future.set_exception(done.exception())
+        else:
+            job.future.set_result(done.result())
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self.jobs)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,183 @@
+import os
+import json
+import uuid
+import threading
+import shutil
+import hashlib
+import numpy as np
+import matplotlib as mpl
+from typing import Any
+from processing.preprocessing import PREPROCESSING_VERSION
+from utils.schemas import PlotterContext
+
+def fingerprint(value: Any) -> Any:
+    """
+    Reduces a plotting parameter to a JSON-serializable value that identifies it.
+
+    Args:
+        value (Any): The parameter
+
+    Returns:
+        Any: The fingerprint
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    if isinstance(value, np.ndarray):
+        return hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+    if isinstance(value, (list, tuple)):
+        return [fingerprint(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): fingerprint(v) for k, v in sorted(value.items())}
+    if isinstance(value, mpl.colors.Colormap):
+        return {"name": value.name, "lut": fingerprint(value(np.linspace(0, 1, value.N)))}
+    if isinstance(value, mpl.colors.BoundaryNorm):
+        return {"boundaries": fingerprint(value.boundaries), "ncolors": value.Ncmap, "extend": value.extend}
+    if isinstance(value, mpl.colors.Normalize):
+        return {"norm": type(value).__name__, "vmin": value.vmin, "vmax": value.vmax, "clip": value.clip}
+    return repr(value)
+
+def frame_key(inputs: list[str], view: str, context: PlotterContext, category: str, extra: dict[str, Any] | None = None) -> str:
+    """
+    Computes the cache key of a rendered frame.
+
+    Args:
+        inputs (list[str]): The identities of the input granules
+        view (str): The view
+        context (PlotterContext): The plotter context, including the colormap
+        category (str): The product category
+        extra (dict[str, Any], optional): Any other parameters that change the frame. Defaults to None.
+
+    Returns:
+        str: The frame key
+    """
+    spec = {
+        "inputs": list(inputs),
+        "version": PREPROCESSING_VERSION,
+        "view": view,
+        "category": category,
+        "context": {name: fingerprint(getattr(context, name)) for name in type(context).model_fields},
+        "extra": fingerprint(extra or {})
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+class FrameCache:
+    """
+    Content-addressed cache of rendered frames with a disk quota.
+
+    Frames are evicted least recently used first once the cache grows past its quota.
+    A frame's modification time is refreshed on every hit and serves as its last use.
+    The total size is counted once and then kept up to date on every put, so the
+    cache is only scanned again when it has to evict.
+    """
+    def __init__(self, root: str, quota: int):
+        self.root   = root
+        self.quota  = quota
+        self._total = None
+        self._lock  = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.png")
+
+    def get(self, key: str, dest: str | None = None) -> dict[str, Any] | None:
+        """
+        Looks up a frame, copying it to the destination on a hit.
+
+        Args:
+            key (str): The frame key
+            dest (str, optional): Where to place the cached frame. Defaults to the path it was cached from.
+
+        Returns:
+            dict[str, Any] | None: The frame metadata, or None on a miss
+        """
+        path = self._path(key)
+        meta = f"{path[:-4]}.json"
+        try:
+            with open(meta, "r") as f:
+                record = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        dest = dest or record["path"]
+        if os.path.abspath(dest) != os.path.abspath(path):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copyfile(path, dest)
+
+        return {**record, "path": dest}
+
+    def put(self, key: str, src: str, **metadata: Any):
+        """
+        Adds a rendered frame to the cache and enforces the quota.
+
+        Args:
+            key (str): The frame key
+            src (str): The rendered frame
+            **metadata (Any): Anything needed to place the frame on a later hit, such as its timestamp
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # jobs run as threads of one process, so the temp name is unique per put
+        temp = f"{path}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(src, temp)
+        added = os.path.getsize(temp)
+        try:
+            added -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(temp, path)
+
+        with open(f"{temp}.json", "w") as f:
+            json.dump({"path": src, **metadata}, f)
+        os.replace(f"{temp}.json", f"{path[:-4]}.json")
+
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_size()
+            else:
+                self._total += added
+            over = self._total > self.quota
+
+        if over:
+            self.evict()
+
+    def size(self) -> int:
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_size()
+            return self._total
+
+    def _scan_size(self) -> int:
+        return sum(os.path.getsize(path) for path, _ in self._entries())
+
+    def _entries(self) -> list[tuple[str, float]]:
+        entries = []
+        if not os.path.exists(self.root):
+            return entries
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".png"):
+                    entries.append((entry.path, entry.stat().st_mtime))
+        return entries
+
+    def evict(self):
+        """
+        Evicts least recently used frames until the cache fits its quota.
+        """
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            total   = sum(os.path.getsize(path) for path, _ in entries)
+
+            for path, _ in entries:
+                if total <= self.quota:
+                    break
+                total -= os.path.getsize(path)
+                for stale in (path, f"{path[:-4]}.json"):
+                    if os.path.exists(stale):
+                        os.remove(stale)
+
+            self._total = total
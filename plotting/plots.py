@@ -1,12 +1,17 @@
 import os
 import io
+import threading
 import numpy as np
 from PIL import Image
 import cartopy.crs as ccrs
 import matplotlib.pyplot as plt
 from abc import ABC, abstractmethod
+from plotting import warping
 from utils.schemas import PlotterContext
 
+# pyplot keeps its current figure in global state, so concurrent jobs render one at a time
+RENDER_LOCK: threading.RLock = threading.RLock()
+
 class Plotter(ABC):
     def __init__(self):
         pass
@@ -15,6 +20,25 @@ class Plotter(ABC):
     def render(self):
         pass
 
+    def imshow(self, data: np.ndarray, **kwargs):
+        """
+        Draws an image on the axes like imshow with the plotter's extent and
+        transform, but warps it with the cached warp map of its grid in the view
+        instead of having cartopy warp every frame.
+
+        Args:
+            data (np.ndarray): The image
+            **kwargs: Any other imshow arguments
+        """
+        transform  = self.transform()
+        projection = self.ax.projection
+        if transform == projection:
+            return self.ax.imshow(data, extent=self.extent, transform=transform, **kwargs)
+
+        warp = warping.WARPS.get(transform, self.extent, data.shape[:2], projection, self.ax.get_extent(projection))
+        origin = kwargs.pop("origin", "upper")
+        return self.ax.imshow(warp(data, origin), extent=warp.extent, origin="lower", transform=projection, **kwargs)
+
 class WindPlotter(Plotter):
     """
     10m winds
@@ -48,14 +72,12 @@ class WindPlotter(Plotter):
         if self.limit:
             self.ax.set_extent(self.limit, self.transform())
         
-        self.ax.imshow(
+        self.imshow(
             self.data,
             cmap=self.cmap,
             norm=self.norm,
             origin=self.origin,
-            interpolation=self.interpolation,
-            extent=self.extent,
-            transform=self.transform()
+            interpolation=self.interpolation
         )
         
         if self.inplace:
@@ -127,14 +149,12 @@ class T2MPlotter(Plotter):
         if self.limit:
             self.ax.set_extent(self.limit, self.transform())
         
-        self.ax.imshow(
+        self.imshow(
             self.data,
             cmap=self.cmap,
             norm=self.norm,
             origin=self.origin,
-            interpolation=self.interpolation,
-            extent=self.extent,
-            transform=self.transform()
+            interpolation=self.interpolation
         )
         
         if self.inplace:
@@ -297,14 +317,12 @@ class CAPEPlotter(Plotter):
         if self.limit:
             self.ax.set_extent(self.limit, self.transform())
         
-        self.ax.imshow(
+        self.imshow(
             self.data,
             cmap=self.cmap,
             norm=self.norm,
             origin=self.origin,
-            interpolation=self.interpolation,
-            extent=self.extent,
-            transform=self.transform()
+            interpolation=self.interpolation
         )
         
         if self.inplace:
@@ -376,14 +394,12 @@ class Pressurelotter(Plotter):
         if self.limit:
             self.ax.set_extent(self.limit, self.transform())
         
-        self.ax.imshow(
+        self.imshow(
             self.data,
             cmap=self.cmap,
             norm=self.norm,
             origin=self.origin,
-            interpolation=self.interpolation,
-            extent=self.extent,
-            transform=self.transform()
+            interpolation=self.interpolation
         )
         
         if self.inplace:
@@ -461,12 +477,10 @@ class AerosolPlotter(Plotter):
             self.ax.set_extent(self.limit, self.transform())
         
         for aerosol in self.data:
-            self.ax.imshow(
+            self.imshow(
                 aerosol,
                 origin=self.origin,
-                interpolation=self.interpolation,
-                extent=self.extent,
-                transform=self.transform()
+                interpolation=self.interpolation
             )
         
         if self.inplace:
@@ -540,14 +554,12 @@ class LWIRPlotter(Plotter):
         if self.limit:
             self.ax.set_extent(self.limit, self.transform())
         
-        self.ax.imshow(
+        self.imshow(
             self.data,
             cmap=self.cmap,
             norm=self.norm,
             origin=self.origin,
-            interpolation=self.interpolation,
-            extent=self.extent,
-            transform=self.transform()
+            interpolation=self.interpolation
         )
         
         if self.inplace:
@@ -620,14 +632,12 @@ class RadarPlotter(Plotter):
         if self.limit:
             self.ax.set_extent(self.limit, self.transform())
         
-        self.ax.imshow(
+        self.imshow(
             self.data,
             cmap=self.cmap,
             norm=self.norm,
             origin=self.origin,
-            interpolation=self.interpolation,
-            extent=self.extent,
-            transform=self.transform()
+            interpolation=self.interpolation
         )
         
         if self.inplace:
@@ -699,14 +709,12 @@ class AccRainPlotter(Plotter):
         if self.limit:
             self.ax.set_extent(self.limit, self.transform())
         
-        self.ax.imshow(
+        self.imshow(
             self.data,
             cmap=self.cmap,
             norm=self.norm,
             origin=self.origin,
-            interpolation=self.interpolation,
-            extent=self.extent,
-            transform=self.transform()
+            interpolation=self.interpolation
         )
         
         if self.inplace:
@@ -778,14 +786,12 @@ class AccSnowPlotter(Plotter):
         if self.limit:
             self.ax.set_extent(self.limit, self.transform())
         
-        self.ax.imshow(
+        self.imshow(
             self.data,
             cmap=self.cmap,
             norm=self.norm,
             origin=self.origin,
-            interpolation=self.interpolation,
-            extent=self.extent,
-            transform=self.transform()
+            interpolation=self.interpolation
         )
         
         if self.inplace:
@@ -856,14 +862,12 @@ class TPWPlotter(Plotter):
         if self.limit:
             self.ax.set_extent(self.limit, self.transform())
         
-        self.ax.imshow(
+        self.imshow(
             self.data,
             cmap=self.cmap,
             norm=self.norm,
             origin=self.origin,
-            interpolation=self.interpolation,
-            extent=self.extent,
-            transform=self.transform()
+            interpolation=self.interpolation
         )
         
         if self.inplace:
@@ -946,14 +950,12 @@ class VorticityPlotter(Plotter):
         lats       = np.linspace(self.extent[2], self.extent[3], height)
         lons, lats = np.meshgrid(lons, lats)
         
-        self.ax.imshow(
+        self.imshow(
             data,
             cmap=self.cmap,
             norm=self.norm,
             origin=self.origin,
-            interpolation=self.interpolation,
-            extent=self.extent,
-            transform=self.transform()
+            interpolation=self.interpolation
         )
 
         heightsc = self.ax.contour(
@@ -1003,3 +1005,12 @@ class VorticityPlotter(Plotter):
         img.save(os.path.join(cache_dir, self.tag, "frames", "vorticity", year, month, day, f"{hour}.png"))
         buffer.close()
 
+
+
+PLOTTERS: dict[str, type[Plotter]] = {
+    "10m winds": WindPlotter,
+    "weather types": WeatherPlotter,
+    "accumulated rainfall": AccRainPlotter,
+    "accumulated snowfall": AccSnowPlotter,
+    "vorticity": VorticityPlotter
+}
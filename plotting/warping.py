@@ -0,0 +1,207 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+import numpy as np
+import cartopy.crs as ccrs
+from collections import OrderedDict
+from cartopy.img_transform import warp_array
+from utils import constants
+
+# the length of the shorter side of a warped image, as cartopy's imshow uses by default
+WARP_SHAPE: int = 750
+
+def warp_shape(target_extent: tuple[float, float, float, float], size: int = WARP_SHAPE) -> tuple[int, int]:
+    """
+    Computes the (nx, ny) shape of a warped image with the aspect of its target extent,
+    as GeoAxes._regrid_shape_aspect does.
+
+    Args:
+        target_extent (tuple[float, float, float, float]): The extent in target projection coordinates
+        size (int, optional): The length of the shorter side. Defaults to WARP_SHAPE.
+
+    Returns:
+        tuple[int, int]: The shape
+    """
+    x_range, y_range = np.diff(target_extent)[::2]
+    aspect = x_range / y_range
+    return (int(size * aspect), size) if x_range >= y_range else (size, int(size / aspect))
+
+def warp_key(
+    source_proj: ccrs.Projection,
+    source_extent: tuple[float, float, float, float],
+    source_shape: tuple[int, int],
+    target_proj: ccrs.Projection,
+    target_extent: tuple[float, float, float, float]
+) -> str:
+    """
+    Computes the key of a warp map from everything that places its pixels.
+
+    Args:
+        source_proj (ccrs.Projection): The projection of the data
+        source_extent (tuple[float, float, float, float]): The extent of the data in source coordinates
+        source_shape (tuple[int, int]): The (H, W) shape of the data
+        target_proj (ccrs.Projection): The projection of the axes
+        target_extent (tuple[float, float, float, float]): The extent of the axes in target coordinates
+
+    Returns:
+        str: The key
+    """
+    spec = {
+        "source": source_proj.srs,
+        "source_extent": [float(x) for x in source_extent],
+        "source_shape": [int(n) for n in source_shape],
+        "target": target_proj.srs,
+        "target_extent": [round(float(x), 3) for x in target_extent],
+        "size": WARP_SHAPE
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+class WarpMap:
+    """
+    The source pixel shown at each pixel of a warped image, with the pixels
+    that fall off the source grid or off the projection masked.
+
+    The map is cartopy's own nearest-neighbour warp of an image of flat source
+    indices, so applying it is the same as warping with imshow's transform,
+    but without the k-d tree and the projection of every pixel on each frame.
+    """
+    def __init__(self, index: np.ndarray, mask: np.ndarray, extent: tuple[float, float, float, float]):
+        self.index  = index
+        self.mask   = mask
+        self.extent = extent
+
+    @classmethod
+    def build(
+        cls,
+        source_proj: ccrs.Projection,
+        source_extent: tuple[float, float, float, float],
+        source_shape: tuple[int, int],
+        target_proj: ccrs.Projection,
+        target_extent: tuple[float, float, float, float]
+    ) -> "WarpMap":
+        """
+        Builds the warp map of a source grid in a target view.
+
+        Args:
+            source_proj (ccrs.Projection): The projection of the data
+            source_extent (tuple[float, float, float, float]): The extent of the data in source coordinates
+            source_shape (tuple[int, int]): The (H, W) shape of the data
+            target_proj (ccrs.Projection): The projection of the axes
+            target_extent (tuple[float, float, float, float]): The extent of the axes in target coordinates
+
+        Returns:
+            WarpMap: The warp map
+        """
+        indices = np.arange(source_shape[0] * source_shape[1], dtype=np.int64).reshape(source_shape)
+        warped, extent = warp_array(
+            indices,
+            source_proj=source_proj,
+            source_extent=source_extent,
+            target_proj=target_proj,
+            target_res=warp_shape(target_extent),
+            target_extent=target_extent,
+            mask_extrapolated=True
+        )
+        mask = np.ma.getmaskarray(warped)
+        return cls(np.ma.filled(warped, 0).astype(np.int64), mask, tuple(float(x) for x in extent))
+
+    @classmethod
+    def load(cls, path: str) -> "WarpMap":
+        with np.load(path) as arrays:
+            return cls(arrays["index"], arrays["mask"], tuple(arrays["extent"].tolist()))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # jobs run as threads of one process, so the temp name is unique per write
+        temp = f"{path}.{uuid.uuid4().hex}.tmp.npz"
+        np.savez(temp, index=self.index, mask=self.mask, extent=np.asarray(self.extent))
+        os.replace(temp, path)
+
+    def __call__(self, data: np.ndarray, origin: str = "upper") -> np.ma.MaskedArray:
+        """
+        Warps an image with a single gather. Trailing dimensions, such as
+        the channels of RGBA images, are carried along.
+
+        Args:
+            data (np.ndarray): The (H, W, ...) image, masked or not
+            origin (str, optional): The origin of the image rows, as in imshow. Defaults to "upper".
+
+        Returns:
+            np.ma.MaskedArray: The warped image, with origin "lower"
+        """
+        data = np.ma.asarray(data)
+        if origin == "upper":
+            data = data[::-1]
+
+        flat   = data.reshape((-1,) + data.shape[2:])
+        values = np.ma.getdata(flat)[self.index]
+        mask   = np.ma.getmaskarray(flat)[self.index]
+        return np.ma.MaskedArray(values, mask=mask | self.mask.reshape(self.mask.shape + (1,) * (values.ndim - 2)))
+
+class WarpCache:
+    """
+    In-process LRU of warp maps, backed by the maps persisted on disk, so
+    each view and source grid is warped by cartopy only once. The cache is
+    shared by the job threads, and each map is built by one of them while
+    the others wait for it.
+    """
+    def __init__(self, root: str | None = constants.WARPS_DIR, size: int = constants.WARP_CACHE_SIZE):
+        self.root     = root
+        self.size     = size
+        self.maps     = OrderedDict()
+        self._lock    = threading.Lock()
+        self._loading = {}
+
+    def get(
+        self,
+        source_proj: ccrs.Projection,
+        source_extent: tuple[float, float, float, float],
+        source_shape: tuple[int, int],
+        target_proj: ccrs.Projection,
+        target_extent: tuple[float, float, float, float]
+    ) -> WarpMap:
+        """
+        Gets the warp map of a source grid in a target view, building it on a miss.
+
+        Args:
+            source_proj (ccrs.Projection): The projection of the data
+            source_extent (tuple[float, float, float, float]): The extent of the data in source coordinates
+            source_shape (tuple[int, int]): The (H, W) shape of the data
+            target_proj (ccrs.Projection): The projection of the axes
+            target_extent (tuple[float, float, float, float]): The extent of the axes in target coordinates
+
+        Returns:
+            WarpMap: The warp map
+        """
+        key = warp_key(source_proj, source_extent, source_shape, target_proj, target_extent)
+        with self._lock:
+            if key in self.maps:
+                self.maps.move_to_end(key)
+                return self.maps[key]
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        # other maps keep building while this one does
+        with loading:
+            with self._lock:
+                if key in self.maps:
+                    self.maps.move_to_end(key)
+                    return self.maps[key]
+
+            path = os.path.join(self.root, f"{key}.npz") if self.root is not None else None
+            if path is not None and os.path.exists(path):
+                warp = WarpMap.load(path)
+            else:
+                warp = WarpMap.build(source_proj, source_extent, source_shape, target_proj, target_extent)
+                if path is not None:
+                    warp.save(path)
+
+            with self._lock:
+                self.maps[key] = warp
+                self._loading.pop(key, None)
+                while len(self.maps) > self.size:
+                    self.maps.popitem(last=False)
+        return warp
+
+WARPS: WarpCache = WarpCache()
@@ -0,0 +1,168 @@
+import os
+import json
+import uuid
+import datetime
+import numpy as np
+from processing import preprocessing
+from processing.storing import FieldStore
+from processing.casting import compute_dtype
+from utils.schemas import PrecisionContext
+from granules.reading import GranuleReader
+
+ACCUMULATED_VARIABLES: dict[str, str] = {
+    "accumulated rainfall": "PRECTOT",
+    "accumulated snowfall": "PRECSNO"
+}
+
+class AccumulatorStore:
+    """
+    Running precipitation totals persisted across jobs.
+
+    Totals are keyed by dataset, variable and accumulation start, and the
+    running total at every accumulated hour is kept as a field store chunk.
+    Extending a range only reads the granules of the new hours, and a
+    rolling total over the last N hours is the difference of two stored totals.
+    Totals are kept in at least float32 whatever the field precision policy is.
+    """
+    def __init__(self, root: str, precision: PrecisionContext | None = None):
+        policy = precision or PrecisionContext()
+        # totals add small hourly amounts to large sums and are differenced for
+        # rolling windows, so they are never kept or added below float32
+        self.fields = FieldStore(root, PrecisionContext(
+            storage=np.result_type(policy.storage, np.float32).name,
+            compute=np.result_type(policy.compute, np.float32).name
+        ))
+
+    def _key(self, dataset: str, start: datetime.datetime) -> str:
+        return os.path.join(dataset, f"acc-{start:%Y%m%dT%H%M}")
+
+    def _manifest(self, dataset: str, start: datetime.datetime) -> str:
+        return os.path.join(self.fields._dir(self._key(dataset, start)), "times.json")
+
+    def times(self, dataset: str, start: datetime.datetime) -> list[datetime.datetime]:
+        """
+        Lists the hours accumulated so far, in time order.
+
+        Args:
+            dataset (str): The dataset key
+            start (datetime.datetime): The start of the accumulation
+
+        Returns:
+            list[datetime.datetime]: The accumulated hours
+        """
+        try:
+            with open(self._manifest(dataset, start), "r") as f:
+                return [datetime.datetime.fromisoformat(time) for time in json.load(f)]
+        except FileNotFoundError:
+            return []
+
+    def _write_manifest(self, dataset: str, start: datetime.datetime, times: list[datetime.datetime]):
+        manifest = self._manifest(dataset, start)
+        temp     = f"{manifest}.{uuid.uuid4().hex}.tmp"
+        with open(temp, "w") as f:
+            json.dump([time.isoformat() for time in times], f)
+        os.replace(temp, manifest)
+
+    def extend(self, dataset: str, start: datetime.datetime, granules: list[tuple[datetime.datetime, str]], variables: tuple[str, ...] = tuple(ACCUMULATED_VARIABLES.values())) -> list[datetime.datetime]:
+        """
+        Adds the hourly granules not accumulated yet to the running totals.
+        Granules are taken in time order, whatever order they are given in, and
+        those before the start or already accumulated are skipped without being
+        opened. Each granule is read once for all variables, so one FLX read
+        serves both rain and snow.
+
+        A granule that arrives after later hours were accumulated, such as one
+        that was missing and downloaded later, has its amounts added to the
+        totals of those later hours, which are rewritten without reopening
+        their granules.
+
+        Args:
+            dataset (str): The dataset key
+            start (datetime.datetime): The start of the accumulation
+            granules (list[tuple[datetime.datetime, str]]): The valid times and paths of the hourly granules,
+                as Catalog.lookup returns them
+            variables (tuple[str, ...], optional): The variables to accumulate. Defaults to PRECTOT and PRECSNO.
+
+        Returns:
+            list[datetime.datetime]: The hours that were added
+        """
+        key   = self._key(dataset, start)
+        times = self.times(dataset, start)
+        known = set(times)
+        new   = {}
+        for valid_time, path in granules:
+            if valid_time >= start and valid_time not in known:
+                new.setdefault(valid_time, path)
+
+        if not new:
+            return []
+
+        first = min(new)
+        later = [time for time in times if time > first]
+        times = [time for time in times if time < first]
+        if later:
+            # the manifest drops the hours being rewritten first, so an interrupted
+            # job never lists a total that is missing the late hours
+            self._write_manifest(dataset, start, times)
+
+        totals = {
+            variable: self.fields.load(key, times[-1], (variable,))[variable].filled(0.0) if times else 0.0
+            for variable in variables
+        }
+        late  = {variable: 0.0 for variable in variables}
+        added = []
+
+        for valid_time in sorted(set(new) | set(later)):
+            if valid_time in new:
+                with GranuleReader(new[valid_time], variables=variables) as reader:
+                    for variable in variables:
+                        hourly = preprocessing.preprocess_precipitation([reader], variable)[0]
+                        hourly = np.ma.filled(hourly, 0.0).astype(compute_dtype(self.fields.precision))
+                        totals[variable] = hourly + totals[variable]
+                        late[variable]   = hourly + late[variable]
+
+                    self.fields.save(key, valid_time, totals, reader.lats, reader.lons)
+                added.append(valid_time)
+            else:
+                stored = self.fields.load(key, valid_time, variables)
+                totals = {variable: stored[variable].filled(0.0) + late[variable] for variable in variables}
+                self.fields.save(
+                    key, valid_time, totals,
+                    np.load(self.fields._coords_path(key, "lat")), np.load(self.fields._coords_path(key, "lon"))
+                )
+
+            times.append(valid_time)
+
+            # the manifest is written last, so an interrupted job never lists a missing total
+            self._write_manifest(dataset, start, times)
+
+        return added
+
+    def total(self, dataset: str, start: datetime.datetime, valid_time: datetime.datetime, variable: str, hours: int | None = None, extent: tuple[float, float, float, float] | None = None, margin: float = 0.0) -> np.ma.MaskedArray:
+        """
+        Loads the accumulation at an hour, either since the start or over the last hours.
+
+        Args:
+            dataset (str): The dataset key
+            start (datetime.datetime): The start of the accumulation
+            valid_time (datetime.datetime): The accumulated hour
+            variable (str): The accumulated variable
+            hours (int, optional): Accumulate over only this many hours. Defaults to the whole accumulation.
+            extent (tuple[float, float, float, float], optional): The extent to load. Defaults to the full grid.
+            margin (float, optional): The margin around the extent in degrees. Defaults to 0.0.
+
+        Returns:
+            np.ma.MaskedArray: The accumulation in inches, masked below 0.1 inches
+        """
+        key                      = self._key(dataset, start)
+        lat_slice, lon_slices, _ = self.fields.window(key, extent, margin)
+
+        total = self.fields.load(key, valid_time, (variable,), lat_slice, lon_slices)[variable]
+
+        if hours is not None:
+            cutoff  = valid_time - datetime.timedelta(hours=hours)
+            earlier = [time for time in self.times(dataset, start) if time <= cutoff]
+            if earlier:
+                total = total - self.fields.load(key, earlier[-1], (variable,), lat_slice, lon_slices)[variable]
+
+        return np.ma.masked_where(total < 0.1, total)
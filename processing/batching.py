@@ -2,26 +2,34 @@ import os
 import ray
 import datetime
 import numpy as np
-import xesmf as xe
+from typing import Callable
 import matplotlib.pyplot as plt
-from plotting.plots import Plotter
-from utils.schemas import PlotterContext
+from plotting.plots import Plotter, RENDER_LOCK
+from processing.casting import to_compute
+from processing.regridding import regrid_stack
+from utils.schemas import PlotterContext, PrecisionContext
 
-def batch_regrid(batch: dict[str, np.ndarray], regridder: xe.Regridder) -> dict[str, np.ndarray]:
+def batch_regrid(batch: dict[str, np.ndarray], regridder: Callable, precision: PrecisionContext | None = None, chunk_size: int | None = None) -> dict[str, np.ndarray]:
     """
-    Batch process for regridding.
+    Batch process for regridding. A (T, H, W) stack, or a tuple of fields
+    sharing a grid, is regridded with one sparse matrix product per chunk of frames.
 
     Args:
         batch (dict[str, np.ndarray]): Batch of data to regrid
-        regridder (xe.Regridder): Regridder to use for regridding
+        regridder (Callable): Regridder to use for regridding, such as an xe.Regridder or SparseRegridder
+        precision (PrecisionContext, optional): Precision policy to regrid in. Defaults to the dtype of the data.
+        chunk_size (int, optional): Number of frames per product. Defaults to the whole batch.
 
     Returns:
         dict[str, np.ndarray]: Batch of regridded data
     """
-    batch["data"] = regridder(batch["data"])
+    if precision is None:
+        batch["data"] = regrid_stack(batch["data"], regridder, chunk_size)
+    else:
+        batch["data"] = to_compute(regrid_stack(to_compute(batch["data"], precision), regridder, chunk_size), precision)
     return batch
 
-def batch_resample(batch: dict[str, np.ndarray], resample: callable, shape: tuple[int, int]) -> dict[str, np.ndarray]:
+def batch_resample(batch: dict[str, np.ndarray], resample: callable, shape: tuple[int, int], precision: PrecisionContext | None = None) -> dict[str, np.ndarray]:
     """
     Batch process for resampling.
 
@@ -29,11 +37,15 @@ def batch_resample(batch: dict[str, np.ndarray], resample: callable, shape: tupl
         batch (dict[str, np.ndarray]): Batch of data to resample
         resample (callable): Function to use for resampling
         shape (tuple[int, int]): Shape to resample to
+        precision (PrecisionContext, optional): Precision policy to resample in. Defaults to the dtype of the data.
 
     Returns:
         dict[str, np.ndarray]: Batch of resampled data
     """
-    batch["data"] = resample(batch["data"], shape, center=True)
+    if precision is None:
+        batch["data"] = resample(batch["data"], shape, center=True)
+    else:
+        batch["data"] = to_compute(resample(to_compute(batch["data"], precision), shape, center=True), precision)
     return batch
 
 def batch_plot(batch: dict[str, np.ndarray], plotter_cls: Plotter, cache_dir: str, context: PlotterContext) -> dict[str, list[dict[str, str]]]:
@@ -63,10 +75,11 @@ def batch_plot(batch: dict[str, np.ndarray], plotter_cls: Plotter, cache_dir: st
         full_path = os.path.join(cache_dir, context.tag, "frames", "10m-winds", year, month, day)
         os.makedirs(full_path, exist_ok=True)
 
-        plotter.render(cache_dir, timestamp)
         img_path = os.path.join(full_path, f"{hour}.png")
-        plt.savefig(img_path)
-        plt.close()
+        with RENDER_LOCK:
+            plotter.render(cache_dir, timestamp)
+            plt.savefig(img_path)
+            plt.close()
 
         result.append({"path": img_path, "status": "created"})
 
@@ -0,0 +1,39 @@
+import numpy as np
+from typing import Any
+from utils.schemas import PrecisionContext
+
+def compute_dtype(precision: PrecisionContext | None) -> np.dtype:
+    """
+    Gets the dtype arithmetic runs in under a precision policy.
+    """
+    return np.dtype((precision or PrecisionContext()).compute)
+
+def storage_dtype(precision: PrecisionContext | None) -> np.dtype:
+    """
+    Gets the dtype fields are kept in at rest under a precision policy.
+    """
+    return np.dtype((precision or PrecisionContext()).storage)
+
+def cast(data: Any, dtype: np.dtype) -> Any:
+    """
+    Casts a field, a masked field, or each field of a tuple to a floating dtype.
+    Fields already in that dtype are returned as they are, without a copy.
+
+    Args:
+        data (Any): The field or tuple of fields
+        dtype (np.dtype): The dtype
+
+    Returns:
+        Any: The cast field or fields
+    """
+    if isinstance(data, tuple):
+        return tuple(cast(field, dtype) for field in data)
+    if isinstance(data, np.ndarray) and np.issubdtype(data.dtype, np.floating):
+        return data.astype(dtype, copy=False)
+    return data
+
+def to_compute(data: Any, precision: PrecisionContext | None) -> Any:
+    return cast(data, compute_dtype(precision))
+
+def to_storage(data: Any, precision: PrecisionContext | None) -> Any:
+    return cast(data, storage_dtype(precision))
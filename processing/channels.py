@@ -7,6 +7,7 @@ def blend(image: np.ndarray, context: BlendContext) -> np.ndarray:
     """
     Blends a color or alpha channel of an image based on intensity
     Assumes alpha blending by default
+    The blended image keeps the floating dtype of the input, at least float32
 
     Args:
         image (np.ndarray): The image to blend
@@ -23,6 +24,6 @@ def blend(image: np.ndarray, context: BlendContext) -> np.ndarray:
         context.channel = 3
 
     mappable = cm.ScalarMappable(norm=context.norm, cmap=context.cmap)
-    rgba = mappable.to_rgba(image)
+    rgba = mappable.to_rgba(image).astype(np.result_type(image.dtype, np.float32), copy=False)
     rgba[:, :, context.channel] = context.scale(image, context.low, context.high)
     return rgba
\ No newline at end of file
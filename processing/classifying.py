@@ -0,0 +1,59 @@
+import numba
+import numpy as np
+
+PRECIP_SCALE: float = 3600 / 25.4
+GRAVITY: float      = 9.81
+
+@numba.njit(parallel=True, cache=True)
+def _classify(phis, snow, rain, h1000, h500, out_snow, out_ice, out_frzr, out_rain):
+    count, height, width = snow.shape
+    for row in numba.prange(count * height):
+        t = row // height
+        j = row % height
+        for i in range(width):
+            s = snow[t, j, i] * PRECIP_SCALE
+            r = rain[t, j, i] * PRECIP_SCALE
+
+            elev = (phis[t, j, i] / GRAVITY - 305) / 915
+            if elev < 0:
+                elev = 0.0
+            elif elev > 1:
+                elev = 1.0
+            low = 5400 + elev * 100
+
+            ice = 0.0
+            if h500[t, j, i] - h1000[t, j, i] >= low and s > 0:
+                ice = s
+                s   = 0.0
+
+            if s >= 0.1 or ice >= 0.1:
+                r = 0.0
+
+            out_snow[t, j, i] = s
+            out_ice[t, j, i]  = ice
+            out_frzr[t, j, i] = 0.0
+            out_rain[t, j, i] = r
+
+def classify_precipitation(phis: np.ndarray, snow: np.ndarray, rain: np.ndarray, h1000: np.ndarray, h500: np.ndarray) -> tuple[np.ndarray, ...]:
+    """
+    Classifies precipitation into snow, ice pellets, freezing rain and rain
+    in one fused pass over a time stack, parallel over rows.
+
+    Snow falling where the 1000-500 hPa thickness reaches the elevation-adjusted
+    threshold becomes ice, and rain is cleared wherever snow or ice reaches
+    0.1 inches.
+
+    Args:
+        phis (np.ndarray): The surface geopotential in m2 s-2, shaped (T, H, W)
+        snow (np.ndarray): The snowfall rate in kg m-2 s-1, shaped (T, H, W)
+        rain (np.ndarray): The total precipitation rate in kg m-2 s-1, shaped (T, H, W)
+        h1000 (np.ndarray): The 1000 hPa height in m, shaped (T, H, W)
+        h500 (np.ndarray): The 500 hPa height in m, shaped (T, H, W)
+
+    Returns:
+        tuple[np.ndarray, ...]: The float32 snow, ice, freezing rain and rain stacks in inches
+    """
+    stacks = [np.ascontiguousarray(stack, dtype=np.float32) for stack in (phis, snow, rain, h1000, h500)]
+    output = tuple(np.empty(stacks[1].shape, dtype=np.float32) for _ in range(4))
+    _classify(*stacks, *output)
+    return output
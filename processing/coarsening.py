@@ -0,0 +1,144 @@
+import numpy as np
+import cartopy.crs as ccrs
+import matplotlib.pyplot as plt
+from plotting.plots import RENDER_LOCK
+from plotting.warping import warp_shape
+from processing.windowing import GLOBE
+from utils import constants
+from utils.schemas import PlotterContext
+
+def coarsen(data: np.ndarray) -> np.ndarray:
+    """
+    Halves the resolution of the last two axes by averaging 2x2 blocks of cells.
+    Missing cells are left out of the average, and a trailing odd row or column
+    is averaged on its own.
+
+    Args:
+        data (np.ndarray): The (..., H, W) data, masked or with NaN for missing values
+
+    Returns:
+        np.ndarray: The (..., ceil(H / 2), ceil(W / 2)) data, masked when the input is
+    """
+    masked = np.ma.isMaskedArray(data)
+    values = np.ma.filled(np.ma.asarray(data, dtype=np.result_type(data.dtype, np.float32)), np.nan)
+
+    *lead, rows, cols = values.shape
+    padded = np.full((*lead, rows + rows % 2, cols + cols % 2), np.nan, dtype=values.dtype)
+    padded[..., :rows, :cols] = values
+
+    blocks = padded.reshape(*lead, padded.shape[-2] // 2, 2, padded.shape[-1] // 2, 2)
+    valid  = ~np.isnan(blocks)
+    count  = valid.sum(axis=(-3, -1))
+    total  = np.where(valid, blocks, 0).sum(axis=(-3, -1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (total / count).astype(values.dtype)
+
+    return np.ma.masked_invalid(mean) if masked else mean
+
+def coarsen_coordinates(coords: np.ndarray) -> np.ndarray:
+    """
+    Halves the resolution of grid coordinates the way coarsen does cells.
+
+    Args:
+        coords (np.ndarray): The coordinates
+
+    Returns:
+        np.ndarray: The coordinates of the coarsened cells
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    pairs  = np.append(coords, coords[-1]) if coords.size % 2 else coords
+    return pairs.reshape(-1, 2).mean(axis=1)
+
+def pyramid(data: np.ndarray, levels: int = constants.PYRAMID_LEVELS) -> list[np.ndarray]:
+    """
+    Builds a multi-resolution pyramid, each level half the resolution of the one before.
+
+    Args:
+        data (np.ndarray): The (..., H, W) data
+        levels (int, optional): The number of levels, including the data itself. Defaults to PYRAMID_LEVELS.
+
+    Returns:
+        list[np.ndarray]: The levels, finest first
+    """
+    stack = [data]
+    while len(stack) < levels and min(stack[-1].shape[-2:]) > 1:
+        stack.append(coarsen(stack[-1]))
+    return stack
+
+def view_density(context: PlotterContext) -> float | None:
+    """
+    Computes the pixels per degree a view shows at its center, where an
+    azimuthal view is most detailed. Views drawn in another projection
+    than their data are capped at the resolution of their warped image.
+
+    Args:
+        context (PlotterContext): The plotter context of the view
+
+    Returns:
+        float: The pixels per degree, or None when the view has no center
+    """
+    if context.center is None or context.projection is None:
+        return None
+
+    with RENDER_LOCK:
+        fig = plt.figure(dpi=context.resolution)
+        try:
+            ax = plt.axes(projection=context.projection(context.center[0], context.center[1]))
+            if context.limit:
+                ax.set_extent(context.limit, context.transform())
+            target = ax.get_extent(ax.projection)
+            bbox   = ax.get_window_extent()
+        finally:
+            plt.close(fig)
+
+    x_range, y_range = target[1] - target[0], target[3] - target[2]
+    scale            = min(bbox.width / x_range, bbox.height / y_range)
+    if context.transform() != ax.projection:
+        nx, ny = warp_shape(target)
+        scale  = min(scale, nx / x_range, ny / y_range)
+
+    lon, lat = context.center
+    step     = 0.5
+    points   = ax.projection.transform_points(
+        ccrs.PlateCarree(),
+        np.array([lon, lon + step, lon]),
+        np.array([lat, lat, lat + step if lat < 90 - step else lat - step])
+    )
+    units = max(np.hypot(*(points[i, :2] - points[0, :2])) for i in (1, 2)) / step
+    return float(scale * units)
+
+def pyramid_level(cells_per_degree: float, density: float | None, levels: int = constants.PYRAMID_LEVELS) -> int:
+    """
+    Picks the coarsest pyramid level that still has at least one cell per pixel of a view.
+
+    Args:
+        cells_per_degree (float): The cells per degree of the finest level
+        density (float): The pixels per degree of the view, or None to keep the finest level
+        levels (int, optional): The number of levels. Defaults to PYRAMID_LEVELS.
+
+    Returns:
+        int: The level, 0 being the finest
+    """
+    if density is None or density <= 0:
+        return 0
+
+    level = 0
+    while level + 1 < levels and cells_per_degree / 2 ** (level + 1) >= density:
+        level += 1
+    return level
+
+def level_shape(shape: tuple[int, int], density: float | None, full: tuple[float, float, float, float] = GLOBE) -> tuple[int, int]:
+    """
+    Coarsens an output shape, given for a full extent, to the pyramid level a view needs.
+
+    Args:
+        shape (tuple[int, int]): The shape on the full extent
+        density (float): The pixels per degree of the view, or None to keep the shape
+        full (tuple[float, float, float, float], optional): The full extent. Defaults to the globe.
+
+    Returns:
+        tuple[int, int]: The shape at the level
+    """
+    cells = min(shape[0] / (full[3] - full[2]), shape[1] / (full[1] - full[0]))
+    level = pyramid_level(cells, density)
+    return tuple(-(-n // 2 ** level) for n in shape)
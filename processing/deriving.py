@@ -0,0 +1,122 @@
+import numpy as np
+from typing import Any, Callable
+from processing.preprocessing import coordinates, absolute_vorticity
+from processing.classifying import PRECIP_SCALE, GRAVITY
+
+FILL_VALUES: dict[str, float] = {
+    "uwnd": -9999.0,
+    "vwnd": -9999.0,
+    "PRECTOT": 1e15,
+    "PRECSNO": 1e15
+}
+
+# each derived variable names its inputs, which are raw granule variables,
+# the "lats" and "lons" of the grid, or other derived variables
+NODES: dict[str, tuple[tuple[str, ...], Callable[..., np.ndarray]]] = {
+    "wspd": (("uwnd", "vwnd"), np.hypot),
+    "rain_rate": (("PRECTOT",), lambda prectot: prectot * np.float32(PRECIP_SCALE)),
+    "snow_rate": (("PRECSNO",), lambda precsno: precsno * np.float32(PRECIP_SCALE)),
+    "thickness": (("H1000", "H500"), lambda h1000, h500: h500 - h1000),
+    "elevation": (("PHIS",), lambda phis: np.clip((phis / np.float32(GRAVITY) - 305) / 915, 0, 1)),
+    "ice_mask": (("thickness", "elevation", "snow_rate"), lambda thick, elev, snow: (thick >= 5400 + elev * 100) & (snow > 0)),
+    "ice": (("ice_mask", "snow_rate"), lambda mask, snow: np.where(mask, snow, 0).astype(snow.dtype)),
+    "snow": (("ice_mask", "snow_rate"), lambda mask, snow: np.where(mask, 0, snow).astype(snow.dtype)),
+    "frzr": (("snow_rate",), np.zeros_like),
+    "rain": (("rain_rate", "snow", "ice"), lambda rain, snow, ice: np.where((snow >= 0.1) | (ice >= 0.1), 0, rain).astype(rain.dtype)),
+    "slp": (("SLP",), lambda slp: slp / 100),
+    "vort": (("U500", "V500", "lats", "lons"), absolute_vorticity)
+}
+
+# the product fields, as in storing.PRODUCT_FIELDS, and the variables they come from
+PRODUCT_NODES: dict[str, dict[str, str]] = {
+    "10m winds": {"wspd": "wspd"},
+    "weather types": {"snow": "snow", "ice": "ice", "frzr": "frzr", "rain": "rain", "t2m": "T2M", "slp": "slp"},
+    "accumulated rainfall": {"PRECTOT": "rain_rate"},
+    "accumulated snowfall": {"PRECSNO": "snow_rate"},
+    "vorticity": {"vort": "vort", "H500": "H500"}
+}
+
+class FieldGraph:
+    """
+    Derived variables of one valid time, computed on demand from the raw
+    variables of its granules. Every variable is computed at most once, so
+    products that share an intermediate, such as the hourly rain of weather
+    types and accumulated rainfall, reuse it.
+
+    Values are keyed by the granules they come from, so graphs over
+    overlapping granules can share them by passing the same values dict.
+    The coordinates come from the first granule of each graph, the one
+    that sets its grid.
+
+    Raw variables are read as float32 with NaN for missing data.
+    """
+    def __init__(
+        self,
+        datasets: Any,
+        nodes: dict[str, tuple[tuple[str, ...], Callable[..., np.ndarray]]] = NODES,
+        values: dict[tuple[str, frozenset[int]], np.ndarray] | None = None
+    ):
+        self.datasets = datasets if isinstance(datasets, dict) else {"data": datasets}
+        self.nodes    = nodes
+        # graphs sharing values must keep their datasets open, as the keys hold their ids
+        self.values   = {} if values is None else values
+        self.sources  = {}
+
+    def _dataset(self, name: str) -> Any:
+        if name in ("lats", "lons"):
+            return next(iter(self.datasets.values()))
+
+        dataset = next((dataset for dataset in self.datasets.values() if name in dataset.variables), None)
+        if dataset is None:
+            raise KeyError(f"Unknown variable: {name}")
+        return dataset
+
+    def _source(self, name: str) -> frozenset[int]:
+        if name not in self.sources:
+            if name in self.nodes:
+                self.sources[name] = frozenset().union(*(self._source(input) for input in self.nodes[name][0]))
+            else:
+                self.sources[name] = frozenset((id(self._dataset(name)),))
+        return self.sources[name]
+
+    def _raw(self, name: str) -> np.ndarray:
+        dataset = self._dataset(name)
+        if name in ("lats", "lons"):
+            return coordinates(dataset)[name == "lons"]
+
+        data = np.ma.asarray(dataset.variables[name][0])
+        raw  = np.ma.filled(data.astype(np.float32), np.nan)
+        if name in FILL_VALUES:
+            raw[data.data == FILL_VALUES[name]] = np.nan
+        return raw
+
+    def get(self, name: str) -> np.ndarray:
+        """
+        Gets a variable, computing it and its inputs on first use.
+
+        Args:
+            name (str): The derived or raw variable name
+
+        Returns:
+            np.ndarray: The variable
+        """
+        key = (name, self._source(name))
+        if key not in self.values:
+            if name in self.nodes:
+                inputs, fn = self.nodes[name]
+                self.values[key] = fn(*(self.get(input) for input in inputs))
+            else:
+                self.values[key] = self._raw(name)
+        return self.values[key]
+
+    def fields(self, category: str) -> dict[str, np.ma.MaskedArray]:
+        """
+        Gets the fields of a product, with missing data masked.
+
+        Args:
+            category (str): The product category
+
+        Returns:
+            dict[str, np.ma.MaskedArray]: The fields, keyed as in storing.PRODUCT_FIELDS
+        """
+        return {field: np.ma.masked_invalid(self.get(name)) for field, name in PRODUCT_NODES[category].items()}
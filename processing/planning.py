@@ -0,0 +1,112 @@
+import datetime
+from typing import Any, Callable
+from granules.reading import GranuleReader, DecodedGranule
+from processing.streaming import preprocessor
+from processing.deriving import FieldGraph
+from utils import constants
+
+def collection_keys(short_names: str | list[str]) -> dict[str, str]:
+    """
+    Names the collections of a product the way its preprocessing expects them.
+    A product built from several collections reads them as "asm", "flx" and so on,
+    and a product built from one collection reads it directly.
+
+    Args:
+        short_names (str | list[str]): The collection short names of the product
+
+    Returns:
+        dict[str, str]: The collection short names, keyed by name
+    """
+    if isinstance(short_names, str):
+        return {"data": short_names}
+    if len(short_names) == 1:
+        return {"data": short_names[0]}
+    return {short_name[-3:].lower(): short_name for short_name in short_names}
+
+def plan_products(products: dict[str, str | list[str]]) -> dict[str, tuple[str, ...]]:
+    """
+    Plans a multi-product job, so that each collection is searched, downloaded
+    and decoded once for every product that uses it.
+
+    Args:
+        products (dict[str, str | list[str]]): The collection short names of each product category
+
+    Returns:
+        dict[str, tuple[str, ...]]: The variables to decode from each collection
+    """
+    plan = {}
+    for category, short_names in products.items():
+        for short_name in collection_keys(short_names).values():
+            variables = plan.setdefault(short_name, [])
+            for name in constants.PRODUCT_VARIABLES[category]:
+                if name not in variables:
+                    variables.append(name)
+    return {short_name: tuple(variables) for short_name, variables in plan.items()}
+
+def schedule_products(products: dict[str, str | list[str]], hours: Callable[[dict[str, str]], dict[datetime.datetime, dict[str, str]]]) -> dict[datetime.datetime, list[tuple[str, dict[str, str]]]]:
+    """
+    Lines up the granules of every product hour by hour.
+    Each product keeps its own time alignment, so a product is only
+    scheduled at the hours where all of its collections have a granule.
+
+    Args:
+        products (dict[str, str | list[str]]): The collection short names of each product category
+        hours (Callable): Pairs the granules of the named collections by hour, such as Catalog.hours
+
+    Returns:
+        dict[datetime.datetime, list[tuple[str, dict[str, str]]]]: The products due at each hour and their granule paths
+    """
+    schedule = {}
+    for category, short_names in products.items():
+        for time, unit in hours(collection_keys(short_names)).items():
+            schedule.setdefault(time, []).append((category, unit))
+    return dict(sorted(schedule.items()))
+
+def preprocess_products(
+    products: dict[str, str | list[str]],
+    schedule: dict[datetime.datetime, list[tuple[str, dict[str, str]]]],
+    extent: tuple[float, float, float, float] | None = None,
+    progress: Callable[[str, float], None] | None = None
+) -> dict[str, list[Any]]:
+    """
+    Preprocesses several products from one pass over their granules.
+    Each granule is read and decoded once per hour, and its variables fan
+    out to the products due at that hour through a derived-variable graph
+    over each product's own granules. The graphs of an hour share their
+    values by granule, so intermediates common to several products are
+    computed once per hour.
+    Accumulated products carry their running total from hour to hour.
+
+    Args:
+        products (dict[str, str | list[str]]): The collection short names of each product category
+        schedule (dict[datetime.datetime, list[tuple[str, dict[str, str]]]]): The products due at each hour, from schedule_products
+        extent (tuple[float, float, float, float], optional): The extent to read. Defaults to the full grid.
+        progress (Callable[[str, float], None], optional): Reports the fraction of hours done. Defaults to None.
+
+    Returns:
+        dict[str, list[Any]]: The preprocessed fields of each product, in time order
+    """
+    report    = progress or (lambda stage, fraction: None)
+    variables = plan_products(products)
+    steps     = {category: preprocessor(category) for category in products}
+    output    = {category: [] for category in products}
+
+    for i, due in enumerate(schedule.values()):
+        decoded = {}
+        for category, unit in due:
+            keys = collection_keys(products[category])
+            for key, path in unit.items():
+                if path not in decoded:
+                    with GranuleReader(path, extent=extent, margin=constants.VIEW_MARGIN) as reader:
+                        decoded[path] = DecodedGranule(reader, variables[keys[key]])
+
+        # each product reads the coordinates of its own granules, while the
+        # variables of a granule are computed once for every product using it
+        values = {}
+        for category, unit in due:
+            graph = FieldGraph({key: decoded[path] for key, path in unit.items()}, values=values)
+            output[category].append(steps[category]({"fields": graph.fields(category)}))
+
+        report("preprocess", (i + 1) / len(schedule))
+
+    return output
@@ -0,0 +1,151 @@
+import os
+import math
+import shutil
+import tempfile
+import multiprocessing
+import numba
+import numpy as np
+from typing import Any, Callable
+from concurrent.futures import ProcessPoolExecutor
+from processing import preprocessing
+from processing.storing import PRODUCT_FIELDS, assemble
+from granules.reading import GranuleReader
+from utils import constants
+from utils.schemas import BatchContext
+
+SHARED_DIR: str | None = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+def stack_fields(category: str, datasets: list[Any], dtype: np.dtype = np.float32) -> tuple[np.ndarray, ...]:
+    """
+    Preprocesses granules into one (T, H, W) stack per field of a category,
+    with NaN for missing data. Accumulated categories give their hourly
+    precipitation, since accumulating needs every earlier hour.
+
+    Args:
+        category (str): The product category
+        datasets (list[Any]): The granules, or granules keyed by collection for weather types
+        dtype (np.dtype, optional): The dtype of the stacks. Defaults to float32.
+
+    Returns:
+        tuple[np.ndarray, ...]: The stacks, in the order of PRODUCT_FIELDS
+    """
+    match category:
+        case "10m winds":
+            return (preprocessing.preprocess_wind_data(datasets, stacked=True, dtype=dtype),)
+        case "weather types":
+            return preprocessing.stack_weather_types(datasets, dtype=dtype)
+        case "accumulated rainfall" | "accumulated snowfall":
+            variable = PRODUCT_FIELDS[category][0]
+            return (preprocessing.read_stack(datasets, variable, fill_value=1e15, scale_factor=3600 / 25.4, dtype=dtype),)
+        case "vorticity":
+            frames = preprocessing.preprocess_vorticity_data(datasets)
+            return tuple(np.stack([frame[i] for frame in frames]).astype(dtype) for i in range(2))
+        case _:
+            raise ValueError(f"Unknown category: {category}")
+
+def _init_worker(threads: int):
+    # workers share the cores, so each one keeps its kernels to its own share
+    numba.set_num_threads(max(1, min(threads, numba.config.NUMBA_NUM_THREADS)))
+
+def _preprocess_chunk(category: str, units: list[dict[str, str]], start: int, outputs: dict[str, str], extent: tuple[float, float, float, float] | None, margin: float, dtype: str) -> int:
+    """
+    Preprocesses a chunk of granules in a worker and writes the stacks
+    straight into the shared output buffers, so only the chunk size is sent back.
+    """
+    variables = constants.PRODUCT_VARIABLES[category]
+    readers   = [{key: GranuleReader(path, variables=variables, extent=extent, margin=margin) for key, path in unit.items()} for unit in units]
+    try:
+        datasets = [unit if len(unit) > 1 else unit["data"] for unit in readers]
+        stacks   = stack_fields(category, datasets, np.dtype(dtype))
+    finally:
+        for unit in readers:
+            for reader in unit.values():
+                reader.close()
+
+    for field, stack in zip(PRODUCT_FIELDS[category], stacks):
+        buffer = np.lib.format.open_memmap(outputs[field], mode="r+")
+        buffer[start:start + len(units)] = stack
+        buffer.flush()
+        del buffer
+
+    return len(units)
+
+def preprocess_parallel(
+    category: str,
+    units: list[dict[str, str]],
+    context: BatchContext,
+    extent: tuple[float, float, float, float] | None = None,
+    margin: float = 0.0,
+    stacked: bool = False,
+    dtype: np.dtype = np.float32,
+    progress: Callable[[str, float], None] | None = None
+) -> Any:
+    """
+    Preprocesses independent granules on a pool of worker processes.
+    Each worker reads and preprocesses a chunk of granules and writes its
+    stacks into memory-mapped output buffers in shared memory, so the
+    arrays are never pickled back to the parent. The buffers are unlinked
+    once the workers are done, and the returned arrays stay mapped.
+
+    Args:
+        category (str): The product category
+        units (list[dict[str, str]]): The granule paths of each frame in time order, keyed by collection
+        context (BatchContext): The number of worker processes as concurrency, the granules per task
+            as batch_size, and the threads per worker as num_cpus
+        extent (tuple[float, float, float, float], optional): The extent to read. Defaults to the full grid.
+        margin (float, optional): The margin around the extent in degrees. Defaults to 0.0.
+        stacked (bool, optional): Whether to return (T, H, W) stacks like the stacked preprocess functions. Defaults to False.
+        dtype (np.dtype, optional): The dtype of the stacks. Defaults to float32.
+        progress (Callable[[str, float], None], optional): Reports the fraction of granules done. Defaults to None.
+
+    Returns:
+        Any: The preprocessed data, in the form the category's preprocess function returns
+    """
+    report  = progress or (lambda stage, fraction: None)
+    fields  = PRODUCT_FIELDS[category]
+    workers = context.concurrency or os.cpu_count() or 1
+    # a few chunks per worker keep the workers busy when granules take uneven time
+    size    = context.batch_size or max(1, math.ceil(len(units) / (workers * 4)))
+    threads = int(context.num_cpus or max(1, (os.cpu_count() or 1) // workers))
+
+    if not units:
+        return []
+
+    first = next(iter(units[0].values()))
+    with GranuleReader(first, variables=(), extent=extent, margin=margin) as reader:
+        shape = (len(units), reader.lats.size, reader.lons.size)
+
+    root = tempfile.mkdtemp(dir=SHARED_DIR)
+    try:
+        outputs = {field: os.path.join(root, f"{field}.npy") for field in fields}
+        buffers = {field: np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape) for field, path in outputs.items()}
+
+        done = 0
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads,)
+        ) as executor:
+            futures = [
+                executor.submit(_preprocess_chunk, category, units[start:start + size], start, outputs, extent, margin, np.dtype(dtype).name)
+                for start in range(0, len(units), size)
+            ]
+            for future in futures:
+                done += future.result()
+                report("preprocess", done / len(units))
+    finally:
+        # the parent keeps its mappings after the files are unlinked
+        shutil.rmtree(root, ignore_errors=True)
+
+    stacks = tuple(buffers[field] for field in fields)
+
+    if category in ("accumulated rainfall", "accumulated snowfall"):
+        acc = preprocessing.accumulate_stack(stacks[0])
+        return acc if stacked else [np.ma.masked_invalid(acc)]
+
+    if stacked:
+        return stacks[0] if len(stacks) == 1 else stacks
+
+    frames = [{field: np.ma.masked_invalid(stack[i]) for field, stack in zip(fields, stacks)} for i in range(len(units))]
+    return assemble(category, frames)
@@ -1,18 +1,57 @@
 import numpy as np
 from netCDF4 import Dataset
-from processing.resampling import resample
+from processing.classifying import classify_precipitation
 
-def preprocess_wind_data(datasets: list[Dataset]) -> list[np.ndarray]:
+# Bump whenever a change alters preprocessed output, so stored fields are rebuilt
+PREPROCESSING_VERSION: int = 3
+
+def read_stack(datasets: list[Dataset], variable: str, fill_value: float | None = None, scale_factor: float = 1.0, dtype: np.dtype = np.float32) -> np.ndarray:
+    """
+    Reads the first time step of a variable from each dataset into one
+    contiguous (T, H, W) stack. Fill values and masked points become NaN.
+
+    Args:
+        datasets (list[Dataset]): The netCDF4 datasets
+        variable (str): The variable name
+        fill_value (float, optional): A fill value to treat as missing. Defaults to None.
+        scale_factor (float, optional): The scale factor to apply. Defaults to 1.0.
+        dtype (np.dtype, optional): The dtype of the stack. Defaults to float32.
+
+    Returns:
+        np.ndarray: The stacked variable
+    """
+    first = datasets[0].variables[variable]
+    stack = np.empty((len(datasets), *first.shape[-2:]), dtype=dtype)
+
+    for i, dataset in enumerate(datasets):
+        data     = np.ma.asarray(dataset.variables[variable][0])
+        stack[i] = np.ma.filled(data.astype(dtype), np.nan)
+        if fill_value is not None:
+            stack[i][data.data == fill_value] = np.nan
+
+    if scale_factor != 1.0:
+        stack *= stack.dtype.type(scale_factor)
+
+    return stack
+
+def preprocess_wind_data(datasets: list[Dataset], stacked: bool = False, dtype: np.dtype = np.float32) -> list[np.ndarray] | np.ndarray:
     """
     Preprocesses wind data from a netCDF4 dataset.
     Applies fill value, masking, and wind vector calculation.
 
     Args:
         dataset (list[Dataset]): The netCDF4 dataset containing wind data
+        stacked (bool, optional): Whether to return one (T, H, W) stack with NaN for missing data. Defaults to False.
+        dtype (np.dtype, optional): The dtype of the stack. Defaults to float32.
 
     Returns:
-        list[np.ndarray]: The preprocessed wind data
+        list[np.ndarray] | np.ndarray: The preprocessed wind data
     """
+    if stacked:
+        u = read_stack(datasets, "uwnd", fill_value=-9999.0, dtype=dtype)
+        v = read_stack(datasets, "vwnd", fill_value=-9999.0, dtype=dtype)
+        return np.hypot(u, v, out=u)
+
     preprocessed = []
     for dataset in datasets:
         uwnd = dataset.variables["uwnd"][0].data
@@ -25,28 +64,75 @@ def preprocess_wind_data(datasets: list[Dataset]) -> list[np.ndarray]:
 
     return preprocessed
 
-def preprocess_weather_types(datasets: list[dict[str, Dataset]]) -> list[tuple[np.ndarray, ...]]:
+WXTYPE_SCALE_FACTORS: dict[str, float] = {
+    "PHIS": 1 / 9.81,
+    "PRECSNO": 3600 / 25.4,
+    "PRECTOT": 3600 / 25.4,
+    "T2M": 1,
+    "H1000": 1,
+    "H500": 1,
+    "SLP": 1 / 100
+}
+
+def stack_weather_types(datasets: list[dict[str, Dataset]], engine: str = "numba", dtype: np.dtype = np.float32) -> tuple[np.ndarray, ...]:
+    """
+    Preprocesses weather type data into one (T, H, W) stack per field,
+    computed over the whole stack at once.
+
+    Args:
+        datasets (list[dict[str, Dataset]]): The ASM, FLX and SLV datasets of each time step
+        engine (str, optional): "numba" for the fused parallel kernel, or "numpy". Defaults to "numba".
+        dtype (np.dtype, optional): The dtype of the stacks. Defaults to float32.
+
+    Returns:
+        tuple[np.ndarray, ...]: The snow, ice, freezing rain, rain, 2m temperature and sea level pressure stacks
+    """
+    fused = engine == "numba"
+    data  = {}
+    for wxtype, scale_factor in WXTYPE_SCALE_FACTORS.items():
+        # the fused kernel scales its own inputs
+        if fused and wxtype not in ("T2M", "SLP"):
+            scale_factor = 1.0
+        source       = next(key for key in ("asm", "flx", "slv") if wxtype in datasets[0][key].variables.keys())
+        data[wxtype] = read_stack([dataset[source] for dataset in datasets], wxtype, scale_factor=scale_factor, dtype=dtype)
+
+    if fused:
+        snow, ice, frzr, rain = classify_precipitation(data["PHIS"], data["PRECSNO"], data["PRECTOT"], data["H1000"], data["H500"])
+        return *(stack.astype(dtype, copy=False) for stack in (snow, ice, frzr, rain)), data["T2M"], data["SLP"]
+
+    snow  = data["PRECSNO"]
+    rain  = data["PRECTOT"]
+    ice   = np.zeros_like(snow)
+    frzr  = np.zeros_like(snow)
+    thick = data["H500"] - data["H1000"]
+    low   = 5400 + np.clip((data["PHIS"] - 305) / 915, 0, 1) * 100
+
+    height_mask       = (thick >= low) & (snow > 0)
+    ice[height_mask]  = snow[height_mask]
+    snow[height_mask] = 0.0
+
+    rain[(snow >= 0.1) | (ice >= 0.1)] = 0.0
+
+    return snow, ice, frzr, rain, data["T2M"], data["SLP"]
+
+def preprocess_weather_types(datasets: list[dict[str, Dataset]], stacked: bool = False, dtype: np.dtype = np.float32) -> list[tuple[np.ndarray, ...]] | tuple[np.ndarray, ...]:
     """
     Preprocesses weather type data from a netCDF4 dataset.
     Applies scale factors, elevation factor, and masking.
 
     Args:
         dataset (list[Dataset]): The netCDF4 dataset containing weather type data
+        stacked (bool, optional): Whether to return one (T, H, W) stack per field. Defaults to False.
+        dtype (np.dtype, optional): The dtype of the stacks. Defaults to float32.
 
     Returns:
-        list[tuple[np.ndarray]]: The preprocessed weather type data
+        list[tuple[np.ndarray]] | tuple[np.ndarray, ...]: The preprocessed weather type data
     """
-    preprocessed = []
+    if stacked:
+        return stack_weather_types(datasets, dtype=dtype)
 
-    scale_factors = {
-        "PHIS": 1 / 9.81,
-        "PRECSNO": 3600 / 25.4,
-        "PRECTOT": 3600 / 25.4,
-        "T2M": 1,
-        "H1000": 1,
-        "H500": 1,
-        "SLP": 1 / 100
-    }
+    preprocessed  = []
+    scale_factors = WXTYPE_SCALE_FACTORS
     
     for dataset in datasets:
         data = {}
@@ -86,7 +172,7 @@ def preprocess_weather_types(datasets: list[dict[str, Dataset]]) -> list[tuple[n
         elev_factor = elev_factor * 100
         low         = 5400 + elev_factor
 
-        height_mask       = np.where((thick.any() >= low.any()) and (snow > 0))
+        height_mask       = np.where((thick >= low) & (snow > 0))
         ice[height_mask]  = snow[height_mask]
         snow[height_mask] = 0.0
 
@@ -97,125 +183,217 @@ def preprocess_weather_types(datasets: list[dict[str, Dataset]]) -> list[tuple[n
 
     return preprocessed
 
-def preprocess_accumulated_rain(datasets: list[Dataset]) -> list[np.ndarray]:
+def preprocess_precipitation(datasets: list[Dataset], variable: str) -> list[np.ndarray]:
     """
-    Preprocesses accumulated precipitation (rain) data from a netCDF4 dataset.
-    Applies scale factor, fill value, cumulative sum, and masking.
+    Preprocesses hourly precipitation data from a netCDF4 dataset.
+    Applies scale factor, fill value, and masking.
 
     Args:
-        dataset (list[Dataset]): The netCDF4 dataset containing accumulated precipitation data
+        datasets (list[Dataset]): The netCDF4 datasets containing precipitation data
+        variable (str): The precipitation variable, PRECTOT or PRECSNO
 
     Returns:
-        list[np.ndarray]: The preprocessed accumulated precipitation data
+        list[np.ndarray]: The hourly precipitation in inches
     """
     preprocessed = []
 
     scale_factor = 3600 / 25.4
     fill_value   = 1e15
 
-    data = []
-
     for dataset in datasets:
-        prec = dataset.variables["PRECTOT"][0].data
-        prec = np.ma.masked_where(prec == fill_value, data)
+        prec = dataset.variables[variable][0].data
+        prec = np.ma.masked_where(prec == fill_value, prec)
         prec = prec * scale_factor
-        data.append(prec)
+        preprocessed.append(prec)
 
-    acc_data = np.cumsum(data, axis=0)
-    acc_data = np.ma.masked_where(acc_data < 0.1, acc_data)
+    return preprocessed
 
-    preprocessed.append(acc_data)
+def accumulate_stack(stack: np.ndarray, total: np.ndarray | None = None) -> np.ndarray:
+    """
+    Accumulates a (T, H, W) stack of hourly precipitation in place.
+    Missing hours add nothing to the running total.
 
-    return preprocessed
+    Args:
+        stack (np.ndarray): The hourly precipitation, with NaN for missing data
+        total (np.ndarray, optional): The accumulation carried over from earlier hours. Defaults to None.
+
+    Returns:
+        np.ndarray: The running accumulation at each hour, NaN below 0.1 inches
+    """
+    np.nan_to_num(stack, copy=False, nan=0.0)
+    np.cumsum(stack, axis=0, out=stack)
+    if total is not None:
+        stack += np.nan_to_num(total).astype(stack.dtype)
+    stack[stack < 0.1] = np.nan
+    return stack
+
+def accumulate(data: list[np.ndarray], total: np.ndarray | None = None) -> np.ndarray:
+    """
+    Accumulates hourly precipitation over time.
+
+    Args:
+        data (list[np.ndarray]): The hourly precipitation
+        total (np.ndarray, optional): The accumulation carried over from earlier hours. Defaults to None.
 
-def preprocess_accumulated_snow(datasets: list[Dataset]) -> list[np.ndarray]:
+    Returns:
+        np.ndarray: The running accumulation at each hour, masked below 0.1 inches
     """
-    Preprocesses accumulated precipitation (snow) data from a netCDF4 dataset.
+    acc_data = np.cumsum(data, axis=0)
+    if total is not None:
+        acc_data = acc_data + total
+    acc_data = np.ma.masked_where(acc_data < 0.1, acc_data)
+    return acc_data
+
+def preprocess_accumulated_rain(datasets: list[Dataset], stacked: bool = False, dtype: np.dtype = np.float32) -> list[np.ndarray] | np.ndarray:
+    """
+    Preprocesses accumulated precipitation (rain) data from a netCDF4 dataset.
     Applies scale factor, fill value, cumulative sum, and masking.
 
     Args:
         dataset (list[Dataset]): The netCDF4 dataset containing accumulated precipitation data
+        stacked (bool, optional): Whether to return one (T, H, W) stack with NaN below 0.1 inches. Defaults to False.
+        dtype (np.dtype, optional): The dtype of the stack. Defaults to float32.
 
     Returns:
-        list[np.ndarray]: The preprocessed accumulated precipitation data
+        list[np.ndarray] | np.ndarray: The preprocessed accumulated precipitation data
     """
-    preprocessed = []
-
-    scale_factor = 3600 / 25.4
-    fill_value   = 1e15
+    if stacked:
+        return accumulate_stack(read_stack(datasets, "PRECTOT", fill_value=1e15, scale_factor=3600 / 25.4, dtype=dtype))
 
-    data = []
+    data = preprocess_precipitation(datasets, "PRECTOT")
+    return [accumulate(data)]
 
-    for dataset in datasets:
-        prec = dataset.variables["PRECSNO"][0].data
-        prec = np.ma.masked_where(prec == fill_value, data)
-        prec = prec * scale_factor
-        data.append(prec)
+def preprocess_accumulated_snow(datasets: list[Dataset], stacked: bool = False, dtype: np.dtype = np.float32) -> list[np.ndarray] | np.ndarray:
+    """
+    Preprocesses accumulated precipitation (snow) data from a netCDF4 dataset.
+    Applies scale factor, fill value, cumulative sum, and masking.
 
-    acc_data = np.cumsum(data, axis=0)
-    acc_data = np.ma.masked_where(acc_data < 0.1, acc_data)
+    Args:
+        dataset (list[Dataset]): The netCDF4 dataset containing accumulated precipitation data
+        stacked (bool, optional): Whether to return one (T, H, W) stack with NaN below 0.1 inches. Defaults to False.
+        dtype (np.dtype, optional): The dtype of the stack. Defaults to float32.
 
-    preprocessed.append(acc_data)
+    Returns:
+        list[np.ndarray] | np.ndarray: The preprocessed accumulated precipitation data
+    """
+    if stacked:
+        return accumulate_stack(read_stack(datasets, "PRECSNO", fill_value=1e15, scale_factor=3600 / 25.4, dtype=dtype))
 
-    return preprocessed
+    data = preprocess_precipitation(datasets, "PRECSNO")
+    return [accumulate(data)]
 
-def preprocess_vorticity_data(datasets: list[Dataset]) -> list[np.ndarray]:
+def coordinates(dataset: Dataset) -> tuple[np.ndarray, np.ndarray]:
     """
-    Preprocesses vorticity data from a netCDF4 dataset.
-    Applies fill value, masking, and coriolis effect.
+    Gets the latitude and longitude coordinates of a granule,
+    restricted to its window when it was opened through a GranuleReader.
 
     Args:
-        dataset (list[Dataset]): The netCDF4 dataset containing vorticity data
+        dataset (Dataset): The netCDF4 dataset or granule reader
 
     Returns:
-        list[np.ndarray]: The preprocessed vorticity data
+        tuple[np.ndarray, np.ndarray]: The latitudes and longitudes in degrees
     """
-    preprocessed = []
+    if hasattr(dataset, "lats"):
+        return np.asarray(dataset.lats), np.asarray(dataset.lons)
 
-    rad      = np.pi / 180
-    re       = 6371220.0
-    rr       = re * rad
-    lats     = 2 * (np.arange(720) / (720 - 1) - 0.5) * 90 * rad
-    omeg     = 7.0721e-5
-    coriolis = 2 * omeg * np.sin(lats * rad)
-    deg_m    = 2 * re * np.pi / 720
-    dlon_m   = deg_m * np.cos(lats * np.pi / 180)
-    dlat_m   = deg_m
-    dvdx     = np.zeros((720, 720))
-    dudy     = np.zeros((720, 720))
-    data     = np.zeros((720, 720))
-    
-    for dataset in datasets:
-        heights = dataset.variables["H500"][0].data
-        u       = dataset.variables["U500"][0].data
-        v       = dataset.variables["V500"][0].data
+    lat = next(name for name in ("lat", "latitude") if name in dataset.variables)
+    lon = next(name for name in ("lon", "longitude") if name in dataset.variables)
+    return np.asarray(dataset.variables[lat][:]), np.asarray(dataset.variables[lon][:])
 
-        u = resample(u, (720, 720))
-        v = resample(v, (720, 720))
+def relative_vorticity(u: np.ndarray, v: np.ndarray, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Computes the relative vorticity of a wind field on a latitude-longitude grid
+    with centered finite differences of its flux form,
+    zeta = (dv/dlambda - d(u cos(phi))/dphi) / (R cos(phi)).
 
-        for j in range(720):
-            for i in range(720):
-                ip1 = i + 1
-                if (i == 719):
-                    ip1 = 0
+    Longitude wraps around when the grid covers the globe. Pole rows, where the
+    metric term vanishes, take the vorticity of the polar cap from the
+    circulation around the next row (Stokes' theorem).
 
-                dvdx[j, i] = (v[j, ip1] - v[j, i]) / dlon_m[j]
+    Args:
+        u (np.ndarray): The eastward wind, shaped (..., lat, lon), such as a (T, H, W) stack
+        v (np.ndarray): The northward wind, shaped like u
+        lats (np.ndarray): The latitudes in degrees, ascending or descending
+        lons (np.ndarray): The ascending longitudes in degrees
 
-                jp1 = j + 1
-                if (j == 719):
-                    jp1 = j
+    Returns:
+        np.ndarray: The relative vorticity in s-1, shaped like u
+    """
+    re  = 6371220.0
+    phi = np.deg2rad(lats)
+    lam = np.deg2rad(lons)
+    cos = np.cos(phi)[:, None]
+
+    dlam     = np.diff(lam).mean() if lam.size > 1 else 2 * np.pi
+    periodic = lam.size > 2 and np.isclose(dlam * lam.size, 2 * np.pi, rtol=1e-3)
+
+    if periodic:
+        dvdl = (np.roll(v, -1, axis=-1) - np.roll(v, 1, axis=-1)) / (2 * dlam)
+    else:
+        dvdl = np.gradient(v, lam, axis=-1)
+
+    ducdp = np.gradient(u * cos, phi, axis=-2)
+
+    poles = np.isclose(np.abs(lats), 90)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zeta = (dvdl - ducdp) / (re * cos)
+
+    for row in np.flatnonzero(poles) if lats.size > 1 else []:
+        ring = row + 1 if row + 1 < lats.size and not poles[row + 1] else row - 1
+        if not periodic:
+            # a window without the full ring has no circulation, so the pole takes the next row
+            zeta[..., row, :] = zeta[..., ring, :]
+        else:
+            sin  = np.sin(phi[ring])
+            circ = u[..., ring, :].mean(axis=-1) * np.cos(phi[ring]) / re
+            # the cap is circled eastward around the north pole and westward around the south pole
+            if lats[row] > 0:
+                zeta[..., row, :] = (circ / (1 - sin))[..., None]
+            else:
+                zeta[..., row, :] = (-circ / (1 + sin))[..., None]
+
+    return zeta
+
+def absolute_vorticity(u: np.ndarray, v: np.ndarray, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Computes the absolute vorticity of a wind field, with its sign flipped
+    in the southern hemisphere so that cyclonic rotation is positive everywhere.
 
-                dudy[j, i] = (u[jp1, i] - u[j, i]) / dlat_m
-                data[j, i] = (dvdx[j, i] - dudy[j, i])
+    Args:
+        u (np.ndarray): The eastward wind, shaped (..., lat, lon)
+        v (np.ndarray): The northward wind, shaped like u
+        lats (np.ndarray): The latitudes in degrees
+        lons (np.ndarray): The ascending longitudes in degrees
 
-            data = data * 1.e5
+    Returns:
+        np.ndarray: The vorticity in 1e-5 s-1, shaped like u
+    """
+    omeg     = 7.2921e-5
+    coriolis = 2 * omeg * np.sin(np.deg2rad(lats))[:, None]
+    data     = (relative_vorticity(np.asarray(u, dtype=np.float64), np.asarray(v, dtype=np.float64), lats, lons) + coriolis) * 1.e5
+    return np.where((lats < 0)[:, None], -data, data)
 
-        for j in range(720):
-            if lats[j] <= 0:
-                data[j, :] = -1 * data[j, :]
+def preprocess_vorticity_data(datasets: list[Dataset]) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Preprocesses vorticity data from a netCDF4 dataset.
+    Computes the absolute vorticity on the native grid for the whole stack of
+    granules at once, and flips its sign in the southern hemisphere so that
+    cyclonic rotation is positive everywhere.
+
+    Args:
+        dataset (list[Dataset]): The netCDF4 dataset containing vorticity data
+
+    Returns:
+        list[tuple[np.ndarray, np.ndarray]]: The preprocessed vorticity, in 1e-5 s-1, and 500 hPa heights
+    """
+    if not datasets:
+        return []
 
-        data = data + coriolis
+    lats, lons = coordinates(datasets[0])
 
-        preprocessed.append(data)
+    heights = np.stack([dataset.variables["H500"][0].data for dataset in datasets])
+    u       = np.stack([dataset.variables["U500"][0].data for dataset in datasets])
+    v       = np.stack([dataset.variables["V500"][0].data for dataset in datasets])
+    data    = absolute_vorticity(u, v, lats, lons)
 
-    return preprocessed
\ No newline at end of file
+    return [(data[i], heights[i]) for i in range(len(datasets))]
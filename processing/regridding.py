@@ -1,9 +1,25 @@
 import os
+import json
+import uuid
+import hashlib
+import threading
+import weakref
+import argparse
 import numpy as np
-import xesmf as xe
+import scipy.sparse as sp
 import xarray as xr
+from typing import TYPE_CHECKING
+from netCDF4 import Dataset
+from collections import OrderedDict
+from granules.reading import lat_window, lon_window
+from processing.windowing import view_extent, window_shape
+from utils import constants
 from utils.schemas import RegridderContext
 
+# ESMF is slow to import and only needed to generate weights
+if TYPE_CHECKING:
+    import xesmf as xe
+
 def bounds(centers: np.ndarray) -> np.ndarray:
     """
     Computes the cell boundaries of center coordinates for conservative regridding.
@@ -19,30 +35,109 @@ def bounds(centers: np.ndarray) -> np.ndarray:
     last: np.ndarray  = centers[-1] + dist[-1]
     return np.concatenate([[first], centers[:-1] + dist, [last]])
 
-def build_regridder(context: RegridderContext) -> xe.Regridder:
+def window_context(context: RegridderContext, extent: tuple[float, float, float, float], shape_in: tuple[int, int]) -> RegridderContext:
     """
-    Builds a regridder for conservative, bilinear, or nearest regridding.
+    Narrows a regridder context to a window of its extent. The output shape
+    shrinks with the window, so the window is regridded at the resolution
+    the full extent would have been.
+
+    Args:
+        context (RegridderContext): The context for the full extent
+        extent (tuple[float, float, float, float]): The extent of the window
+        shape_in (tuple[int, int]): The shape of the data on the window
+
+    Returns:
+        RegridderContext: The context for the window
+    """
+    return context.model_copy(update={
+        "extent": extent,
+        "shape_in": tuple(shape_in),
+        "shape_out": window_shape(context.shape_out, extent, context.extent)
+    })
 
-    Optional: Save weights for reuse.
+def grid_coordinates(context: RegridderContext) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the input and output grid coordinates of a regridder context.
 
     Args:
         context (RegridderContext): The context for the regridder
 
     Returns:
-        xe.Regridder: The regridder
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The input longitudes and latitudes,
+            and the output longitudes and latitudes
     """
-    method: str    = context.method
     x0, x1, y0, y1 = context.extent
+    shape_in       = context.shape_in
+    shape_out      = context.shape_out
 
-    shape_in: tuple[int, int]  = context.shape_in
-    shape_out: tuple[int, int] = context.shape_out
+    return (
+        np.linspace(x0, x1, shape_in[1]),
+        np.linspace(y0, y1, shape_in[0]),
+        np.linspace(x0, x1, shape_out[1]),
+        np.linspace(y0, y1, shape_out[0])
+    )
 
-    lon_in: np.ndarray  = np.linspace(x0, x1, shape_in[1])
-    lat_in: np.ndarray  = np.linspace(y0, y1, shape_in[0])
-    lon_out: np.ndarray = np.linspace(x0, x1, shape_out[1])
-    lat_out: np.ndarray = np.linspace(y0, y1, shape_out[0])
+def regridder_key(context: RegridderContext) -> str:
+    """
+    Names the weights of a regridder after its method, shapes, and a hash of
+    its method, shapes, extent and grid coordinates, so regridders that only
+    differ in where their grids lie never share weights.
 
-    serial: str = f"{method}-{shape_in[0]}x{shape_in[1]}in-{shape_out[0]}x{shape_out[1]}out"
+    Args:
+        context (RegridderContext): The context for the regridder
+
+    Returns:
+        str: The key
+    """
+    shape_in  = context.shape_in
+    shape_out = context.shape_out
+    signature = {
+        "method": context.method,
+        "shape_in": list(shape_in),
+        "shape_out": list(shape_out),
+        "extent": [float(edge) for edge in context.extent]
+    }
+
+    digest = hashlib.sha256(json.dumps(signature, sort_keys=True).encode())
+    for coords in grid_coordinates(context):
+        digest.update(np.ascontiguousarray(coords, dtype=np.float64).tobytes())
+
+    serial = f"{context.method}-{shape_in[0]}x{shape_in[1]}in-{shape_out[0]}x{shape_out[1]}out"
+    return f"{serial}-{digest.hexdigest()[:16]}"
+
+def weights_path(context: RegridderContext) -> str | None:
+    """
+    Gets the path of the weights file of a regridder context.
+
+    Args:
+        context (RegridderContext): The context for the regridder
+
+    Returns:
+        str: The path, or None when the context does not reuse weights
+    """
+    if not context.reuse_weights or context.weights_dir is None:
+        return None
+    return os.path.join(context.weights_dir, f"{regridder_key(context)}-weights.nc")
+
+def build_regridder(context: RegridderContext) -> "xe.Regridder":
+    """
+    Builds a regridder for conservative, bilinear, or nearest regridding.
+
+    When weights are reused, they are read from the weights directory if they
+    were generated before, and are otherwise generated and written atomically,
+    so concurrent jobs never read a partial weights file.
+
+    Args:
+        context (RegridderContext): The context for the regridder
+
+    Returns:
+        xe.Regridder: The regridder
+    """
+    import xesmf as xe
+
+    method: str = context.method
+
+    lon_in, lat_in, lon_out, lat_out = grid_coordinates(context)
 
     match method:
         case "conservative":
@@ -81,15 +176,243 @@ def build_regridder(context: RegridderContext) -> xe.Regridder:
         case _:
             raise ValueError(f"Invalid regridding method: {method}")
     
-    reuse_weights: bool     = context.reuse_weights
-    weights_dir: str | None = context.weights_dir
-    filename: str | None    = os.path.join(weights_dir, f"{serial}-weights.nc") if reuse_weights else None
-    
-    regridder = xe.Regridder(
-        grid_in,
-        grid_out,
-        method=method,
-        filename=filename,
-        reuse_weights=reuse_weights
-    )
-    return regridder
\ No newline at end of file
+    filename: str | None = weights_path(context)
+
+    if filename is not None and os.path.exists(filename):
+        return xe.Regridder(grid_in, grid_out, method=method, filename=filename, reuse_weights=True)
+
+    regridder = xe.Regridder(grid_in, grid_out, method=method)
+
+    if filename is not None:
+        os.makedirs(context.weights_dir, exist_ok=True)
+        # jobs run as threads of one process, so the temp name is unique per write
+        temp = f"{filename}.{uuid.uuid4().hex}.tmp"
+        regridder.to_netcdf(temp)
+        os.replace(temp, filename)
+
+    return regridder
+
+class RegridderCache:
+    """
+    In-process LRU of live regridders, keyed like their weights.
+    Misses are loaded by load_regridder, so weights on disk are applied
+    without loading ESMF. The cache is shared by the job threads, and each
+    key is loaded by one of them while the others wait for it.
+    """
+    def __init__(self, size: int = constants.REGRIDDER_CACHE_SIZE):
+        self.size       = size
+        self.regridders = OrderedDict()
+        self._lock      = threading.Lock()
+        self._loading   = {}
+
+    def get(self, context: RegridderContext) -> "SparseRegridder | xe.Regridder":
+        """
+        Gets the regridder of a context, building it on a miss.
+
+        Args:
+            context (RegridderContext): The context for the regridder
+
+        Returns:
+            SparseRegridder | xe.Regridder: The regridder
+        """
+        key = regridder_key(context)
+        with self._lock:
+            if key in self.regridders:
+                self.regridders.move_to_end(key)
+                return self.regridders[key]
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        # other keys keep loading while this one does
+        with loading:
+            with self._lock:
+                if key in self.regridders:
+                    self.regridders.move_to_end(key)
+                    return self.regridders[key]
+
+            regridder = load_regridder(context)
+            with self._lock:
+                self.regridders[key] = regridder
+                self._loading.pop(key, None)
+                while len(self.regridders) > self.size:
+                    self.regridders.popitem(last=False)
+        return regridder
+
+REGRIDDERS: RegridderCache = RegridderCache()
+
+def weights_matrix(regridder: "xe.Regridder") -> sp.csr_matrix:
+    """
+    Gets the weights of a regridder as a sparse (output cells, input cells) matrix.
+
+    Args:
+        regridder (xe.Regridder): The regridder
+
+    Returns:
+        sp.csr_matrix: The weights
+    """
+    weights = regridder.weights
+    # xESMF keeps its weights as a sparse array inside a DataArray
+    if isinstance(weights, xr.DataArray):
+        weights = weights.data
+    return weights.tocsr() if hasattr(weights, "tocsr") else sp.csr_matrix(weights)
+
+# the CSR weights of each live regridder in each dtype, dropped with the regridder
+_MATRICES: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_MATRICES_LOCK: threading.Lock = threading.Lock()
+
+def cached_weights_matrix(regridder: "xe.Regridder", dtype: np.dtype) -> sp.csr_matrix:
+    """
+    Gets the weights of a regridder as a sparse matrix of a dtype, converted
+    once per regridder and dtype and kept while the regridder is alive.
+
+    Args:
+        regridder (xe.Regridder): The regridder
+        dtype (np.dtype): The dtype of the weights
+
+    Returns:
+        sp.csr_matrix: The weights
+    """
+    dtype = np.dtype(dtype)
+    with _MATRICES_LOCK:
+        matrices = _MATRICES.setdefault(regridder, {})
+        if dtype not in matrices:
+            matrices[dtype] = weights_matrix(regridder).astype(dtype)
+        return matrices[dtype]
+
+def regrid_stack(data: np.ndarray | tuple[np.ndarray, ...], regridder: "xe.Regridder", chunk_size: int | None = None) -> np.ndarray | tuple[np.ndarray, ...]:
+    """
+    Regrids a (T, H, W) stack, or a tuple of fields sharing a grid, with one
+    sparse matrix product per chunk of frames instead of one call per frame.
+    Missing data spreads to the output cells that draw on it, as in xESMF.
+
+    Args:
+        data (np.ndarray | tuple[np.ndarray, ...]): A (H, W) field, a (T, H, W) stack, or a tuple of them
+        regridder (xe.Regridder): The regridder
+        chunk_size (int, optional): The number of frames per product. Defaults to all frames at once.
+
+    Returns:
+        np.ndarray | tuple[np.ndarray, ...]: The regridded data, shaped like the input on the output grid
+    """
+    fields = data if isinstance(data, tuple) else (data,)
+    shape  = tuple(regridder.shape_out)
+    dtype  = np.result_type(*(np.asarray(field).dtype for field in fields), np.float32)
+
+    # every frame of every field is one column of a single dense matrix
+    frames  = [np.ma.filled(np.ma.asarray(field, dtype=dtype), np.nan).reshape(-1, field.shape[-2] * field.shape[-1]) for field in fields]
+    columns = np.concatenate(frames).T if len(frames) > 1 else frames[0].T
+    weights = cached_weights_matrix(regridder, dtype)
+    output  = np.empty((columns.shape[1], weights.shape[0]), dtype=dtype)
+
+    step = chunk_size or max(1, columns.shape[1])
+    for start in range(0, columns.shape[1], step):
+        output[start:start + step] = (weights @ np.ascontiguousarray(columns[:, start:start + step])).T
+
+    regridded = []
+    start     = 0
+    for field, frame in zip(fields, frames):
+        stop = start + frame.shape[0]
+        regridded.append(output[start:stop].reshape(*field.shape[:-2], *shape))
+        start = stop
+
+    return tuple(regridded) if isinstance(data, tuple) else regridded[0]
+
+class SparseRegridder:
+    """
+    Apply-only regridder that reads the weights xESMF wrote to disk into a
+    SciPy CSR matrix, so regridding needs neither ESMF nor xESMF.
+
+    It is called like an xe.Regridder on NumPy data, and exposes the
+    weights and output shape that regrid_stack uses.
+    """
+    def __init__(self, filename: str, shape_in: tuple[int, int], shape_out: tuple[int, int]):
+        with Dataset(filename) as ds:
+            # xESMF writes the weights as 1-based (row, col, S) triplets
+            rows    = np.asarray(ds.variables["row"][:], dtype=np.int64) - 1
+            cols    = np.asarray(ds.variables["col"][:], dtype=np.int64) - 1
+            weights = np.asarray(ds.variables["S"][:], dtype=np.float64)
+
+        self.filename  = filename
+        self.shape_in  = tuple(shape_in)
+        self.shape_out = tuple(shape_out)
+        self.weights   = sp.csr_matrix(
+            (weights, (rows, cols)),
+            shape=(self.shape_out[0] * self.shape_out[1], self.shape_in[0] * self.shape_in[1])
+        )
+
+    def __call__(self, data: np.ndarray | tuple[np.ndarray, ...], chunk_size: int | None = None) -> np.ndarray | tuple[np.ndarray, ...]:
+        return regrid_stack(data, self, chunk_size)
+
+    def __repr__(self) -> str:
+        return f"SparseRegridder({os.path.basename(self.filename)})"
+
+def load_regridder(context: RegridderContext) -> "SparseRegridder | xe.Regridder":
+    """
+    Loads the regridder of a context, applying its weights with SciPy when
+    they are already on disk and building them with xESMF otherwise.
+
+    Args:
+        context (RegridderContext): The context for the regridder
+
+    Returns:
+        SparseRegridder | xe.Regridder: The regridder
+    """
+    filename = weights_path(context)
+    if filename is not None and os.path.exists(filename):
+        return SparseRegridder(filename, context.shape_in, context.shape_out)
+    return build_regridder(context)
+
+def view_contexts(context: RegridderContext, lats: np.ndarray, lons: np.ndarray, views: list[str], margin: float = constants.VIEW_MARGIN) -> dict[str, RegridderContext]:
+    """
+    Narrows a regridder context to the window of each view on a dataset grid,
+    the same way granules are read and regridded for the view.
+
+    Args:
+        context (RegridderContext): The context for the full extent
+        lats (np.ndarray): The latitude coordinates of the dataset grid
+        lons (np.ndarray): The longitude coordinates of the dataset grid
+        views (list[str]): The view names
+        margin (float, optional): The margin around each extent in degrees. Defaults to VIEW_MARGIN.
+
+    Returns:
+        dict[str, RegridderContext]: The context of each view
+    """
+    contexts = {}
+    for view in views:
+        extent = view_extent(view)
+        if extent is None:
+            lat_slice, lon_slices = slice(0, lats.size), [slice(0, lons.size)]
+        else:
+            west, east, south, north = extent
+            lat_slice  = lat_window(lats, south - margin, north + margin)
+            lon_slices = lon_window(lons, west - margin, east + margin)
+
+        wlats = lats[lat_slice]
+        wlons = lons[lon_slices[0]]
+        if len(lon_slices) > 1:
+            wlons = np.concatenate([wlons, lons[lon_slices[1]] + 360])
+
+        window = (float(wlons[0]), float(wlons[-1]), float(wlats.min()), float(wlats.max()))
+        contexts[view] = window_context(context, window, (wlats.size, wlons.size))
+    return contexts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the regridding weights of every dataset grid and view in advance.")
+    parser.add_argument("--method", default="conservative", choices=["conservative", "bilinear", "nearest"])
+    parser.add_argument("--shape", type=int, nargs=2, default=list(constants.TARGET_SHAPE), help="The output shape on the whole globe")
+    parser.add_argument("--grids", nargs="+", default=list(constants.DATASET_GRIDS), choices=list(constants.DATASET_GRIDS))
+    parser.add_argument("--views", nargs="+", default=list(constants.VIEWS_SPEC), choices=list(constants.VIEWS_SPEC))
+    parser.add_argument("--weights-dir", default=constants.WEIGHTS_DIR)
+    args = parser.parse_args()
+
+    for grid in args.grids:
+        lats, lons = constants.DATASET_GRIDS[grid]
+        context    = RegridderContext(
+            method=args.method,
+            shape_in=(lats.size, lons.size),
+            shape_out=tuple(args.shape),
+            reuse_weights=True,
+            weights_dir=args.weights_dir
+        )
+        for view, view_context in view_contexts(context, lats, lons, args.views).items():
+            if not os.path.exists(weights_path(view_context)):
+                build_regridder(view_context)
+            print(f"{grid} {view}: {regridder_key(view_context)}")
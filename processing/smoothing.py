@@ -1,20 +1,21 @@
+import functools
 import numpy as np
-import scipy.signal as signal
-from scipy.fft import fftshift, ifftshift, fftn, ifftn
-
-def savitzky_golay2d(z: np.ndarray, window_size: int, order: int, derivative: str = None) -> np.ndarray:
+import scipy.fft as fft
+from utils import constants
+
+DERIVATIVES: dict[str | None, tuple[tuple[int, int], ...]] = {
+    None: ((0, 1),),
+    "col": ((1, -1),),
+    "row": ((2, -1),),
+    "both": ((2, -1), (1, -1))
+}
+
+@functools.lru_cache(maxsize=constants.SMOOTHING_CACHE_SIZE)
+def _coefficients(window_size: int, order: int) -> np.ndarray:
     """
-    Applies a low pass Savitzky-Golay filter to a 2D array.
-    Savitzky-Golay reduces noise while preserving important features.
-
-    Args:
-        z (np.ndarray): Input array
-        window_size (int): Size of the window
-        order (int): Order of the polynomial
-        derivative (str): Optional derivative to apply
-
-    Returns:
-        np.ndarray: Filtered array
+    Solves the least-squares fit of a 2D polynomial over a window once per
+    window size and order. Row 0 of the result smooths, rows 1 and 2 give the
+    first derivatives along the columns and rows.
     """
     # number of polynomial terms
     n_terms = (order + 1) * (order + 2) / 2
@@ -40,59 +41,115 @@ def savitzky_golay2d(z: np.ndarray, window_size: int, order: int, derivative: st
     for i, (x, y) in enumerate(exps):
         A[:, i] = (dx ** x) * (dy ** y)
 
-    # pad input array
-    new_shape = (z.shape[0] + half_size * 2, z.shape[1] + half_size * 2)
-    Z         = np.zeros(new_shape)
-
-    # top band
-    band                                = z[0, :]
-    Z[:half_size, half_size:-half_size] = band - np.abs(np.flipud(z[1:half_size + 1, :]) - band)
-
-    # bottom band
-    band                                 = z[-1, :]
-    Z[-half_size:, half_size:-half_size] = band + np.abs(np.flipud(z[-half_size - 1:-1, :]) - band)
-
-    # left band
-    band                                = np.tile(z[:, 0].reshape(-1, 1), [1, half_size])
-    Z[half_size:-half_size, :half_size] = band - np.abs(np.fliplr(z[:, 1:half_size + 1]) - band)
-
-    # right band
-    band                                 = np.tile(z[:, -1].reshape(-1, 1), [1, half_size])
-    Z[half_size:-half_size, -half_size:] = band + np.abs(np.fliplr(z[:, -half_size - 1:-1]) - band)
-
-    # centeral band
-    Z[half_size:-half_size, half_size:-half_size] = z
-
-    # top left corner
-    band                      = z[0, 0]
-    Z[:half_size, :half_size] = band - np.abs(np.flipud(np.fliplr(z[1:half_size + 1, 1:half_size + 1])) - band)
-
-    # bottom right corner
-    band                        = z[-1, -1]
-    Z[-half_size:, -half_size:] = band + np.abs(np.flipud(np.fliplr(z[-half_size - 1:-1, -half_size - 1:-1])) - band)
-
-    # top right corner
-    band                       = z[half_size, -half_size:]
-    Z[:half_size, -half_size:] = band - np.abs(np.flipud(Z[half_size + 1:-half_size * 2 + 1, -half_size:]) - band)
-
-    # bottom left corner
-    band                       = z[-1, 0]
-    Z[-half_size:, :half_size] = band + np.abs(np.fliplr(Z[-half_size:, half_size + 1:half_size * 2 + 1]) - band)
-
-    # solve system and convolve
-    match derivative:
-        case None:
-            m = np.linalg.pinv(A)[0].reshape((window_size, -1))
-            return signal.fftconvolve(Z, m, mode="valid")
-        case "col":
-            c = np.linalg.pinv(A)[1].reshape((window_size, -1))
-            return signal.fftconvolve(Z, -c, mode="valid")
-        case "row":
-            r = np.linalg.pinv(A)[2].reshape((window_size, -1))
-            return signal.fftconvolve(Z, -r, mode="valid")
-        case "both":
-            c = np.linalg.pinv(A)[1].reshape((window_size, -1))
-            r = np.linalg.pinv(A)[2].reshape((window_size, -1))
-            return signal.fftconvolve(Z, -r, mode="valid"), signal.fftconvolve(Z, -c, mode="valid")
-        case _:
-            raise ValueError(f"invalid derivative: {derivative}")
\ No newline at end of file
+    coefficients = np.linalg.pinv(A)
+    coefficients.setflags(write=False)
+    return coefficients
+
+@functools.lru_cache(maxsize=constants.SMOOTHING_CACHE_SIZE)
+def savitzky_golay_kernels(window_size: int, order: int, derivative: str | None = None) -> tuple[np.ndarray, ...]:
+    """
+    Gets the convolution kernels of a Savitzky-Golay filter, computed once
+    per window size, order and derivative.
+
+    Args:
+        window_size (int): Size of the window
+        order (int): Order of the polynomial
+        derivative (str, optional): Optional derivative, "col", "row" or "both". Defaults to None.
+
+    Returns:
+        tuple[np.ndarray, ...]: The (window_size, window_size) kernels, two for "both" as (row, col)
+    """
+    if derivative not in DERIVATIVES:
+        raise ValueError(f"invalid derivative: {derivative}")
+
+    coefficients = _coefficients(window_size, order)
+    kernels      = []
+    for row, sign in DERIVATIVES[derivative]:
+        kernel = sign * coefficients[row].reshape((window_size, -1))
+        kernel.setflags(write=False)
+        kernels.append(kernel)
+    return tuple(kernels)
+
+# a spectrum at TARGET_SHAPE is about 64 MB, so only the grids in use are kept
+@functools.lru_cache(maxsize=constants.SPECTRUM_CACHE_SIZE)
+def _kernel_spectra(window_size: int, order: int, derivative: str | None, shape: tuple[int, int], dtype: str) -> tuple[np.ndarray, ...]:
+    """
+    Transforms the kernels of a filter at an FFT size once, so every frame
+    and every stack of the same grid reuses them.
+    """
+    spectra = []
+    for kernel in savitzky_golay_kernels(window_size, order, derivative):
+        spectrum = fft.rfft2(kernel.astype(dtype), s=shape)
+        spectrum.setflags(write=False)
+        spectra.append(spectrum)
+    return tuple(spectra)
+
+def pad_reflected(z: np.ndarray, half_size: int) -> np.ndarray:
+    """
+    Pads the last two axes by reflecting the data about its edges, bent away
+    from the edge values: bands above and left of the data fall below the edge,
+    and bands below and right of it rise above the edge. The corners follow the
+    band of their rows. The whole padding is built in one pass.
+
+    Args:
+        z (np.ndarray): The (..., H, W) data
+        half_size (int): The padding on each side
+
+    Returns:
+        np.ndarray: The (..., H + 2 * half_size, W + 2 * half_size) padded data
+    """
+    width     = ((0, 0),) * (z.ndim - 2) + ((half_size, half_size),) * 2
+    reflected = np.pad(z, width, mode="reflect")
+    edge      = np.pad(z, width, mode="edge")
+
+    rows, cols = z.shape[-2:]
+    sign       = np.ones((rows + 2 * half_size, cols + 2 * half_size), dtype=z.dtype)
+    sign[:half_size]                       = -1
+    sign[half_size:-half_size, :half_size] = -1
+
+    return edge + sign * np.abs(reflected - edge)
+
+def savitzky_golay2d(z: np.ndarray, window_size: int, order: int, derivative: str = None, chunk_size: int = constants.SMOOTHING_CHUNK_SIZE) -> np.ndarray:
+    """
+    Applies a low pass Savitzky-Golay filter to a 2D array or a (T, H, W) stack.
+    Savitzky-Golay reduces noise while preserving important features.
+    Filtering runs in the floating dtype of the input, at least float32.
+
+    The kernels and their spectra are cached, so a stack, or any later call
+    on the same grid, pays for the fit and the kernel transforms once.
+
+    Args:
+        z (np.ndarray): Input array, (H, W) or (..., H, W)
+        window_size (int): Size of the window
+        order (int): Order of the polynomial
+        derivative (str): Optional derivative to apply
+        chunk_size (int, optional): The number of frames transformed at a time. Defaults to SMOOTHING_CHUNK_SIZE.
+
+    Returns:
+        np.ndarray: Filtered array, or the (row, col) derivatives for "both"
+    """
+    kernels   = savitzky_golay_kernels(window_size, order, derivative)
+    half_size = window_size // 2
+    dtype     = np.result_type(z.dtype, np.float32)
+    z         = np.asarray(z, dtype=dtype)
+
+    Z     = pad_reflected(z, half_size)
+    rows  = z.shape[-2]
+    cols  = z.shape[-1]
+    # the full linear convolution, padded to sizes the FFT handles quickly
+    shape = tuple(fft.next_fast_len(n + window_size - 1, real=True) for n in Z.shape[-2:])
+
+    spectra = _kernel_spectra(window_size, order, derivative, shape, dtype.name)
+
+    frames  = Z.reshape((-1,) + Z.shape[-2:])
+    outputs = [np.empty((frames.shape[0], rows, cols), dtype=dtype) for _ in kernels]
+    step    = max(1, chunk_size or constants.SMOOTHING_CHUNK_SIZE)
+    for start in range(0, frames.shape[0], step):
+        spectrum = fft.rfft2(frames[start:start + step], s=shape)
+        for output, kernel_spectrum in zip(outputs, spectra):
+            full = fft.irfft2(spectrum * kernel_spectrum, s=shape)
+            # the "valid" part of the convolution lines up with the input
+            output[start:start + step] = full[:, 2 * half_size:2 * half_size + rows, 2 * half_size:2 * half_size + cols]
+
+    results = tuple(output.reshape(z.shape) for output in outputs)
+    return results if derivative == "both" else results[0]
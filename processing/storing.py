@@ -0,0 +1,272 @@
+import os
+import uuid
+import datetime
+import numpy as np
+from typing import Any
+from utils import constants
+from processing import preprocessing
+from processing.casting import storage_dtype, to_compute
+from processing.coarsening import pyramid, coarsen_coordinates, pyramid_level
+from granules.reading import GranuleReader, lat_window, lon_window
+from utils.schemas import PrecisionContext
+
+PRODUCT_FIELDS: dict[str, tuple[str, ...]] = {
+    "10m winds": ("wspd",),
+    "weather types": ("snow", "ice", "frzr", "rain", "t2m", "slp"),
+    "accumulated rainfall": ("PRECTOT",),
+    "accumulated snowfall": ("PRECSNO",),
+    "vorticity": ("vort", "H500")
+}
+
+def preprocess_fields(category: str, dataset: Any) -> dict[str, np.ndarray]:
+    """
+    Preprocesses a single granule into its named fields.
+
+    Args:
+        category (str): The product category
+        dataset (Any): The granule, or granules keyed by collection for weather types
+
+    Returns:
+        dict[str, np.ndarray]: The preprocessed fields
+    """
+    match category:
+        case "10m winds":
+            data = preprocessing.preprocess_wind_data([dataset])
+        case "weather types":
+            data = preprocessing.preprocess_weather_types([dataset])
+        case "accumulated rainfall":
+            data = preprocessing.preprocess_precipitation([dataset], "PRECTOT")
+        case "accumulated snowfall":
+            data = preprocessing.preprocess_precipitation([dataset], "PRECSNO")
+        case "vorticity":
+            data = preprocessing.preprocess_vorticity_data([dataset])
+        case _:
+            raise ValueError(f"Unknown category: {category}")
+
+    fields = data[0] if isinstance(data[0], tuple) else (data[0],)
+    return dict(zip(PRODUCT_FIELDS[category], fields))
+
+def assemble(category: str, fields: list[dict[str, np.ndarray]]) -> list[Any]:
+    """
+    Assembles per-granule fields into the output of the category's preprocess function.
+
+    Args:
+        category (str): The product category
+        fields (list[dict[str, np.ndarray]]): The fields of each granule in time order
+
+    Returns:
+        list[Any]: The preprocessed data
+    """
+    names = PRODUCT_FIELDS[category]
+
+    match category:
+        case "accumulated rainfall" | "accumulated snowfall":
+            return [preprocessing.accumulate([field[names[0]] for field in fields])]
+        case "weather types" | "vorticity":
+            return [tuple(field[name] for name in names) for field in fields]
+        case _:
+            return [field[names[0]] for field in fields]
+
+class FieldStore:
+    """
+    Analysis-ready store of preprocessed fields.
+
+    Each field is kept as one memory-mappable .npy chunk per dataset, valid time
+    and field, on the full grid of its dataset, in the storage dtype of its
+    precision policy. Missing values are stored as NaN. Reads map the chunk and
+    copy out only the requested window, in the compute dtype.
+
+    Alongside the full grid, each field keeps a pyramid of coarser levels, each
+    averaging 2x2 cells of the one before, so coarse views and previews read
+    only as much data as they can show.
+    """
+    def __init__(self, root: str, precision: PrecisionContext | None = None):
+        self.root      = root
+        self.precision = precision
+
+    def _dir(self, dataset: str) -> str:
+        version = f"v{preprocessing.PREPROCESSING_VERSION}"
+        # fields kept at another precision never stand in for float32 ones
+        dtype   = storage_dtype(self.precision)
+        if dtype != np.float32:
+            version = f"{version}-{dtype.name}"
+        return os.path.join(self.root, dataset, version)
+
+    def path(self, dataset: str, valid_time: datetime.datetime, field: str, level: int = 0) -> str:
+        stamp = valid_time.strftime("%Y%m%dT%H%M")
+        name  = field if level == 0 else f"{field}@{level}"
+        return os.path.join(self._dir(dataset), stamp[:4], stamp[4:6], stamp[6:8], stamp, f"{name}.npy")
+
+    def _coords_path(self, dataset: str, name: str, level: int = 0) -> str:
+        return os.path.join(self._dir(dataset), f"{name}.npy" if level == 0 else f"{name}@{level}.npy")
+
+    def has(self, dataset: str, valid_time: datetime.datetime, fields: tuple[str, ...]) -> bool:
+        return all(os.path.exists(self.path(dataset, valid_time, field)) for field in fields)
+
+    def _write(self, path: str, data: np.ndarray):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # jobs run as threads of one process, so the temp name is unique per write
+        temp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp, "wb") as f:
+            np.save(f, data)
+        os.replace(temp, path)
+
+    def save(self, dataset: str, valid_time: datetime.datetime, fields: dict[str, np.ndarray], lats: np.ndarray, lons: np.ndarray):
+        """
+        Saves the fields of one valid time along with the grid they live on.
+
+        Args:
+            dataset (str): The dataset key
+            valid_time (datetime.datetime): The valid time
+            fields (dict[str, np.ndarray]): The fields to save
+            lats (np.ndarray): The latitude coordinates of the grid
+            lons (np.ndarray): The longitude coordinates of the grid
+        """
+        for name, coords in (("lat", lats), ("lon", lons)):
+            for level, level_coords in enumerate(self._coords_pyramid(coords)):
+                path = self._coords_path(dataset, name, level)
+                if not os.path.exists(path):
+                    self._write(path, level_coords)
+
+        for field, data in fields.items():
+            data = np.ma.filled(np.ma.asarray(data, dtype=storage_dtype(self.precision)), np.nan)
+            self._save_pyramid(dataset, valid_time, field, data)
+
+    def _coords_pyramid(self, coords: np.ndarray) -> list[np.ndarray]:
+        stack = [np.asarray(coords, dtype=np.float64)]
+        while len(stack) < constants.PYRAMID_LEVELS:
+            stack.append(coarsen_coordinates(stack[-1]))
+        return stack
+
+    def _save_pyramid(self, dataset: str, valid_time: datetime.datetime, field: str, data: np.ndarray):
+        # level 0 is the data itself, and coarsen averages in at least float32,
+        # so float16 storage does not compound its rounding and float64 keeps its precision
+        for level, level_data in enumerate(pyramid(data, constants.PYRAMID_LEVELS)):
+            self._write(self.path(dataset, valid_time, field, level), level_data.astype(data.dtype))
+
+    def level(self, dataset: str, density: float | None) -> int:
+        """
+        Picks the coarsest pyramid level of a dataset that still meets the pixel density of a view.
+
+        Args:
+            dataset (str): The dataset key
+            density (float): The pixels per degree of the view, or None for the full grid
+
+        Returns:
+            int: The level, 0 being the full grid
+        """
+        lats = np.load(self._coords_path(dataset, "lat"), mmap_mode="r")
+        lons = np.load(self._coords_path(dataset, "lon"), mmap_mode="r")
+        cells = min((lats.size - 1) / max(float(np.ptp(lats)), 1e-6), (lons.size - 1) / max(float(np.ptp(lons)), 1e-6))
+        return pyramid_level(cells, density)
+
+    def window(self, dataset: str, extent: tuple[float, float, float, float] | None, margin: float = 0.0, level: int = 0) -> tuple[slice, list[slice], tuple[float, float, float, float]]:
+        """
+        Computes the index window of an extent on the grid of a dataset.
+
+        Args:
+            dataset (str): The dataset key
+            extent (tuple[float, float, float, float]): The extent, or None for the full grid
+            margin (float, optional): The margin around the extent in degrees. Defaults to 0.0.
+            level (int, optional): The pyramid level of the grid. Defaults to 0.
+
+        Returns:
+            tuple[slice, list[slice], tuple[float, float, float, float]]: The latitude window,
+                longitude windows, and extent of the window
+        """
+        paths = [self._coords_path(dataset, name, level) for name in ("lat", "lon")]
+        if not all(os.path.exists(path) for path in paths):
+            # stores written before pyramids only have the full grid
+            for name in ("lat", "lon"):
+                coords = np.load(self._coords_path(dataset, name))
+                for coarse, level_coords in enumerate(self._coords_pyramid(coords)):
+                    self._write(self._coords_path(dataset, name, coarse), level_coords)
+
+        lats, lons = (np.load(path) for path in paths)
+
+        if extent is None:
+            lat_slice, lon_slices = slice(0, lats.size), [slice(0, lons.size)]
+        else:
+            west, east, south, north = extent
+            lat_slice  = lat_window(lats, south - margin, north + margin)
+            lon_slices = lon_window(lons, west - margin, east + margin)
+
+        wlats = lats[lat_slice]
+        wlons = lons[lon_slices[0]]
+        if len(lon_slices) > 1:
+            wlons = np.concatenate([wlons, lons[lon_slices[1]] + 360])
+
+        return lat_slice, lon_slices, (float(wlons[0]), float(wlons[-1]), float(wlats.min()), float(wlats.max()))
+
+    def load(self, dataset: str, valid_time: datetime.datetime, fields: tuple[str, ...], lat_slice: slice | None = None, lon_slices: list[slice] | None = None, level: int = 0) -> dict[str, np.ma.MaskedArray]:
+        """
+        Loads fields of one valid time, reading only the requested window.
+
+        Args:
+            dataset (str): The dataset key
+            valid_time (datetime.datetime): The valid time
+            fields (tuple[str, ...]): The fields to load
+            lat_slice (slice, optional): The latitude window. Defaults to the full grid.
+            lon_slices (list[slice], optional): The longitude windows. Defaults to the full grid.
+            level (int, optional): The pyramid level to read. Defaults to 0.
+
+        Returns:
+            dict[str, np.ma.MaskedArray]: The fields, with missing values masked
+        """
+        lat_slice  = lat_slice or slice(None)
+        lon_slices = lon_slices or [slice(None)]
+
+        loaded = {}
+        for field in fields:
+            path  = self.path(dataset, valid_time, field, level)
+            if not os.path.exists(path):
+                self._save_pyramid(dataset, valid_time, field, np.load(self.path(dataset, valid_time, field)))
+            data  = np.load(path, mmap_mode="r")
+            parts = [data[..., lat_slice, lon_slice] for lon_slice in lon_slices]
+            data  = np.concatenate(parts, axis=-1) if len(parts) > 1 else np.array(parts[0])
+            loaded[field] = np.ma.masked_invalid(to_compute(data, self.precision))
+
+        return loaded
+
+def load_or_preprocess(store: FieldStore, category: str, dataset: str, paths: dict[str, str], extent: tuple[float, float, float, float] | None = None, margin: float = 0.0, density: float | None = None) -> dict[str, Any]:
+    """
+    Loads the fields of a granule from the store, preprocessing and storing them first on a miss.
+    Misses are preprocessed on the full grid so the stored fields serve any later view.
+
+    Args:
+        store (FieldStore): The field store
+        category (str): The product category
+        dataset (str): The dataset key
+        paths (dict[str, str]): The granule paths keyed by collection
+        extent (tuple[float, float, float, float], optional): The requested extent. Defaults to None.
+        margin (float, optional): The margin around the extent in degrees. Defaults to 0.0.
+        density (float, optional): The pixels per degree of the view, which picks the coarsest
+            pyramid level that can still fill it. Defaults to the full grid.
+
+    Returns:
+        dict[str, Any]: The fields, their valid time, and the extent of the window
+    """
+    names = PRODUCT_FIELDS[category]
+
+    # only the header is read to find the valid time
+    with GranuleReader(next(iter(paths.values())), variables=()) as reader:
+        valid_time = reader.valid_time
+
+    if not store.has(dataset, valid_time, names):
+        variables = constants.PRODUCT_VARIABLES[category]
+        readers   = {key: GranuleReader(path, variables=variables) for key, path in paths.items()}
+        reader    = next(iter(readers.values()))
+        try:
+            fields = preprocess_fields(category, readers if len(readers) > 1 else reader)
+            store.save(dataset, valid_time, fields, reader.lats, reader.lons)
+        finally:
+            for reader in readers.values():
+                reader.close()
+
+    level = store.level(dataset, density)
+    lat_slice, lon_slices, window = store.window(dataset, extent, margin, level)
+    return {
+        "fields": store.load(dataset, valid_time, names, lat_slice, lon_slices, level),
+        "time": valid_time,
+        "extent": window
+    }
@@ -0,0 +1,324 @@
+import os
+import queue
+import threading
+import numpy as np
+import hashlib
+import itertools
+from collections import deque
+from typing import Any, Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from processing import preprocessing
+from processing.batching import batch_regrid
+from processing.regridding import REGRIDDERS, window_context
+from processing.windowing import window_shape
+from processing.resampling import batch_resample
+from processing.coarsening import view_density, level_shape
+from processing.storing import load_or_preprocess, assemble
+from processing.casting import to_compute
+from plotting.plots import PLOTTERS, RENDER_LOCK
+from plotting.caching import frame_key
+from granules.caching import granule_id
+from granules.reading import GranuleReader
+from granules.downloading import fetch_granule
+from utils import constants
+from utils.schemas import StreamContext, DownloadContext
+
+_DONE = object()
+
+class _Failure:
+    def __init__(self, error: Exception):
+        self.error = error
+
+class _Cached:
+    def __init__(self, frame: dict[str, str]):
+        self.frame = frame
+
+def _put(outbox: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """
+    Puts an item on a bounded queue, blocking until there is room.
+    Gives up once the pipeline has been stopped.
+    """
+    while not stop.is_set():
+        try:
+            outbox.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _stage(fn: Callable, inbox: queue.Queue, outbox: queue.Queue, stop: threading.Event):
+    """
+    Runs one pipeline stage until the upstream stage is done.
+    """
+    while not stop.is_set():
+        try:
+            item = inbox.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+        if item is _DONE or isinstance(item, _Failure):
+            _put(outbox, item, stop)
+            return
+
+        if isinstance(item, _Cached):
+            if not _put(outbox, item, stop):
+                return
+            continue
+
+        try:
+            result = fn(item)
+        except Exception as error:
+            _put(outbox, _Failure(error), stop)
+            return
+
+        if not _put(outbox, result, stop):
+            return
+
+def _apply(fn: Callable, data: Any) -> Any:
+    """
+    Applies a transform to a field or to each field of a tuple.
+    """
+    if isinstance(data, tuple):
+        return tuple(fn(field) for field in data)
+    return fn(data)
+
+def preprocessor(category: str) -> Callable:
+    """
+    Builds the per-granule preprocessing step for a category.
+    The step takes either an open dataset or fields loaded from the store.
+    Accumulated products carry their running total from one granule to the next,
+    so granules must arrive in time order.
+
+    Args:
+        category (str): The product category
+
+    Returns:
+        Callable: The preprocessing step
+    """
+    match category:
+        case "10m winds":
+            preprocess = preprocessing.preprocess_wind_data
+        case "weather types":
+            preprocess = preprocessing.preprocess_weather_types
+        case "vorticity":
+            preprocess = preprocessing.preprocess_vorticity_data
+        case "accumulated rainfall" | "accumulated snowfall":
+            variable = "PRECTOT" if category == "accumulated rainfall" else "PRECSNO"
+            state    = {"total": None}
+
+            def step(item):
+                if "fields" in item:
+                    hourly = [item["fields"][variable]]
+                else:
+                    hourly = preprocessing.preprocess_precipitation([item["dataset"]], variable)
+                acc = preprocessing.accumulate(hourly, state["total"])[-1]
+                state["total"] = np.ma.getdata(acc)
+                return acc
+
+            return step
+        case _:
+            raise ValueError(f"Unknown category: {category}")
+
+    def step(item):
+        if "fields" in item:
+            return assemble(category, [item["fields"]])[0]
+        return preprocess([item["dataset"]])[0]
+
+    return step
+
+def frame_keys(units: Iterable[dict[str, tuple[str, Any]]], category: str, context: StreamContext) -> Iterator[str]:
+    """
+    Computes the frame cache key of every unit in a stream, as the units arrive.
+    An accumulated frame depends on every granule since the start of the
+    accumulation, so its inputs are chained through the earlier units.
+
+    Args:
+        units (Iterable[dict[str, tuple[str, Any]]]): The granules of each frame in time order
+        category (str): The product category
+        context (StreamContext): The streaming context
+
+    Yields:
+        str: The frame key
+    """
+    accumulated = category in ("accumulated rainfall", "accumulated snowfall")
+    extra       = {
+        "margin": constants.VIEW_MARGIN,
+        "regridder": repr(context.regridder) if context.regridder is not None else None,
+        "regrid": context.regrid.model_dump() if context.regrid is not None else None,
+        "extent": context.extent,
+        "resample": (context.resample.shape, context.resample.method) if context.resample is not None else None,
+        "precision": context.precision.model_dump() if context.precision is not None else None,
+        "pyramid": constants.PYRAMID_LEVELS if context.pyramid else None
+    }
+
+    chain = ""
+    for unit in units:
+        inputs = sorted(f"{short_name}/{granule_id(granule)}" for short_name, granule in unit.values())
+        if accumulated:
+            chain  = hashlib.sha256("\n".join([chain, *inputs]).encode()).hexdigest()
+            inputs = [chain]
+        yield frame_key(inputs, context.plotter.tag, context.plotter, category, extra)
+
+def stream(units: Iterable[dict[str, tuple[str, Any]]], category: str, context: StreamContext) -> Iterator[dict[str, str]]:
+    """
+    Streams granules through download, read, preprocessing, regridding and resampling, and rendering.
+    Each granule is rendered as soon as it has passed through every stage, and
+    bounded queues between stages keep at most a few granules in memory.
+    Units are pulled lazily, so they may come from a generator that searches
+    a long time range one window at a time. Granules are read, preprocessed,
+    regridded and resampled only on the window of the view's extent, and the
+    regrid and resample shapes, given for the whole globe, shrink with the window.
+    With pyramids on, stored fields are read and the regrid and resample shapes
+    are coarsened to the coarsest level that still fills the view's pixels.
+    Each unit is one frame. A path naming a time step, as local sources give
+    them, is read at that step, and a whole granule file at its first step,
+    so a daily Earthdata file is streamed as one frame. Batch jobs go through
+    the catalog and read every step.
+
+    Args:
+        units (Iterable[dict[str, tuple[str, Any]]]): The granules of each frame in time order,
+            keyed by collection and paired with their short names
+        category (str): The product category
+        context (StreamContext): The streaming context
+
+    Yields:
+        dict[str, str]: The rendered frame
+    """
+    download   = context.download or DownloadContext(cache_dir=constants.GRANULES_DIR)
+    plotter    = context.plotter
+    cache_dir  = context.cache_dir or constants.CACHE_DIR
+    variables  = constants.PRODUCT_VARIABLES.get(category)
+    preprocess = preprocessor(category)
+    stop       = threading.Event()
+    frames     = context.frames
+    accumulated = category in ("accumulated rainfall", "accumulated snowfall")
+    extent      = context.extent if context.extent is not None else plotter.limit
+    density     = view_density(plotter) if context.pyramid and plotter is not None else None
+    regrid      = context.regrid
+    resample    = context.resample
+    if regrid is not None:
+        regrid = regrid.model_copy(update={"shape_out": level_shape(regrid.shape_out, density)})
+    if resample is not None:
+        resample = resample.model_copy(update={"shape": level_shape(resample.shape, density)})
+
+    # the keys follow the units lazily, so long ranges are never held in memory
+    if frames is not None:
+        units, keyed = itertools.tee(units)
+        keys = frame_keys(keyed, category, context)
+    else:
+        keys = itertools.repeat(None)
+
+    fetch = context.source.fetch if context.source is not None else fetch_granule
+
+    def fetch_unit(unit, key):
+        paths = {name: fetch(granule, short_name, download)[0] for name, (short_name, granule) in unit.items()}
+        return {"paths": paths, "key": key}
+
+    def read(item):
+        paths = item["paths"]
+        if context.store is not None:
+            loaded = load_or_preprocess(context.store, category, context.dataset, paths, extent, constants.VIEW_MARGIN, density)
+            return {**loaded, "key": item["key"]}
+
+        readers = {
+            key: GranuleReader(path, variables=variables, extent=extent, margin=constants.VIEW_MARGIN)
+            for key, path in paths.items()
+        }
+        reader = next(iter(readers.values()))
+        return {
+            "readers": readers,
+            "dataset": readers if len(readers) > 1 else reader,
+            "time": reader.valid_time,
+            "extent": reader.extent,
+            "key": item["key"]
+        }
+
+    def prep(item):
+        try:
+            data = preprocess(item)
+        finally:
+            for reader in item.get("readers", {}).values():
+                reader.close()
+        if context.precision is not None:
+            data = to_compute(data, context.precision)
+        return {"data": data, "time": item["time"], "extent": item["extent"], "key": item["key"]}
+
+    def transform(item):
+        # the fields of a frame share their grid, so they are regridded in one product
+        if context.regridder is not None:
+            item["data"] = batch_regrid({"data": item["data"]}, context.regridder, context.precision)["data"]
+        elif regrid is not None:
+            shape        = np.shape(item["data"][0] if isinstance(item["data"], tuple) else item["data"])[-2:]
+            regridder    = REGRIDDERS.get(window_context(regrid, item["extent"], shape))
+            item["data"] = batch_regrid({"data": item["data"]}, regridder, context.precision)["data"]
+        if resample is not None:
+            windowed     = resample.model_copy(update={"shape": window_shape(resample.shape, item["extent"])})
+            item["data"] = _apply(lambda field: batch_resample({"data": field}, windowed)["data"], item["data"])
+        if context.precision is not None:
+            item["data"] = to_compute(item["data"], context.precision)
+        return item
+
+    def render(item):
+        timestamp = item["time"].strftime("%Y-%m-%dT%H:%M:%SZ")
+        product   = constants.PRODUCT_FRAMES[category]
+        full_path = os.path.join(cache_dir, plotter.tag, "frames", product, timestamp[:4], timestamp[5:7], timestamp[8:10])
+        img_path  = os.path.join(full_path, f"{timestamp[11:13]}.png")
+
+        if frames is not None and frames.get(item["key"], img_path) is not None:
+            return {"path": img_path, "status": "cached"}
+
+        os.makedirs(full_path, exist_ok=True)
+
+        frame_context = plotter.model_copy(update={"extent": item["extent"]})
+        with RENDER_LOCK:
+            PLOTTERS[category](item["data"], frame_context).render(cache_dir, timestamp)
+
+        if frames is not None:
+            frames.put(item["key"], img_path, timestamp=timestamp)
+
+        return {"path": img_path, "status": "created"}
+
+    queues = [queue.Queue(maxsize=context.queue_size) for _ in range(5)]
+
+    def source():
+        with ThreadPoolExecutor(max_workers=download.workers) as executor:
+            pending = deque()
+            try:
+                for unit, key in zip(units, keys):
+                    # accumulations still need every granule to carry their running total
+                    frame = frames.get(key) if frames is not None and not accumulated else None
+                    if frame is not None:
+                        cached = Future()
+                        cached.set_result(_Cached({"path": frame["path"], "status": "cached"}))
+                        pending.append(cached)
+                    else:
+                        pending.append(executor.submit(fetch_unit, unit, key))
+                    if len(pending) >= download.workers:
+                        if not _put(queues[0], pending.popleft().result(), stop):
+                            return
+                while pending:
+                    if not _put(queues[0], pending.popleft().result(), stop):
+                        return
+                _put(queues[0], _DONE, stop)
+            except Exception as error:
+                _put(queues[0], _Failure(error), stop)
+
+    threads = [threading.Thread(target=source, daemon=True)]
+    for i, fn in enumerate((read, prep, transform, render)):
+        threads.append(threading.Thread(target=_stage, args=(fn, queues[i], queues[i + 1], stop), daemon=True))
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item.frame if isinstance(item, _Cached) else item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,87 @@
+import numpy as np
+import cartopy.crs as ccrs
+from utils import constants
+
+GLOBE: tuple[float, float, float, float] = (-180.0, 180.0, -90.0, 90.0)
+EARTH_RADIUS: float                      = 6378137.0
+SATELLITE_HEIGHT: float                  = 35785831.0
+
+def horizon(projection: type[ccrs.Projection]) -> float | None:
+    """
+    Computes the angular radius of the part of the globe a projection shows
+    around its center.
+
+    Args:
+        projection (type[ccrs.Projection]): The projection class of a view
+
+    Returns:
+        float: The angular radius in degrees, or None when the whole globe is shown
+    """
+    if issubclass(projection, ccrs.Orthographic):
+        return 90.0
+    if issubclass(projection, (ccrs.Geostationary, ccrs.NearsidePerspective)):
+        return float(np.degrees(np.arccos(EARTH_RADIUS / (EARTH_RADIUS + SATELLITE_HEIGHT))))
+    return None
+
+def cap_extent(lon: float, lat: float, radius: float) -> tuple[float, float, float, float]:
+    """
+    Computes the lon/lat extent of a spherical cap. Caps that reach a pole
+    span every longitude, and caps that cross the antimeridian keep their
+    longitudes contiguous past 180 degrees.
+
+    Args:
+        lon (float): The longitude of the center
+        lat (float): The latitude of the center
+        radius (float): The angular radius in degrees
+
+    Returns:
+        tuple[float, float, float, float]: The extent as (west, east, south, north)
+    """
+    south, north = lat - radius, lat + radius
+    if south <= -90 or north >= 90:
+        return (-180.0, 180.0, max(south, -90.0), min(north, 90.0))
+
+    half = np.degrees(np.arcsin(np.sin(np.radians(radius)) / np.cos(np.radians(lat))))
+    return (lon - half, lon + half, south, north)
+
+def view_extent(view: str) -> tuple[float, float, float, float] | None:
+    """
+    Computes the lon/lat extent a view needs, from its extent in views.json
+    or, for views without one, from the horizon of its projection.
+
+    Args:
+        view (str): The view name
+
+    Returns:
+        tuple[float, float, float, float]: The extent, or None when the view needs the whole globe
+    """
+    spec = constants.VIEWS_SPEC.get(view)
+    if spec is None:
+        return None
+    if "extent" in spec:
+        return tuple(spec["extent"])
+
+    radius = horizon(constants.VIEWS[view])
+    if radius is None:
+        return None
+    return cap_extent(*spec["center"], radius)
+
+def window_shape(shape: tuple[int, int], extent: tuple[float, float, float, float], full: tuple[float, float, float, float] = GLOBE) -> tuple[int, int]:
+    """
+    Scales a shape meant for a full extent down to the share of it a window covers,
+    so a window is regridded or resampled at the same resolution as the full grid.
+
+    Args:
+        shape (tuple[int, int]): The shape on the full extent
+        extent (tuple[float, float, float, float]): The extent of the window
+        full (tuple[float, float, float, float], optional): The full extent. Defaults to the globe.
+
+    Returns:
+        tuple[int, int]: The shape on the window
+    """
+    west, east, south, north = extent
+    x0, x1, y0, y1           = full
+
+    rows = shape[0] * min(1.0, (north - south) / (y1 - y0))
+    cols = shape[1] * min(1.0, (east - west) / (x1 - x0))
+    return (max(1, round(rows)), max(1, round(cols)))
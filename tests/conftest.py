@@ -1 +1,7 @@
-import pytest
\ No newline at end of file
+import pytest
+from plotting import warping
+
+@pytest.fixture(autouse=True)
+def warps(tmp_path, monkeypatch):
+    # warp maps built by the tests stay out of the package
+    monkeypatch.setattr(warping, "WARPS", warping.WarpCache(root=str(tmp_path / "warps")))
@@ -0,0 +1,81 @@
+import datetime
+import numpy as np
+from granules import synthetic
+from processing import accumulating
+from processing.accumulating import AccumulatorStore
+from granules.reading import GranuleReader, granule_steps
+from utils.schemas import PrecisionContext
+
+def hourly(path: str, variable: str) -> np.ndarray:
+    with GranuleReader(path, variables=(variable,)) as reader:
+        return reader.variables[variable][0].data * 3600 / 25.4
+
+def test_extend_and_rolling(tmp_path, monkeypatch):
+    start = datetime.datetime(2020, 1, 1)
+    files = synthetic.generate(str(tmp_path / "src"), ["M2T1NXFLX"], start, start + datetime.timedelta(hours=5))
+    times = granule_steps(files[0])[:5]
+    paths = [path for _, path in times]
+
+    store = AccumulatorStore(str(tmp_path / "store"))
+    assert len(store.extend("M2T1NXFLX", start, times[2::-1])) == 3
+
+    # extending reads only the new granules
+    opened = []
+    reader = accumulating.GranuleReader
+
+    def track(path, *args, **kwargs):
+        opened.append(path)
+        return reader(path, *args, **kwargs)
+
+    monkeypatch.setattr(accumulating, "GranuleReader", track)
+    assert len(store.extend("M2T1NXFLX", start, times[::-1])) == 2
+    assert opened == paths[3:]
+
+    times = store.times("M2T1NXFLX", start)
+    assert len(times) == 5
+
+    for variable in ("PRECTOT", "PRECSNO"):
+        expected = sum(hourly(path, variable) for path in paths)
+        total    = store.total("M2T1NXFLX", start, times[-1], variable)
+        assert np.allclose(total.filled(0), np.where(expected < 0.1, 0, expected), atol=1e-4)
+
+    rolling  = store.total("M2T1NXFLX", start, times[-1], "PRECTOT", hours=2)
+    expected = hourly(paths[3], "PRECTOT") + hourly(paths[4], "PRECTOT")
+    assert np.allclose(rolling.filled(0), np.where(expected < 0.1, 0, expected), atol=1e-4)
+
+def test_late_granules_are_added_to_later_totals(tmp_path, monkeypatch):
+    start = datetime.datetime(2020, 1, 1)
+    files = synthetic.generate(str(tmp_path / "src"), ["M2T1NXFLX"], start, start + datetime.timedelta(hours=3))
+    times = granule_steps(files[0])[:3]
+    paths = [path for _, path in times]
+
+    store = AccumulatorStore(str(tmp_path / "store"))
+    assert store.extend("M2T1NXFLX", start, [times[0], times[2]]) == [times[0][0], times[2][0]]
+
+    opened = []
+    reader = accumulating.GranuleReader
+
+    def track(path, *args, **kwargs):
+        opened.append(path)
+        return reader(path, *args, **kwargs)
+
+    monkeypatch.setattr(accumulating, "GranuleReader", track)
+    assert store.extend("M2T1NXFLX", start, times) == [times[1][0]]
+    assert opened == [paths[1]]
+    assert store.times("M2T1NXFLX", start) == [time for time, _ in times]
+
+    for hour, (valid_time, _) in enumerate(times):
+        expected = sum(hourly(path, "PRECTOT") for path in paths[:hour + 1])
+        total    = store.total("M2T1NXFLX", start, valid_time, "PRECTOT")
+        assert np.allclose(total.filled(0), np.where(expected < 0.1, 0, expected), atol=1e-4)
+
+def test_totals_stay_float32_under_half_precision(tmp_path):
+    start = datetime.datetime(2020, 1, 1)
+    files = synthetic.generate(str(tmp_path / "src"), ["M2T1NXFLX"], start, start + datetime.timedelta(hours=1))
+    store = AccumulatorStore(str(tmp_path / "store"), PrecisionContext(storage="float16", compute="float16"))
+    store.extend("M2T1NXFLX", start, granule_steps(files[0])[:1])
+
+    valid_time = store.times("M2T1NXFLX", start)[-1]
+    stored     = np.load(store.fields.path(store._key("M2T1NXFLX", start), valid_time, "PRECTOT"))
+    assert stored.dtype == np.float32
+    assert store.total("M2T1NXFLX", start, valid_time, "PRECTOT").dtype == np.float32
@@ -0,0 +1,64 @@
+import os
+import datetime
+import numpy as np
+from netCDF4 import Dataset
+from granules.catalog import Catalog
+from granules.reading import GranuleReader
+
+def write_granule(path: str, minutes: int | list[int], variables: tuple[str, ...]):
+    minutes = minutes if isinstance(minutes, list) else [minutes]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Dataset(path, "w") as ds:
+        ds.createDimension("time", len(minutes))
+        ds.createDimension("lat", 3)
+        ds.createDimension("lon", 4)
+        time = ds.createVariable("time", "f8", ("time",))
+        time.units = "minutes since 2020-01-01 00:00:00"
+        time[:] = minutes
+        ds.createVariable("lat", "f8", ("lat",))[:] = [-90, 0, 90]
+        ds.createVariable("lon", "f8", ("lon",))[:] = [-180, -90, 0, 90]
+        for name in variables:
+            # each step holds its own index
+            ds.createVariable(name, "f4", ("time", "lat", "lon"))[:] = np.arange(len(minutes))[:, None, None] * np.ones((1, 3, 4))
+
+def test_aligned(tmp_path):
+    cache = os.path.join(tmp_path, "cache")
+    for hour in range(3):
+        write_granule(os.path.join(cache, "M2I3NPASM", f"asm{hour}.nc4"), hour * 60, ("H500",))
+        # hourly means are stamped at the half hour
+        write_granule(os.path.join(cache, "M2T1NXSLV", f"slv{hour}.nc4"), hour * 60 + 30, ("T2M",))
+    write_granule(os.path.join(cache, "M2T1NXSLV", "slv3.nc4"), 210, ("T2M",))
+
+    catalog = Catalog(os.path.join(tmp_path, "catalog.sqlite"))
+    assert catalog.scan(cache) == 7
+    assert catalog.scan(cache) == 0
+
+    units = catalog.aligned({"asm": "M2I3NPASM", "slv": "M2T1NXSLV"}, datetime.date(2020, 1, 1), datetime.date(2020, 1, 1))
+    assert [os.path.basename(unit["slv"]) for unit in units] == ["slv0.nc4", "slv1.nc4", "slv2.nc4"]
+    assert [os.path.basename(unit["asm"]) for unit in units] == ["asm0.nc4", "asm1.nc4", "asm2.nc4"]
+
+    assert catalog.lookup("M2T1NXSLV", datetime.date(2020, 1, 1), datetime.date(2020, 1, 1), ("H500",)) == []
+
+    os.remove(os.path.join(cache, "M2T1NXSLV", "slv3.nc4"))
+    catalog.scan(cache)
+    assert len(catalog.lookup("M2T1NXSLV", datetime.date(2020, 1, 1), datetime.date(2020, 1, 1))) == 3
+
+def test_daily_granules_are_indexed_by_step(tmp_path):
+    path    = os.path.join(tmp_path, "cache", "M2T1NXFLX", "flx.nc4")
+    catalog = Catalog(os.path.join(tmp_path, "catalog.sqlite"))
+    write_granule(path, [hour * 60 + 30 for hour in range(24)], ("PRECTOT",))
+    assert catalog.register("M2T1NXFLX", path)
+    assert not catalog.register("M2T1NXFLX", f"{path}#3")
+
+    steps = catalog.lookup("M2T1NXFLX", datetime.date(2020, 1, 1), datetime.date(2020, 1, 1))
+    assert [time.hour for time, _ in steps] == list(range(24))
+    with GranuleReader(steps[5][1]) as reader:
+        assert reader.valid_time == datetime.datetime(2020, 1, 1, 5, 30)
+        assert reader.variables["PRECTOT"].shape == (1, 3, 4)
+        assert np.all(reader.variables["PRECTOT"][0] == 5)
+
+    # a rewritten file replaces all of its steps
+    write_granule(path, [30, 90], ("PRECTOT",))
+    os.utime(path, ns=(0, 0))
+    assert catalog.register("M2T1NXFLX", path)
+    assert len(catalog.lookup("M2T1NXFLX", datetime.date(2020, 1, 1), datetime.date(2020, 1, 1))) == 2
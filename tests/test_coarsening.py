@@ -0,0 +1,26 @@
+import numpy as np
+from processing.coarsening import coarsen, coarsen_coordinates, pyramid, pyramid_level, level_shape
+
+def test_coarsen():
+    data = np.arange(20, dtype=np.float32).reshape(4, 5)
+    data[0, 0] = np.nan
+
+    coarse = coarsen(data)
+    assert coarse.shape == (2, 3)
+    assert coarse[0, 0] == np.mean([1, 5, 6])
+    assert coarse[1, 2] == np.mean([14, 19])
+
+    masked = coarsen(np.ma.masked_invalid(np.full((3, 3, 4), np.nan)))
+    assert masked.shape == (3, 2, 2) and masked.mask.all()
+
+    assert np.allclose(coarsen_coordinates(np.linspace(-90, 90, 5)), [-67.5, 22.5, 90])
+
+def test_pyramid_levels():
+    levels = pyramid(np.ones((361, 576)), 4)
+    assert [level.shape for level in levels] == [(361, 576), (181, 288), (91, 144), (46, 72)]
+
+    assert pyramid_level(16.0, None) == 0
+    assert pyramid_level(16.0, 20.0) == 0
+    assert pyramid_level(16.0, 4.0) == 2
+    assert pyramid_level(16.0, 0.01, levels=4) == 3
+    assert level_shape((1800, 3600), 2.5) == (450, 900)
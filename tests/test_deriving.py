@@ -0,0 +1,44 @@
+import os
+import datetime
+import numpy as np
+from granules import synthetic
+from granules.reading import GranuleReader
+from processing.deriving import NODES, FieldGraph
+from processing.preprocessing import stack_weather_types, preprocess_vorticity_data
+
+def test_weather_types_match_preprocessing(tmp_path):
+    time  = datetime.datetime(2020, 1, 1)
+    paths = {
+        key: synthetic.write_granule(os.path.join(tmp_path, f"{short_name}.nc4"), short_name, time)
+        for key, short_name in (("asm", "M2I3NPASM"), ("flx", "M2T1NXFLX"), ("slv", "M2T1NXSLV"))
+    }
+    readers = {key: GranuleReader(path) for key, path in paths.items()}
+    try:
+        graph    = FieldGraph(readers)
+        fields   = graph.fields("weather types")
+        expected = stack_weather_types([readers], engine="numpy")
+        vort     = preprocess_vorticity_data([readers["slv"]])[0][0]
+
+        for field, stack in zip(fields.values(), expected):
+            assert np.allclose(field.filled(np.nan), stack[0], equal_nan=True)
+        assert np.allclose(graph.fields("vorticity")["vort"], vort)
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+def test_shared_intermediates_are_computed_once(tmp_path):
+    path = synthetic.write_granule(os.path.join(tmp_path, "flx.nc4"), "M2T1NXFLX", datetime.datetime(2020, 1, 1))
+
+    calls = []
+    nodes = {
+        name: (inputs, lambda *args, name=name, fn=fn: calls.append(name) or fn(*args))
+        for name, (inputs, fn) in NODES.items()
+    }
+
+    with GranuleReader(path) as reader:
+        graph = FieldGraph(reader, nodes)
+        graph.fields("accumulated rainfall")
+        graph.fields("accumulated snowfall")
+        graph.fields("accumulated rainfall")
+
+    assert sorted(calls) == ["rain_rate", "snow_rate"]
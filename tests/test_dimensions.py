@@ -1,7 +1,25 @@
 import numpy as np
-from processing.resampling import resample
+from processing.resampling import resample, axis_table
 
 def test_resample():
     data      = np.random.rand(100, 100)
     resampled = resample(data, (50, 50))
-    assert resampled.shape == (50, 50)
\ No newline at end of file
+    assert resampled.shape == (50, 50)
+
+def test_resample_stack():
+    stack = np.random.rand(4, 100, 60).astype(np.float32)
+    for method in ("nearest", "bilinear", "area"):
+        resampled = resample(stack, (50, 30), method=method)
+        assert resampled.shape == (4, 50, 30)
+        assert resampled.dtype == np.float32
+        assert np.allclose(resampled[2], resample(stack[2], (50, 30), method=method))
+
+def test_resample_area():
+    data = np.random.rand(100, 60)
+    assert np.allclose(resample(data, (50, 30), method="area"), data.reshape(50, 2, 30, 2).mean(axis=(1, 3)))
+
+def test_resample_tables_are_cached():
+    axis_table.cache_clear()
+    resample(np.random.rand(3, 40, 40), (20, 20))
+    resample(np.random.rand(3, 40, 40), (20, 20))
+    assert axis_table.cache_info().misses == 1
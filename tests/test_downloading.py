@@ -0,0 +1,110 @@
+import os
+import time
+import hashlib
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from granules import downloading
+from granules.caching import granule_dir, is_verified
+from utils.schemas import DownloadContext
+
+class FakeResponse:
+    def __init__(self, content: bytes, status_code: int):
+        self.content     = content
+        self.status_code = status_code
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size: int):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+class FakeSession:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.ranges  = []
+
+    def get(self, url, headers=None, stream=True, timeout=None):
+        headers = headers or {}
+        if "Range" in headers:
+            offset = int(headers["Range"][6:-1])
+            self.ranges.append(offset)
+            return FakeResponse(self.content[offset:], 206)
+        return FakeResponse(self.content, 200)
+
+def test_granule_dir():
+    path1 = granule_dir("cache", "M2T1NXFLX", "granule-1")
+    path2 = granule_dir("cache", "M2T1NXSLV", "granule-1")
+    assert path1 != path2
+    assert path1 == granule_dir("cache", "M2T1NXFLX", "granule-1")
+
+def test_resume_download(tmp_path, monkeypatch):
+    content = os.urandom(10000)
+    fake    = FakeSession(content)
+    monkeypatch.setattr(downloading, "session", lambda: fake)
+
+    path = os.path.join(tmp_path, "granule.nc4")
+    with open(f"{path}.part", "wb") as f:
+        f.write(content[:4000])
+
+    spec = {
+        "size": len(content),
+        "checksum": hashlib.md5(content).hexdigest(),
+        "algorithm": "MD5"
+    }
+    context = DownloadContext(chunk_size=1024)
+    downloading.download_file("https://example.com/granule.nc4", path, context, spec)
+
+    assert fake.ranges == [4000]
+    assert open(path, "rb").read() == content
+    assert is_verified(path, spec)
+
+    # verified files are not downloaded again
+    downloading.download_file("https://example.com/granule.nc4", path, context, spec)
+    assert fake.ranges == [4000]
+
+class SlowResponse(FakeResponse):
+    def iter_content(self, chunk_size: int):
+        for chunk in super().iter_content(chunk_size):
+            time.sleep(0.001)
+            yield chunk
+
+class SlowSession(FakeSession):
+    def get(self, url, headers=None, stream=True, timeout=None):
+        resp = super().get(url, headers, stream, timeout)
+        return SlowResponse(resp.content, resp.status_code)
+
+def test_concurrent_downloads(tmp_path, monkeypatch):
+    content = os.urandom(20000)
+    fake    = SlowSession(content)
+    monkeypatch.setattr(downloading, "session", lambda: fake)
+
+    path    = os.path.join(tmp_path, "granule.nc4")
+    spec    = {"size": len(content), "checksum": hashlib.md5(content).hexdigest(), "algorithm": "MD5"}
+    context = DownloadContext(chunk_size=1024)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        paths = list(pool.map(lambda _: downloading.download_file("https://example.com/granule.nc4", path, context, spec), range(4)))
+
+    assert paths == [path] * 4
+    assert open(path, "rb").read() == content
+    assert not os.path.exists(f"{path}.part")
+
+def test_unverified_files_are_kept(tmp_path, monkeypatch):
+    fake = FakeSession(b"new")
+    monkeypatch.setattr(downloading, "session", lambda: fake)
+
+    path = os.path.join(tmp_path, "granule.nc4")
+    with open(path, "wb") as f:
+        f.write(b"old")
+
+    downloading.download_file("https://example.com/granule.nc4", path, DownloadContext(verify=False))
+    assert open(path, "rb").read() == b"old"
+
+    with pytest.raises(ValueError):
+        downloading.download_file("https://example.com/granule.nc4", os.path.join(tmp_path, "other.nc4"), DownloadContext(retries=0))
@@ -0,0 +1,40 @@
+import datetime
+import driver
+
+def test_time_chunks():
+    chunks = list(driver.time_chunks(datetime.date(2020, 1, 1), datetime.date(2020, 1, 12), 5))
+    assert chunks == [
+        (datetime.date(2020, 1, 1), datetime.date(2020, 1, 6)),
+        (datetime.date(2020, 1, 6), datetime.date(2020, 1, 11)),
+        (datetime.date(2020, 1, 11), datetime.date(2020, 1, 12))
+    ]
+
+def test_search_chunks_skips_boundary_granules(monkeypatch):
+    def search_units(event, source):
+        days = range(event["start"].toordinal(), event["end"].toordinal() + 1)
+        return [{"data": ("CCMP", {"meta": {"native-id": str(day)}})} for day in days]
+
+    monkeypatch.setattr(driver, "search_units", search_units)
+    event = {"start": datetime.date(2020, 1, 1), "end": datetime.date(2020, 1, 12), "chunk_days": 5}
+    units = list(driver.search_chunks(event, None, lambda stage, fraction: None))
+
+    ids = [int(unit["data"][1]["meta"]["native-id"]) for unit in units]
+    assert ids == list(range(datetime.date(2020, 1, 1).toordinal(), datetime.date(2020, 1, 12).toordinal() + 1))
+
+def test_search_units_pairs_by_valid_time():
+    def record(name, time):
+        return {"umm": {"GranuleUR": name, "TemporalExtent": {"RangeDateTime": {"BeginningDateTime": time}}}}
+
+    class Source:
+        def search(self, short_name, start, end):
+            if short_name == "M2T1NXSLV":
+                return [record("slv-0", "2020-01-01T00:30:00Z"), record("slv-2", "2020-01-01T02:30:00Z")]
+            return [record(f"flx-{hour}", f"2020-01-01T0{hour}:30:00Z") for hour in range(3)]
+
+    event = {"dataset": ["M2T1NXFLX", "M2T1NXSLV"], "start": datetime.date(2020, 1, 1), "end": datetime.date(2020, 1, 1)}
+    units = driver.search_units(event, Source())
+    assert [(unit["flx"][1]["umm"]["GranuleUR"], unit["slv"][1]["umm"]["GranuleUR"]) for unit in units] == [("flx-0", "slv-0"), ("flx-2", "slv-2")]
+
+def test_local_sources_keep_their_catalog(tmp_path):
+    source = driver.LocalSource(str(tmp_path))
+    assert driver.source_catalog(source) is source.catalog
@@ -0,0 +1,50 @@
+import os
+from plotting.caching import FrameCache, frame_key
+from utils.schemas import PlotterContext
+
+def write_frame(path: str, size: int) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return path
+
+def test_hit_and_eviction(tmp_path):
+    cache = FrameCache(str(tmp_path / "frames"), quota=250)
+    src1  = write_frame(str(tmp_path / "out" / "00.png"), 100)
+    src2  = write_frame(str(tmp_path / "out" / "01.png"), 100)
+    src3  = write_frame(str(tmp_path / "out" / "02.png"), 100)
+
+    cache.put("aa1", src1, timestamp="2020-01-01T00:00:00Z")
+    os.utime(cache._path("aa1"), (1, 1))
+    cache.put("bb2", src2)
+    os.utime(cache._path("bb2"), (2, 2))
+
+    # a hit refreshes the frame so the older one is evicted first
+    dest = str(tmp_path / "copy" / "00.png")
+    assert cache.get("aa1", dest)["timestamp"] == "2020-01-01T00:00:00Z"
+    assert os.path.exists(dest)
+
+    cache.put("cc3", src3)
+    assert cache.get("bb2") is None
+    assert cache.get("aa1") is not None
+    assert cache.size() <= 250
+
+def test_puts_under_quota_do_not_rescan(tmp_path, monkeypatch):
+    cache = FrameCache(str(tmp_path / "frames"), quota=1000)
+    cache.put("aa1", write_frame(str(tmp_path / "out" / "00.png"), 100))
+
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or entries())
+
+    cache.put("bb2", write_frame(str(tmp_path / "out" / "01.png"), 100))
+    cache.put("bb2", write_frame(str(tmp_path / "out" / "01.png"), 150))
+    assert cache.size() == 250
+    assert scans == []
+
+def test_key_depends_on_context():
+    context = PlotterContext()
+    key     = frame_key(["CCMP/g0"], "globe", context, "10m winds")
+    assert key == frame_key(["CCMP/g0"], "globe", context, "10m winds")
+    assert key != frame_key(["CCMP/g1"], "globe", context, "10m winds")
+    assert key != frame_key(["CCMP/g0"], "conus", context, "10m winds")
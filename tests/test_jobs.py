@@ -0,0 +1,56 @@
+import threading
+import pytest
+from concurrent.futures import CancelledError
+from jobs import JobManager, job_key
+
+def test_job_key_separates_credentials():
+    event1 = {"category": "10m winds", "view": "globe", "auth_user": "a", "auth_pass": "b"}
+    event2 = {"category": "10m winds", "view": "globe", "auth_user": "a", "auth_pass": "wrong"}
+    assert job_key(event1) == job_key(dict(event1))
+    assert job_key(event1) != job_key(event2)
+
+def test_coalesce_in_flight_jobs():
+    release = threading.Event()
+    calls   = []
+
+    def run(event, progress):
+        calls.append(event)
+        progress("render", 0.5)
+        release.wait(5)
+        return ["frame"]
+
+    manager = JobManager(workers=2, run=run)
+    event   = {"category": "10m winds", "view": "globe"}
+    job1    = manager.submit(event)
+    job2    = manager.submit(dict(event))
+    assert job1 is job2
+    assert job1.sessions == 2
+
+    release.set()
+    assert job1.result(5) == ["frame"]
+    assert job2.result(5) == ["frame"]
+    assert len(calls) == 1
+    assert manager.in_flight() == 0
+    assert job1.progress() == {"render": 0.5}
+
+def test_shutdown_cancels_queued_jobs():
+    release = threading.Event()
+    started = threading.Event()
+
+    def run(event, progress):
+        started.set()
+        release.wait(5)
+        return [event["view"]]
+
+    manager = JobManager(workers=1, run=run)
+    running = manager.submit({"category": "10m winds", "view": "globe"})
+    started.wait(5)
+    queued  = manager.submit({"category": "10m winds", "view": "conus"})
+
+    manager.shutdown()
+    with pytest.raises(CancelledError):
+        queued.result(5)
+    assert manager.in_flight() == 1
+
+    release.set()
+    assert running.result(5) == ["globe"]
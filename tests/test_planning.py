@@ -0,0 +1,89 @@
+import os
+import datetime
+import numpy as np
+from netCDF4 import Dataset
+from granules import synthetic
+from processing import planning, deriving
+from processing.planning import plan_products, schedule_products, preprocess_products
+
+def write_granule(path: str, hour: int):
+    with Dataset(path, "w") as ds:
+        ds.createDimension("time", 1)
+        ds.createDimension("lat", 5)
+        ds.createDimension("lon", 8)
+        time = ds.createVariable("time", "f8", ("time",))
+        time.units = "minutes since 2020-01-01 00:00:00"
+        time[:] = [hour * 60 + 30]
+        ds.createVariable("lat", "f8", ("lat",))[:] = np.linspace(-90, 90, 5)
+        ds.createVariable("lon", "f8", ("lon",))[:] = np.linspace(-180, 135, 8)
+        for name in ("PRECTOT", "PRECSNO"):
+            ds.createVariable(name, "f4", ("time", "lat", "lon"))[:] = np.random.rand(1, 5, 8) * 1e-3
+
+def test_shared_granules_are_decoded_once(tmp_path, monkeypatch):
+    products = {"accumulated rainfall": "M2T1NXFLX", "accumulated snowfall": "M2T1NXFLX"}
+    assert plan_products(products) == {"M2T1NXFLX": ("PRECTOT", "PRECSNO")}
+
+    paths = {}
+    for hour in range(3):
+        paths[datetime.datetime(2020, 1, 1, hour)] = {"data": os.path.join(tmp_path, f"flx{hour}.nc4")}
+        write_granule(paths[datetime.datetime(2020, 1, 1, hour)]["data"], hour)
+
+    decoded = []
+    original = planning.DecodedGranule
+
+    def decode(reader, variables):
+        decoded.append(reader.path)
+        return original(reader, variables)
+
+    monkeypatch.setattr(planning, "DecodedGranule", decode)
+    schedule = schedule_products(products, lambda collections: paths)
+    output   = preprocess_products(products, schedule)
+
+    assert len(decoded) == 3
+    for category, variable in (("accumulated rainfall", "PRECTOT"), ("accumulated snowfall", "PRECSNO")):
+        expected = np.zeros((5, 8))
+        for hour, path in enumerate(decoded):
+            with Dataset(path) as ds:
+                expected += ds.variables[variable][0].data * 3600 / 25.4
+            assert np.allclose(np.ma.filled(output[category][hour], 0), np.where(expected < 0.1, 0, expected))
+
+def test_products_on_different_grids(tmp_path):
+    time     = datetime.datetime(2020, 1, 1)
+    ccmp     = synthetic.write_granule(os.path.join(tmp_path, "ccmp.nc"), "CCMP_WINDS_10M6HR_L4_V3.1", time)
+    slv      = synthetic.write_granule(os.path.join(tmp_path, "slv.nc4"), "M2T1NXSLV", time)
+    products = {"10m winds": "CCMP_WINDS_10M6HR_L4_V3.1", "vorticity": "M2T1NXSLV"}
+    schedule = {time: [("10m winds", {"data": ccmp}), ("vorticity", {"data": slv})]}
+
+    output = preprocess_products(products, schedule)
+
+    assert np.shape(output["10m winds"][0]) == (720, 1440)
+    assert np.shape(output["vorticity"][0][0]) == (361, 576)
+
+def test_products_share_intermediates(tmp_path, monkeypatch):
+    time  = datetime.datetime(2020, 1, 1)
+    paths = {
+        key: synthetic.write_granule(os.path.join(tmp_path, f"{key}.nc4"), short_name, time)
+        for key, short_name in (("asm", "M2I3NPASM"), ("flx", "M2T1NXFLX"), ("slv", "M2T1NXSLV"))
+    }
+    products = {
+        "weather types": ["M2I3NPASM", "M2T1NXFLX", "M2T1NXSLV"],
+        "accumulated rainfall": "M2T1NXFLX",
+        "vorticity": "M2T1NXSLV"
+    }
+    schedule = {time: [
+        ("weather types", paths),
+        ("accumulated rainfall", {"data": paths["flx"]}),
+        ("vorticity", {"data": paths["slv"]})
+    ]}
+
+    calls      = []
+    inputs, fn = deriving.NODES["rain_rate"]
+    raw        = deriving.FieldGraph._raw
+    monkeypatch.setitem(deriving.NODES, "rain_rate", (inputs, lambda *args: calls.append("rain_rate") or fn(*args)))
+    monkeypatch.setattr(deriving.FieldGraph, "_raw", lambda graph, name: calls.append(name) or raw(graph, name))
+
+    output = preprocess_products(products, schedule)
+
+    assert calls.count("rain_rate") == 1
+    assert calls.count("PRECTOT") == 1
+    assert all(len(fields) == 1 for fields in output.values())
@@ -0,0 +1,39 @@
+import os
+import datetime
+import numpy as np
+from granules import synthetic
+from granules.reading import GranuleReader, granule_steps
+from processing.pooling import preprocess_parallel
+from processing.preprocessing import preprocess_accumulated_rain, stack_weather_types
+from utils.schemas import BatchContext
+
+EXTENT = (-80.5, -74.5, 37.5, 39.75)
+
+def test_parallel_preprocessing(tmp_path):
+    start = datetime.datetime(2020, 1, 1)
+    root  = os.path.join(tmp_path, "granules")
+    paths = synthetic.generate(root, ["M2T1NXFLX", "M2T1NXSLV", "M2I3NPASM"], start, start + datetime.timedelta(hours=5))
+
+    steps = {key: [step for _, step in granule_steps(path)] for path in paths for key in ("flx", "slv", "asm") if key in path}
+    flx   = steps["flx"][:5]
+    slv   = steps["slv"][:5]
+    asm   = steps["asm"]
+    units = [{"asm": asm[i // 3], "flx": flx[i], "slv": slv[i]} for i in range(len(flx))]
+
+    context = BatchContext(concurrency=2, batch_size=2)
+    stacks  = preprocess_parallel("weather types", units, context, EXTENT, 1.0, stacked=True)
+    totals  = preprocess_parallel("accumulated rainfall", [{"data": path} for path in flx], context, EXTENT, 1.0, stacked=True)
+
+    readers = [{key: GranuleReader(path, extent=EXTENT, margin=1.0) for key, path in unit.items()} for unit in units]
+    try:
+        expected = stack_weather_types(readers)
+        rain     = preprocess_accumulated_rain([unit["flx"] for unit in readers], stacked=True)
+    finally:
+        for unit in readers:
+            for reader in unit.values():
+                reader.close()
+
+    assert len(stacks) == len(expected)
+    for stack, serial in zip(stacks, expected):
+        assert np.array_equal(stack, serial, equal_nan=True)
+    assert np.array_equal(totals, rain, equal_nan=True)
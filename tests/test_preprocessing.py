@@ -0,0 +1,75 @@
+import os
+import glob
+import datetime
+import numpy as np
+from granules import synthetic
+from granules.reading import GranuleReader, granule_steps
+from processing.classifying import classify_precipitation
+from processing.preprocessing import (
+    relative_vorticity, preprocess_accumulated_rain, preprocess_weather_types, stack_weather_types
+)
+
+LATS = np.linspace(-90, 90, 361)
+LONS = np.arange(576) * 0.625 - 180
+RE   = 6371220.0
+
+def test_solid_body_rotation():
+    phi = np.deg2rad(LATS)[:, None]
+    u   = np.broadcast_to(20 * np.cos(phi), (3, LATS.size, LONS.size))
+    v   = np.zeros_like(u)
+
+    zeta     = relative_vorticity(u, v, LATS, LONS)
+    expected = 2 * 20 * np.sin(phi) / RE
+    assert zeta.shape == (3, LATS.size, LONS.size)
+    # pole rows included
+    assert np.allclose(zeta, expected, atol=1e-3 * np.abs(expected).max())
+
+def test_periodic_longitude():
+    phi  = np.deg2rad(LATS)[:, None]
+    lam  = np.deg2rad(LONS)[None, :]
+    v    = 5 * np.sin(lam) * np.cos(phi) ** 2
+    zeta = relative_vorticity(np.zeros_like(v), v, LATS, LONS)
+    assert np.allclose(zeta, 5 * np.cos(lam) * np.cos(phi) / RE, atol=1e-3 * 5 / RE)
+
+def test_stacked_matches_per_frame(tmp_path):
+    start = datetime.datetime(2020, 1, 1)
+    root  = str(tmp_path)
+    synthetic.generate(root, ["M2I3NPASM", "M2T1NXSLV", "M2T1NXFLX"], start, start + datetime.timedelta(hours=3))
+
+    def open_all(short_name):
+        path = glob.glob(os.path.join(root, short_name, "*"))[0]
+        return [GranuleReader(step) for _, step in granule_steps(path)[:3]]
+
+    flx = open_all("M2T1NXFLX")
+    acc = preprocess_accumulated_rain(flx, stacked=True)
+    assert acc.dtype == np.float32 and acc.shape == (3, 361, 576)
+    assert np.allclose(np.ma.filled(preprocess_accumulated_rain(flx)[0], np.nan), acc, equal_nan=True, rtol=1e-5)
+
+    datasets = [{"asm": asm, "slv": slv, "flx": flx} for asm, slv, flx in zip(open_all("M2I3NPASM"), open_all("M2T1NXSLV"), flx)][:1]
+    frames   = preprocess_weather_types(datasets)
+    for engine in ("numba", "numpy"):
+        stacks = stack_weather_types(datasets, engine=engine)
+        for stack, field in zip(stacks, frames[0]):
+            assert np.allclose(stack[0], field, rtol=1e-4, atol=1e-4)
+
+def test_fused_kernel_matches_numpy():
+    rng   = np.random.default_rng(0)
+    shape = (2, 361, 576)
+    raw   = {
+        "PHIS": rng.uniform(0, 30000, shape),
+        "PRECSNO": rng.uniform(0, 1e-3, shape) * (rng.random(shape) < 0.5),
+        "PRECTOT": rng.uniform(0, 2e-3, shape),
+        "H1000": rng.uniform(-200, 300, shape),
+        "H500": rng.uniform(5200, 6000, shape)
+    }
+    snow, ice, frzr, rain = classify_precipitation(*(raw[name] for name in ("PHIS", "PRECSNO", "PRECTOT", "H1000", "H500")))
+
+    scale    = 3600 / 25.4
+    low      = 5400 + np.clip((raw["PHIS"] / 9.81 - 305) / 915, 0, 1) * 100
+    to_ice   = (raw["H500"] - raw["H1000"] >= low) & (raw["PRECSNO"] > 0)
+    expected = np.where(to_ice, 0, raw["PRECSNO"] * scale)
+    assert to_ice.any() and not to_ice.all()
+    assert np.allclose(snow, expected, atol=1e-4)
+    assert np.allclose(ice, np.where(to_ice, raw["PRECSNO"] * scale, 0), atol=1e-4)
+    assert np.allclose(rain, np.where((expected >= 0.1) | (ice >= 0.1), 0, raw["PRECTOT"] * scale), atol=1e-4)
+    assert not frzr.any()
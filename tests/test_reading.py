@@ -0,0 +1,48 @@
+import os
+import numpy as np
+from netCDF4 import Dataset
+from granules.reading import GranuleReader, lon_window
+
+def write_granule(path: str) -> np.ndarray:
+    lats = np.linspace(-90, 90, 361)
+    lons = np.linspace(-180, 179.375, 576)
+    data = np.random.rand(1, lats.size, lons.size).astype(np.float32)
+
+    with Dataset(path, "w") as ds:
+        ds.createDimension("time", 1)
+        ds.createDimension("lat", lats.size)
+        ds.createDimension("lon", lons.size)
+        ds.createVariable("lat", "f8", ("lat",))[:] = lats
+        ds.createVariable("lon", "f8", ("lon",))[:] = lons
+        ds.createVariable("PRECTOT", "f4", ("time", "lat", "lon"))[:] = data
+        ds.createVariable("T2M", "f4", ("time", "lat", "lon"))[:] = data
+
+    return data
+
+def test_lon_window_wrap():
+    lons    = np.linspace(-180, 179.375, 576)
+    windows = lon_window(lons, 170, 190)
+    assert len(windows) == 2
+    assert windows[0].stop == lons.size
+    assert windows[1].start == 0
+
+def test_regional_window(tmp_path):
+    path = os.path.join(tmp_path, "granule.nc4")
+    data = write_granule(path)
+
+    with GranuleReader(path, variables=("PRECTOT",), extent=(-80.5, -74.5, 37.5, 39.75), margin=1.0) as reader:
+        assert list(reader.variables) == ["PRECTOT"]
+        window = reader.variables["PRECTOT"][0].data
+        assert window.shape == (reader.lats.size, reader.lons.size)
+        assert window.shape[0] < 20 and window.shape[1] < 20
+        assert np.array_equal(window, data[0][reader.lat_slice, reader.lon_slices[0]])
+
+def test_antimeridian_window(tmp_path):
+    path = os.path.join(tmp_path, "granule.nc4")
+    data = write_granule(path)
+
+    with GranuleReader(path, extent=(170, 190, -10, 10)) as reader:
+        window   = reader.variables["T2M"][0].data
+        expected = np.concatenate([data[0][reader.lat_slice, s] for s in reader.lon_slices], axis=1)
+        assert np.array_equal(window, expected)
+        assert np.all(np.diff(reader.lons) > 0)
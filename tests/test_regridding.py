@@ -0,0 +1,132 @@
+import os
+import time
+import pytest
+import numpy as np
+import scipy.sparse as sp
+from netCDF4 import Dataset
+from concurrent.futures import ThreadPoolExecutor
+from processing import regridding
+from processing.regridding import RegridderCache, SparseRegridder, regridder_key, regrid_stack, view_contexts
+from utils.schemas import RegridderContext
+
+def write_weights(path: str, weights: sp.coo_matrix):
+    with Dataset(path, "w") as ds:
+        ds.createDimension("n_s", weights.nnz)
+        ds.createVariable("S", "f8", ("n_s",))[:] = weights.data
+        ds.createVariable("row", "i4", ("n_s",))[:] = weights.row + 1
+        ds.createVariable("col", "i4", ("n_s",))[:] = weights.col + 1
+
+class FakeRegridder:
+    built = []
+
+    def __init__(self, grid_in, grid_out, method, filename=None, reuse_weights=False):
+        self.filename = filename
+        FakeRegridder.built.append(filename)
+
+    def to_netcdf(self, filename):
+        write_weights(filename, sp.random(20 * 40, 10 * 20, density=0.01, random_state=0, format="coo"))
+
+def test_regridder_key():
+    context = RegridderContext(method="bilinear", shape_in=(10, 20), shape_out=(20, 40))
+    shifted = context.model_copy(update={"extent": (-170, 190, -90, 90)})
+
+    assert regridder_key(context) == regridder_key(context.model_copy())
+    assert regridder_key(context) != regridder_key(shifted)
+    assert regridder_key(context).startswith("bilinear-10x20in-20x40out-")
+
+def test_regridder_cache(tmp_path, monkeypatch):
+    xesmf = pytest.importorskip("xesmf")
+    monkeypatch.setattr(xesmf, "Regridder", FakeRegridder)
+    FakeRegridder.built = []
+
+    context = RegridderContext(method="bilinear", shape_in=(10, 20), shape_out=(20, 40), reuse_weights=True, weights_dir=str(tmp_path))
+    cache   = RegridderCache(size=1)
+
+    first = cache.get(context)
+    assert cache.get(context) is first
+    assert FakeRegridder.built == [None]
+    assert os.listdir(tmp_path) == [f"{regridder_key(context)}-weights.nc"]
+
+    # evicted regridders are reloaded from the weights on disk, without xESMF
+    cache.get(context.model_copy(update={"shape_out": (10, 20)}))
+    loaded = cache.get(context)
+    assert isinstance(loaded, SparseRegridder)
+    assert len(FakeRegridder.built) == 2
+    assert loaded(np.ones((3, 10, 20))).shape == (3, 20, 40)
+
+def test_regridder_cache_loads_each_key_once(monkeypatch):
+    loads = []
+
+    def load(context):
+        loads.append(context)
+        time.sleep(0.05)
+        return object()
+
+    monkeypatch.setattr(regridding, "load_regridder", load)
+    context = RegridderContext(method="bilinear", shape_in=(10, 20), shape_out=(20, 40))
+    cache   = RegridderCache(size=2)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        regridders = list(pool.map(lambda _: cache.get(context), range(8)))
+
+    assert len(loads) == 1
+    assert all(regridder is regridders[0] for regridder in regridders)
+
+def test_view_contexts():
+    lats    = np.linspace(-90, 90, 361)
+    lons    = np.arange(576) * 0.625 - 180
+    context = RegridderContext(method="bilinear", shape_in=(361, 576), shape_out=(1800, 3600))
+
+    contexts = view_contexts(context, lats, lons, ["globe", "maryland_mapset", "himawari_proj"])
+    assert contexts["globe"].shape_in == (361, 576)
+    assert abs(contexts["globe"].shape_out[1] - 3600) < 10
+    assert contexts["maryland_mapset"].shape_in[1] < 20
+    assert contexts["himawari_proj"].extent[1] > 180
+
+class MatrixRegridder:
+    def __init__(self, weights, shape_out):
+        self.weights   = weights
+        self.shape_out = shape_out
+
+def test_regrid_stack():
+    rng       = np.random.default_rng(0)
+    weights   = sp.random(6 * 8, 4 * 5, density=0.2, random_state=0, format="coo")
+    regridder = MatrixRegridder(weights, (6, 8))
+
+    stack  = rng.random((7, 4, 5)).astype(np.float32)
+    field  = rng.random((4, 5)).astype(np.float32)
+    frames = [(weights @ frame.ravel()).reshape(6, 8) for frame in stack]
+
+    regridded = regrid_stack(stack, regridder, chunk_size=3)
+    assert regridded.shape == (7, 6, 8) and regridded.dtype == np.float32
+    assert np.allclose(regridded, frames, atol=1e-5)
+
+    both = regrid_stack((stack, field), regridder)
+    assert np.allclose(both[0], frames, atol=1e-5)
+    assert np.allclose(both[1], (weights @ field.ravel()).reshape(6, 8), atol=1e-5)
+
+def test_regrid_stack_converts_weights_once(monkeypatch):
+    weights   = sp.random(6 * 8, 4 * 5, density=0.2, random_state=0, format="coo")
+    regridder = MatrixRegridder(weights, (6, 8))
+    converted = []
+    original  = regridding.weights_matrix
+
+    def convert(regridder):
+        converted.append(regridder)
+        return original(regridder)
+
+    monkeypatch.setattr(regridding, "weights_matrix", convert)
+    for _ in range(3):
+        regrid_stack(np.ones((2, 4, 5), dtype=np.float32), regridder)
+    regrid_stack(np.ones((4, 5)), regridder)
+
+    assert len(converted) == 2
+
+def test_sparse_regridder(tmp_path):
+    path    = os.path.join(tmp_path, "weights.nc")
+    weights = sp.random(6 * 8, 4 * 5, density=0.2, random_state=1, format="coo")
+    write_weights(path, weights)
+
+    regridder = SparseRegridder(path, (4, 5), (6, 8))
+    field     = np.random.default_rng(1).random((4, 5)).astype(np.float32)
+    assert np.allclose(regridder(field), (weights @ field.ravel()).reshape(6, 8), atol=1e-5)
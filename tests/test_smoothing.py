@@ -0,0 +1,26 @@
+import numpy as np
+from processing.smoothing import savitzky_golay2d, savitzky_golay_kernels
+
+def test_polynomials_are_preserved():
+    rows, cols = np.mgrid[0:40, 0:60].astype(np.float32)
+    z          = 0.01 * rows ** 2 + 0.5 * rows * cols - cols
+
+    smoothed  = savitzky_golay2d(z, 7, 2)
+    row, col  = savitzky_golay2d(z, 7, 2, derivative="both")
+    inner     = (slice(3, -3), slice(3, -3))
+    assert smoothed.shape == z.shape
+    assert np.allclose(smoothed[inner], z[inner], atol=1e-2)
+    # "row" differentiates along each row, "col" along each column
+    assert np.allclose(row[inner], (0.5 * rows - 1)[inner], atol=1e-2)
+    assert np.allclose(col[inner], (0.02 * rows + 0.5 * cols)[inner], atol=1e-2)
+
+def test_stacks_match_frames():
+    stack    = np.random.default_rng(0).random((5, 30, 45)).astype(np.float32)
+    smoothed = savitzky_golay2d(stack, 5, 3, chunk_size=2)
+
+    assert smoothed.shape == stack.shape and smoothed.dtype == np.float32
+    for frame, expected in zip(stack, smoothed):
+        assert np.allclose(savitzky_golay2d(frame, 5, 3), expected, atol=1e-5)
+
+    assert savitzky_golay_kernels(5, 3) is savitzky_golay_kernels(5, 3)
+    assert np.array_equal(savitzky_golay_kernels(5, 3, "both")[0], savitzky_golay_kernels(5, 3, "row")[0])
@@ -0,0 +1,53 @@
+import os
+import datetime
+import pytest
+from granules import synthetic
+from granules.caching import granule_id
+from granules.reading import GranuleReader
+from granules import sources
+from granules.sources import EarthdataSource, LocalSource
+from utils.schemas import DownloadContext
+
+def test_local_source(tmp_path):
+    start = datetime.datetime(2020, 1, 1)
+    root  = os.path.join(tmp_path, "granules")
+    synthetic.generate(root, ["M2T1NXFLX", "M2I3NPASM"], start, start + datetime.timedelta(hours=3))
+
+    source   = LocalSource(root)
+    granules = source.search("M2T1NXFLX", start.date(), start.date())
+    # every hourly step of the daily file is a granule
+    assert [granule_id(granule) for granule in granules] == [
+        f"MERRA2_400.tavg1_2d_flx_Nx.20200101.nc4#{hour}" for hour in range(24)
+    ]
+    assert len(source.search("M2I3NPASM", start.date(), start.date())) == 8
+
+    paths = source.fetch_all(granules, "M2T1NXFLX", DownloadContext(workers=2))
+    with GranuleReader(paths[1]) as reader:
+        assert reader.valid_time == datetime.datetime(2020, 1, 1, 1, 30)
+        assert reader.variables["PRECTOT"].shape == (1, 361, 576)
+        assert reader.variables["PRECTOT"][0].min() >= 0
+
+class TokenResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.text        = ""
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"access_token": "token", "token_type": "Bearer"}
+
+def test_earthdata_source_holds_its_own_token(monkeypatch):
+    logins = []
+    monkeypatch.setattr(sources.ea, "login", lambda *args, **kwargs: logins.append(args))
+    monkeypatch.setattr(sources.requests, "post", lambda url, auth, timeout: TokenResponse(200 if auth == ("user", "pass") else 401))
+
+    source = EarthdataSource("user", "pass")
+    source.login()
+    assert logins == []
+    assert source.session().headers["Authorization"] == "Bearer token"
+    assert source.session() is source.session()
+
+    with pytest.raises(ValueError):
+        EarthdataSource("user", "wrong").login()
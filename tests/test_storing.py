@@ -0,0 +1,99 @@
+import os
+import datetime
+import numpy as np
+from netCDF4 import Dataset
+from processing import storing
+from processing.storing import FieldStore, load_or_preprocess
+from utils.schemas import PrecisionContext
+
+def write_granule(path: str, hour: int) -> np.ndarray:
+    lats = np.linspace(-90, 90, 91)
+    lons = np.linspace(-180, 178, 180)
+    prec = np.random.rand(1, lats.size, lons.size).astype(np.float32) * 1e-3
+
+    with Dataset(path, "w") as ds:
+        ds.createDimension("time", 1)
+        ds.createDimension("lat", lats.size)
+        ds.createDimension("lon", lons.size)
+        time = ds.createVariable("time", "f8", ("time",))
+        time.units = "hours since 2020-01-01 00:00:00"
+        time[:] = [hour]
+        ds.createVariable("lat", "f8", ("lat",))[:] = lats
+        ds.createVariable("lon", "f8", ("lon",))[:] = lons
+        ds.createVariable("PRECTOT", "f4", ("time", "lat", "lon"))[:] = prec
+
+    return prec
+
+def test_roundtrip(tmp_path):
+    store = FieldStore(str(tmp_path))
+    time  = datetime.datetime(2020, 1, 1, 6)
+    data  = np.ma.masked_less(np.random.rand(91, 180), 0.1)
+
+    store.save("CCMP", time, {"wspd": data}, np.linspace(-90, 90, 91), np.linspace(-180, 178, 180))
+    assert store.has("CCMP", time, ("wspd",))
+
+    lat_slice, lon_slices, extent = store.window("CCMP", (-10, 10, -10, 10))
+    loaded = store.load("CCMP", time, ("wspd",), lat_slice, lon_slices)["wspd"]
+    assert loaded.shape == (11, 11)
+    assert np.array_equal(loaded.mask, data.mask[lat_slice, lon_slices[0]])
+    assert extent == (-10.0, 10.0, -10.0, 10.0)
+
+def test_load_or_preprocess(tmp_path, monkeypatch):
+    path  = os.path.join(tmp_path, "granule.nc4")
+    prec  = write_granule(path, 3)
+    store = FieldStore(os.path.join(tmp_path, "store"))
+
+    first = load_or_preprocess(store, "accumulated rainfall", "M2T1NXFLX", {"data": path})
+    assert first["time"] == datetime.datetime(2020, 1, 1, 3)
+    assert np.allclose(first["fields"]["PRECTOT"], prec[0] * 3600 / 25.4)
+
+    # stored fields are served without preprocessing the granule again
+    def fail(*args):
+        raise AssertionError("granule was preprocessed twice")
+
+    monkeypatch.setattr(storing, "preprocess_fields", fail)
+    second = load_or_preprocess(store, "accumulated rainfall", "M2T1NXFLX", {"data": path}, extent=(-10, 10, -10, 10))
+    assert second["fields"]["PRECTOT"].shape == (11, 11)
+
+def test_storage_precision(tmp_path):
+    precision = PrecisionContext(storage="float16", compute="float32")
+    store     = FieldStore(str(tmp_path), precision)
+    time      = datetime.datetime(2020, 1, 1, 6)
+    data      = np.ma.masked_less(np.random.rand(91, 180) * 100, 10)
+
+    store.save("CCMP", time, {"wspd": data}, np.linspace(-90, 90, 91), np.linspace(-180, 178, 180))
+    assert np.load(store.path("CCMP", time, "wspd"), mmap_mode="r").dtype == np.float16
+    assert not FieldStore(str(tmp_path)).has("CCMP", time, ("wspd",))
+
+    loaded = store.load("CCMP", time, ("wspd",))["wspd"]
+    assert loaded.dtype == np.float32
+    assert np.array_equal(loaded.mask, data.mask)
+    assert np.allclose(loaded, data, rtol=1e-3)
+
+def test_float64_storage_is_exact(tmp_path):
+    precision = PrecisionContext(storage="float64", compute="float64")
+    store     = FieldStore(str(tmp_path), precision)
+    time      = datetime.datetime(2020, 1, 1, 6)
+    data      = 1 + np.random.rand(91, 180) * 1e-9
+
+    store.save("CCMP", time, {"wspd": data}, np.linspace(-90, 90, 91), np.linspace(-180, 178, 180))
+    assert np.array_equal(np.load(store.path("CCMP", time, "wspd")), data)
+
+    loaded = store.load("CCMP", time, ("wspd",))["wspd"]
+    assert loaded.dtype == np.float64
+    assert np.array_equal(loaded, data)
+
+def test_pyramid_levels(tmp_path):
+    store = FieldStore(str(tmp_path))
+    time  = datetime.datetime(2020, 1, 1, 6)
+    data  = np.random.rand(91, 180)
+
+    store.save("CCMP", time, {"wspd": data}, np.linspace(-90, 90, 91), np.linspace(-180, 178, 180))
+    assert store.level("CCMP", None) == 0
+    assert store.level("CCMP", 0.1) == 2
+
+    lat_slice, lon_slices, extent = store.window("CCMP", None, level=2)
+    coarse = store.load("CCMP", time, ("wspd",), lat_slice, lon_slices, level=2)["wspd"]
+    assert coarse.shape == (23, 45)
+    assert np.isclose(coarse[0, 0], data[:4, :4].mean())
+    assert extent[:2] == (-177.0, 175.0)
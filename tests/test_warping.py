@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import cartopy.crs as ccrs
+from concurrent.futures import ThreadPoolExecutor
+from cartopy.img_transform import warp_array
+from plotting import warping
+from plotting.warping import WarpCache, WarpMap, warp_shape
+
+def warp_args(shape):
+    target = ccrs.Geostationary(-75.0)
+    extent = (*target.x_limits, *target.y_limits)
+    return ccrs.PlateCarree(), (-180, 180, -90, 90), shape, target, extent
+
+def test_warp_map_matches_cartopy():
+    data = np.random.default_rng(0).random((90, 180)).astype(np.float32)
+    source, source_extent, shape, target, target_extent = warp_args(data.shape)
+
+    expected, extent = warp_array(
+        data,
+        source_proj=source,
+        source_extent=source_extent,
+        target_proj=target,
+        target_res=warp_shape(target_extent),
+        target_extent=target_extent,
+        mask_extrapolated=True
+    )
+    warp   = WarpMap.build(source, source_extent, shape, target, target_extent)
+    warped = warp(data, origin="lower")
+
+    assert np.allclose(warp.extent, extent)
+    assert np.array_equal(np.ma.getmaskarray(warped), np.ma.getmaskarray(expected))
+    assert np.array_equal(warped.compressed(), expected.compressed())
+
+    rgba = np.dstack([data] * 4)
+    assert warp(rgba, origin="lower").shape == warped.shape + (4,)
+
+def test_warp_cache(tmp_path):
+    args  = warp_args((45, 90))
+    cache = WarpCache(root=str(tmp_path), size=1)
+
+    first = cache.get(*args)
+    assert cache.get(*args) is first
+    assert len(os.listdir(tmp_path)) == 1
+
+    # evicted maps are read back from disk
+    cache.get(*warp_args((30, 60)))
+    loaded = cache.get(*args)
+    assert loaded is not first
+    assert np.array_equal(loaded.index, first.index) and loaded.extent == first.extent
+
+def test_warp_cache_builds_each_map_once(tmp_path, monkeypatch):
+    built    = []
+    original = WarpMap.build
+
+    def build(*args):
+        built.append(args)
+        return original(*args)
+
+    monkeypatch.setattr(warping.WarpMap, "build", build)
+    cache = WarpCache(root=str(tmp_path), size=2)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        warps = list(pool.map(lambda _: cache.get(*warp_args((45, 90))), range(4)))
+
+    assert len(built) == 1
+    assert all(warp is warps[0] for warp in warps)
+    assert [name.endswith(".npz") for name in os.listdir(tmp_path)] == [True]
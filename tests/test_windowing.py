@@ -0,0 +1,28 @@
+import numpy as np
+from granules.reading import lon_window
+from processing.windowing import cap_extent, view_extent, window_shape
+
+def test_mapset_extent():
+    assert view_extent("maryland_mapset") == (-80.5, -74.5, 37.5, 39.75)
+    assert view_extent("unknown") is None
+
+def test_projection_extent():
+    west, east, south, north = view_extent("goeseast_proj")
+    assert south > -90 and north < 90
+    assert np.isclose((west + east) / 2, -75)
+    assert 75 < east - (-75) < 90
+
+    # a cap over a pole spans every longitude
+    assert cap_extent(-90, 80, 30)[:2] == (-180.0, 180.0)
+
+def test_projection_extent_wrap():
+    west, east, south, north = view_extent("himawari_proj")
+    assert east > 180
+
+    lons    = np.arange(576) * 0.625 - 180
+    windows = lon_window(lons, west, east)
+    assert len(windows) == 2
+
+def test_window_shape():
+    assert window_shape((1800, 3600), (-180, 180, -90, 90)) == (1800, 3600)
+    assert window_shape((1800, 3600), (-80.5, -74.5, 37.5, 39.75)) == (22, 60)
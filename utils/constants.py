@@ -1,19 +1,41 @@
 import os
+import json
 import datetime
 import numpy as np
 import matplotlib as mpl
 import cartopy.crs as ccrs
 
-ROOT_DIR: str    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-CACHE_DIR: str   = os.path.join(ROOT_DIR, "features", "cache")
-TEMP_DIR: str    = os.path.join(ROOT_DIR, "features", "tmp")
-WEIGHTS_DIR: str = os.path.join(ROOT_DIR, "processing", "weights")
+ROOT_DIR: str     = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR: str    = os.path.join(ROOT_DIR, "features", "cache")
+TEMP_DIR: str     = os.path.join(ROOT_DIR, "features", "tmp")
+WEIGHTS_DIR: str  = os.path.join(ROOT_DIR, "processing", "weights")
+GRANULES_DIR: str = os.path.join(ROOT_DIR, "granules", "cache")
+STORE_DIR: str    = os.path.join(ROOT_DIR, "processing", "store")
+FRAMES_DIR: str   = os.path.join(ROOT_DIR, "plotting", "frames")
+WARPS_DIR: str    = os.path.join(ROOT_DIR, "plotting", "warps")
+CATALOG_PATH: str = os.path.join(GRANULES_DIR, "catalog.sqlite")
 
 NATURAL_EARTH: str    = "https://shadedrelief.com/natural3/ne3_data/16200/textures/2_no_clouds_16k.jpg"
 GSHHS_COASTLINES: str = "https://www.ngdc.noaa.gov/mgg/shorelines/data/gshhg/latest/gshhg-shp-2.3.7.zip"
 BORDERS: str          = "https://geodata.ucdavis.edu/gadm/gadm4.1/gadm_410-gpkg.zip"
+EARTHDATA_TOKEN: str  = "https://urs.earthdata.nasa.gov/api/users/find_or_create_token"
 ROADS: str            = "https://www.naturalearthdata.com/http//www.naturalearthdata.com/download/10m/cultural/ne_10m_roads.zip"
 
+DOWNLOAD_WORKERS: int     = 8
+DOWNLOAD_CHUNK_SIZE: int  = 1 << 20
+STREAM_QUEUE_SIZE: int    = 2
+JOB_WORKERS: int          = 2
+MAX_BATCH_DAYS: int       = 5
+CHUNK_DAYS: int           = 5
+FRAME_CACHE_QUOTA: int    = 10 * 1024 ** 3
+REGRIDDER_CACHE_SIZE: int = 8
+RESAMPLE_CACHE_SIZE: int  = 64
+WARP_CACHE_SIZE: int      = 16
+PYRAMID_LEVELS: int       = 4
+SMOOTHING_CACHE_SIZE: int = 32
+SPECTRUM_CACHE_SIZE: int  = 4
+SMOOTHING_CHUNK_SIZE: int = 4
+
 TARGET_SHAPE: tuple[int, int]              = (2760, 5760)
 PREFERRED_DPI: int                         = 1500
 PROJECTION_MAP: dict[int, ccrs.Projection] = {
@@ -51,6 +73,33 @@ VIEWS: dict[str, type[ccrs.Projection]] = {
     "globe": PROJECTION_MAP[0],
 }
 
+with open(os.path.join(ROOT_DIR, "views.json"), "r") as f:
+    VIEWS_SPEC: dict[str, dict] = json.load(f)
+
+VIEW_MARGIN: float = 2.0
+
+# the native grid of each dataset, as latitudes and longitudes
+DATASET_GRIDS: dict[str, tuple[np.ndarray, np.ndarray]] = {
+    "MERRA-2": (np.linspace(-90, 90, 361), np.arange(576) * 0.625 - 180),
+    "CCMP": (np.arange(720) * 0.25 - 89.875, np.arange(1440) * 0.25 + 0.125)
+}
+
+PRODUCT_VARIABLES: dict[str, tuple[str, ...]] = {
+    "10m winds": ("uwnd", "vwnd"),
+    "weather types": ("PHIS", "PRECSNO", "PRECTOT", "T2M", "H1000", "H500", "SLP"),
+    "accumulated rainfall": ("PRECTOT",),
+    "accumulated snowfall": ("PRECSNO",),
+    "vorticity": ("H500", "U500", "V500")
+}
+
+PRODUCT_FRAMES: dict[str, str] = {
+    "10m winds": "10m-winds",
+    "weather types": "wxtypes",
+    "accumulated rainfall": "acc-rain",
+    "accumulated snowfall": "acc-snow",
+    "vorticity": "vorticity"
+}
+
 WEATHER_VARIABLES_SHORT: tuple[str, ...] = (
     "wind",
     "temp",
@@ -139,7 +139,38 @@ class BlendContext(BaseModel):
     low: float | None       = None
     high: float | None      = None
 
+class PrecisionContext(BaseModel):
+    storage: str | None = "float32"
+    compute: str | None = "float32"
+
 class ResampleContext(BaseModel):
-    shape: tuple[int, int] | None = None
-    center: bool | None           = None
-    resample: Callable | None     = None
\ No newline at end of file
+    shape: tuple[int, int] | None      = None
+    center: bool | None                = None
+    method: str | None                 = "bilinear"
+    resample: Callable | None          = None
+    precision: PrecisionContext | None = None
+
+class DownloadContext(BaseModel):
+    cache_dir: str | None    = None
+    workers: int | None      = 8
+    chunk_size: int | None   = 1 << 20
+    retries: int | None      = 3
+    verify: bool | None      = True
+    session: Callable | None = None
+
+class StreamContext(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    queue_size: int | None             = 2
+    download: DownloadContext | None   = None
+    regridder: Callable | None         = None
+    regrid: RegridderContext | None    = None
+    resample: ResampleContext | None   = None
+    plotter: PlotterContext | None     = None
+    cache_dir: str | None              = None
+    store: Any | None                  = None
+    dataset: str | None                = None
+    frames: Any | None                 = None
+    source: Any | None                 = None
+    precision: PrecisionContext | None = None
+    extent: ExtentType | None          = None
+    pyramid: bool | None               = True